@@ -9,6 +9,18 @@ def create_app() -> Flask:
     """
     app = Flask(__name__, static_folder=None)
 
+    # структурные логи через очередь + request id / access-лог (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT)
+    from core.logs import install_request_logging
+    install_request_logging(app)
+
+    # общий бюджет времени запроса на походы в Strapi (REQUEST_BUDGET, см. core/deadline.py)
+    from core.deadline import install_deadline
+    install_deadline(app)
+
+    # запись трафика и ответов Strapi в кассету для tools/replay.py (только если задан CASSETTE_RECORD)
+    from core.cassette import install_recorder
+    install_recorder(app)
+
     # отключаем кэш браузера для JSON во время разработки
     @app.after_request
     def _no_cache(resp):
@@ -31,12 +43,31 @@ def create_app() -> Flask:
     home_bp = _bp('routes.home', 'bp', 'home_bp')           # /home, /test, /test.json
     lessons_bp = _bp('routes.lessons', 'bp', 'lessons_bp')  # /lesson/<id>, /lesson/slug/<slug>, /<name>.json
     log_bp = _bp('routes.log', 'bp', 'log_bp')              # /log
+    img_bp = _bp('routes.img', 'bp', 'img_bp')              # /img/<key>, /img/placeholder.svg
+    progress_bp = _bp('routes.progress', 'bp', 'progress_bp')  # /progress
+    admin_bp = _bp('routes.admin', 'bp', 'admin_bp')        # /admin/* (только с ADMIN_TOKEN)
+    search_bp = _bp('routes.search', 'bp', 'search_bp')     # /search, /search/hits
 
     app.register_blueprint(spa_bp)
     app.register_blueprint(health_bp)
     app.register_blueprint(home_bp)
     app.register_blueprint(lessons_bp)
     app.register_blueprint(log_bp)
+    app.register_blueprint(img_bp)
+    app.register_blueprint(progress_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(search_bp)
+
+    # правки шаблонов в apps/web/ui подхватываются без рестарта (UI_WATCH=0 — выключить);
+    # в preload-режиме поток поднимается в каждом воркере после fork (core/boot.py)
+    from core import boot
+    if not boot.preload_enabled():
+        from core.ui_watch import start_watcher
+        start_watcher()
+
+    # сэмплирующий профайлер (PROFILE_SAMPLE_RATE / заголовок X-Profile с ADMIN_TOKEN)
+    from core.profiling import install_profiler
+    install_profiler(app)
 
     return app
 
@@ -44,5 +75,10 @@ def create_app() -> Flask:
 # WSGI entry
 app = create_app()
 
+# прод: прогрев и gc.freeze() в мастере до fork воркеров (APP_PRELOAD=1, см. gunicorn.conf.py)
+from core import boot as _boot
+if _boot.preload_enabled():
+    _boot.preload(app)
+
 if __name__ == "__main__":
     app.run(debug=True, host="127.0.0.1", port=5050, use_reloader=False)
\ No newline at end of file
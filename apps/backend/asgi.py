@@ -0,0 +1,246 @@
+# apps/backend/asgi.py
+"""ASGI entry point — опциональный async-режим рядом с WSGI `app` из app.py.
+
+    pip install -r requirements-async.txt
+    cd apps/backend && uvicorn asgi:app --host 0.0.0.0 --port 5050
+
+Горячие эндпоинты, которые в основном ждут Strapi, обслуживаются корутинами:
+  /home, /lesson/<id>, /lesson/by|slug/<slug> и их /bundle.
+Данные тянет asyncio-клиент (strapi_async), а сборка карточки — тот же
+синхронный код из routes/* (render_home, lesson_step_by_*), вызванный в
+контексте запроса Flask с уже полученными данными — в пуле потоков, чтобы
+SQLite, диск и ожидания аренды в сборке не останавливали event loop. Так один процесс держит
+тысячи одновременных ожиданий upstream, а вывод совпадает с WSGI-режимом.
+
+Всё остальное (SPA, /page, /log, /img, /health) уходит в WSGI-приложение
+в пуле потоков.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import re
+import sys
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from flask import request_started
+
+from app import app as flask_app
+import strapi_async
+from core import catalog_index, deadline
+from core.ui import home_rows
+from routes.home import render_home
+from routes.lessons import (
+    lesson_bundle_by_id,
+    lesson_bundle_by_slug,
+    lesson_step_by_id,
+    lesson_step_by_slug,
+)
+
+
+# ---- WSGI environ from ASGI scope ---------------------------------------------
+def _environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def _read_body(receive) -> bytes:
+    chunks: List[bytes] = []
+    more = True
+    while more:
+        msg = await receive()
+        chunks.append(msg.get("body", b""))
+        more = msg.get("more_body", False)
+    return b"".join(chunks)
+
+async def _send(send, status: int, headers: List[Tuple[str, str]], body: Union[bytes, Iterable[bytes]]) -> None:
+    """body — готовые байты или итератор кусков (потоковый ответ, например большой /home)."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    })
+    if isinstance(body, (bytes, bytearray)):
+        await send({"type": "http.response.body", "body": bytes(body)})
+        return
+    for chunk in body:
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+# ---- prefetched data -> sync render ------------------------------------------
+async def _prefetch(coro: Awaitable[Any]) -> Callable[[], Any]:
+    """Результат корутины как fetch-функция для синхронного рендера (ошибка — пробрасывается)."""
+    try:
+        raw = await coro
+    except Exception as e:  # отдаём рендеру, он сам деградирует как в WSGI-режиме
+        error = e
+
+        def _raise():
+            raise error
+        return _raise
+    return lambda: raw
+
+def _dispatch(view: Callable[[], Any]):
+    """Flask.full_dispatch_request, только вместо view по URL — view с уже полученными данными:
+    те же сигналы, before/after_request и обработчики ошибок (handle_user_exception)."""
+    flask_app._got_first_request = True
+    try:
+        request_started.send(flask_app, _async_wrapper=flask_app.ensure_sync)
+        rv = flask_app.preprocess_request()
+        if rv is None:
+            rv = view()
+    except Exception as e:
+        rv = flask_app.handle_user_exception(e)
+    return flask_app.finalize_request(rv)
+
+def _render_sync(environ: Dict[str, Any], view: Callable[[], Any]):
+    """Как Flask.wsgi_app: необработанная ошибка — handle_exception (500), teardown — всегда."""
+    ctx = flask_app.request_context(environ)
+    error: Optional[BaseException] = None
+    try:
+        try:
+            ctx.push()
+            resp = _dispatch(view)
+        except Exception as e:
+            error = e
+            resp = flask_app.handle_exception(e)
+        # потоковое тело собрано из уже готовых байтов и контекста запроса не требует
+        body = resp.response if resp.is_streamed else resp.get_data()
+        return resp.status_code, list(resp.headers.items()), body
+    finally:
+        if error is not None and flask_app.should_ignore_error(error):
+            error = None
+        ctx.pop(error)
+
+async def _render(environ: Dict[str, Any], view: Callable[[], Any]):
+    """Сборка в пуле потоков, как _call_wsgi: в ней SQLite (общий кэш, прогресс), диск
+    last-known-good, компиляция шаблонов и ожидание аренды общего кэша — event loop
+    ими не блокируется. Контекст (дедлайн запроса) asyncio.to_thread переносит в поток."""
+    return await asyncio.to_thread(_render_sync, environ, view)
+
+def _indexed() -> bool:
+    """Индекс каталога уже в памяти — данные берутся без I/O, ждать Strapi не нужно."""
+    return catalog_index.current() is not None
+
+async def _home(environ, _m):
+    if _indexed():
+        return await _render(environ, render_home)
+    fetch = await _prefetch(strapi_async.get_categories())
+    return await _render(environ, lambda: render_home(build_rows=lambda: home_rows(fetch())))
+
+async def _step_id(environ, m):
+    lesson_id = int(m.group(1))
+    fetch = None if _indexed() else await _prefetch(strapi_async.get_lesson(lesson_id))
+    return await _render(environ, lambda: lesson_step_by_id(lesson_id, fetch=fetch))
+
+async def _step_slug(environ, m):
+    slug = m.group(1)
+    fetch = None if _indexed() else await _prefetch(strapi_async.get_lesson_by_slug(slug))
+    return await _render(environ, lambda: lesson_step_by_slug(slug, fetch=fetch))
+
+async def _bundle_id(environ, m):
+    lesson_id = int(m.group(1))
+    fetch = None if _indexed() else await _prefetch(strapi_async.get_lesson(lesson_id))
+    return await _render(environ, lambda: lesson_bundle_by_id(lesson_id, fetch=fetch))
+
+async def _bundle_slug(environ, m):
+    slug = m.group(1)
+    fetch = None if _indexed() else await _prefetch(strapi_async.get_lesson_by_slug(slug))
+    return await _render(environ, lambda: lesson_bundle_by_slug(slug, fetch=fetch))
+
+_ASYNC_ROUTES = [
+    (re.compile(r"^/home$"), _home),
+    (re.compile(r"^/lesson/(\d+)$"), _step_id),
+    (re.compile(r"^/lesson/(?:by|slug)/([^/]+)$"), _step_slug),
+    (re.compile(r"^/lesson/(\d+)/bundle$"), _bundle_id),
+    (re.compile(r"^/lesson/(?:by|slug)/([^/]+)/bundle$"), _bundle_slug),
+]
+
+
+# ---- WSGI fallback -------------------------------------------------------------
+def _call_wsgi(environ: Dict[str, Any]):
+    started: Dict[str, Any] = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+        return lambda _data: None
+
+    result = flask_app.wsgi_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        close = getattr(result, "close", None)
+        if close is not None:
+            close()
+    return started["status"], started["headers"], body
+
+
+# ---- ASGI app ------------------------------------------------------------------
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                if catalog_index.enabled():
+                    # индекс каталога — до первых запросов и вне event loop
+                    await asyncio.to_thread(catalog_index.get_index)
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                await strapi_async.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    environ = _environ(scope, await _read_body(receive))
+    if scope["method"] in ("GET", "HEAD"):
+        for pattern, handler in _ASYNC_ROUTES:
+            m = pattern.match(scope["path"])
+            if m:
+                # бюджет запроса — с момента, как начали ждать Strapi; Flask-рендер его увидит и не перезапустит
+                token = deadline.start()
+                try:
+                    status, headers, body = await handler(environ, m)
+                finally:
+                    deadline.reset(token)
+                if scope["method"] == "HEAD":
+                    body = b""   # заголовки (и Content-Length) — как у GET, тела нет
+                await _send(send, status, headers, body)
+                return
+
+    status, headers, body = await asyncio.to_thread(_call_wsgi, environ)
+    await _send(send, status, headers, body)
+
+
+application = app
+
+__all__ = ["app", "application"]
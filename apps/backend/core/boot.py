@@ -0,0 +1,140 @@
+# apps/backend/core/boot.py
+"""Прод-загрузка: прогрев в мастере и gc.freeze() перед fork воркеров.
+
+Под gunicorn с preload_app приложение импортируется один раз в мастере, а
+воркеры получают его память через fork (copy-on-write). Чтобы воркеры стартовали
+тёплыми и реально делили эту память, мастер до fork:
+  - импортирует все модули роутов (create_app) и компилирует все шаблоны
+    apps/web/ui (страницы — без темы и в каждой теме из tokens/, компоненты) и токены;
+  - по желанию грузит индекс каталога из Strapi (PRELOAD_CATALOG) и строит по нему
+    индекс поиска слов и хранилище слов для /review;
+  - собирает мусор и замораживает всё, что уже есть в куче (gc.freeze): сборщик
+    больше не обходит эти объекты и не пишет в их заголовки — страницы памяти
+    не копируются в каждом воркере из-за одного gc.
+
+Фоновые потоки и сокеты fork не переживает, поэтому в preload-режиме мастер их
+не запускает, а after_fork() в каждом воркере поднимает заново: писатель логов,
+вотчер шаблонов и Session к Strapi. SQLite-соединения (прогресс, общий кэш) и
+поток записи прогресса уже привязаны к pid и пересоздаются сами.
+
+ENV:
+  APP_PRELOAD      — "1": прогрев и gc.freeze() при импорте app (ставит gunicorn.conf.py);
+  PRELOAD_CATALOG  — "0" не грузить каталог в мастере (по умолчанию грузится, если индекс включён).
+"""
+from __future__ import annotations
+import gc
+import os
+import time
+from typing import Dict
+
+from core.logs import get_logger, setup_logging
+from core.paths import UI_DIR
+
+log = get_logger("boot")
+
+
+def preload_enabled() -> bool:
+    return str(os.getenv("APP_PRELOAD", "")).lower() in ("1", "true", "yes", "on")
+
+def _catalog_enabled() -> bool:
+    return str(os.getenv("PRELOAD_CATALOG", "1")).lower() not in ("0", "false", "no", "off")
+
+def themes():
+    """Темы, для которых есть токены: tokens/colors.<theme>.json."""
+    return sorted(p.name[len("colors."):-len(".json")] for p in (UI_DIR / "tokens").glob("colors.*.json"))
+
+
+def warm_templates() -> int:
+    """Скомпилировать все страницы и компоненты в кэш шаблонов. Возвращает число записей."""
+    from core import ui
+
+    names = themes()
+    for theme in names:
+        ui.load_tokens(theme)
+    count = 0
+    for path in sorted(p for p in (UI_DIR / "pages").glob("*.json") if p.stat().st_size):
+        for theme in (None, *names):
+            try:
+                ui.template(path, theme=theme)
+                count += 1
+            except Exception as e:
+                log.warning("template warmup failed: %s", e, extra={"template": path.name, "theme": theme})
+    for path in sorted(p for p in (UI_DIR / "components").rglob("*.json") if p.stat().st_size):
+        try:
+            ui.template(path)
+            count += 1
+        except Exception as e:
+            log.warning("template warmup failed: %s", e, extra={"template": path.name})
+    return count
+
+def warm_catalog() -> bool:
+    from core import catalog_index
+
+    if not catalog_index.enabled() or not _catalog_enabled():
+        return False
+    try:
+        catalog_index.load()
+        return True
+    except Exception as e:
+        # не фатально: воркер загрузит индекс сам на первом запросе
+        log.warning("catalog preload failed: %s", e)
+        return False
+
+
+def warm_search() -> bool:
+    """Индекс поиска слов — из уже загруженного каталога (без каталога не строится)."""
+    from core import catalog_index, search_index
+
+    if catalog_index.current() is None:
+        return False
+    try:
+        return search_index.get_index() is not None
+    except Exception as e:
+        log.warning("search index preload failed: %s", e)
+        return False
+
+
+def warm_review() -> bool:
+    """Слова для /review (ссылки и корзины уровней) — из уже загруженного каталога."""
+    from core import catalog_index, word_store
+
+    if catalog_index.current() is None:
+        return False
+    try:
+        return word_store.get_store() is not None
+    except Exception as e:
+        log.warning("word store preload failed: %s", e)
+        return False
+
+
+def preload(app=None) -> Dict[str, object]:
+    """Прогреть процесс перед fork и заморозить кучу. Вызывать один раз, в мастере."""
+    t0 = time.perf_counter()
+    stats: Dict[str, object] = {
+        "templates": warm_templates(),
+        "catalog": warm_catalog(),
+    }
+    stats["search"] = warm_search()
+    stats["review"] = warm_review()
+    gc.collect()
+    gc.freeze()
+    stats["frozen"] = gc.get_freeze_count()
+    stats["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    log.info("preloaded", extra=stats)
+    return stats
+
+
+def after_fork() -> None:
+    """Поднять в воркере то, что не переживает fork (gunicorn post_fork)."""
+    setup_logging(force=True)
+
+    import strapi_client
+    strapi_client.reset_session()
+
+    from core.ui_watch import start_watcher
+    start_watcher()
+
+    log.info("worker ready", extra={"frozen": gc.get_freeze_count()})
+
+
+__all__ = ["preload_enabled", "preload", "after_fork", "warm_templates", "warm_catalog", "warm_search", "warm_review", "themes"]
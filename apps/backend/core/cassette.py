@@ -0,0 +1,240 @@
+# apps/backend/core/cassette.py
+"""Кассета: запись прод-трафика и ответов Strapi для воспроизведения локально.
+
+В режиме записи (CASSETTE_RECORD) процесс пишет в файл JSON-строки двух видов:
+  - {"t": "strapi", ...} — ответ, который получил strapi_client._get (путь,
+    параметры, тело или ошибка). Пишется каждый различный ответ (по отпечатку),
+    повторы того же ответа — нет, поэтому файл растёт с данными, а не с трафиком;
+  - {"t": "req", ...} — сэмплированный входящий запрос: метод, путь, query,
+    нужные маршрутам заголовки и cookie пользователя (worb_uid), тело POST, статус и время ответа.
+Ответы Strapi пишутся все (заранее неизвестно, какой запрос попадёт в выборку),
+время у обоих видов — ts, чтобы при воспроизведении каталог менялся так же,
+как в проде.
+
+Воспроизведение — tools/replay.py: _get отвечает из кассеты (Transport), сети нет.
+
+ENV:
+  CASSETTE_RECORD  — путь файла кассеты ("{pid}" заменяется на pid воркера); пусто — запись выключена;
+  CASSETTE_SAMPLE  — доля записываемых запросов (1.0);
+  CASSETTE_BODY_MAX — тело POST длиннее этого (байт) не пишется (65536).
+Async-режим (strapi_async, ASGI-маршруты) в кассету не пишется.
+"""
+from __future__ import annotations
+import bisect
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.logs import elapsed_ms, get_logger
+
+log = get_logger("cassette")
+
+# заголовки, от которых зависит ответ маршрутов (остальные в кассету не идут)
+HEADERS = ("X-User-Id", "X-Card-Base", "Accept", "Content-Type")
+# cookie, от которых зависит ответ (пользователь браузера — worb_uid, см. core/progress.py);
+# в кассету идёт заголовок Cookie только с ними
+COOKIES = ("worb_uid",)
+
+
+def _headers(req) -> Dict[str, str]:
+    out = {h: req.headers[h] for h in HEADERS if h in req.headers}
+    cookies = "; ".join(f"{name}={req.cookies[name]}" for name in COOKIES if name in req.cookies)
+    if cookies:
+        out["Cookie"] = cookies
+    return out
+
+
+class CassetteMiss(LookupError):
+    """В кассете нет ответа Strapi на этот запрос."""
+
+
+class ReplayedError(Exception):
+    """Ошибка Strapi, записанная в кассету (при воспроизведении бросается вместо неё)."""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+def record_path() -> Optional[str]:
+    path = (os.getenv("CASSETTE_RECORD") or "").strip()
+    return path.replace("{pid}", str(os.getpid())) if path else None
+
+def sample_rate() -> float:
+    return min(max(_env_float("CASSETTE_SAMPLE", 1.0), 0.0), 1.0)
+
+def _body_max() -> int:
+    return int(_env_float("CASSETTE_BODY_MAX", 65536))
+
+def _params(params: Optional[Dict[str, Any]]) -> List[List[Any]]:
+    return [[k, v] for k, v in sorted((params or {}).items())]
+
+
+# ---- запись ----------------------------------------------------------------------
+
+class Recorder:
+    """Пишет строки кассеты в файл (append, строка за раз, под замком)."""
+
+    def __init__(self, path: str, sample: float = 1.0) -> None:
+        self.path = path
+        self.sample = sample
+        self._lock = threading.Lock()
+        self._seen: Dict[str, str] = {}     # ключ Strapi -> отпечаток последнего записанного ответа
+        self._pid = os.getpid()
+        self._file = None
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None or self._pid != os.getpid():
+                # после fork у воркера свой дескриптор (и свой файл, если в пути есть {pid})
+                self._pid = os.getpid()
+                self._file = open(record_path() or self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def strapi(self, path: str, params: Optional[Dict[str, Any]], body: Any = None,
+               error: Optional[BaseException] = None) -> None:
+        from strapi_client import cache_key
+
+        key = cache_key(path, params)
+        if error is not None:
+            payload: Dict[str, Any] = {"error": f"{type(error).__name__}: {error}"}
+        else:
+            payload = {"body": body}
+        blob = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        fingerprint = hashlib.sha1(blob).hexdigest()[:16]
+        with self._lock:
+            if self._seen.get(key) == fingerprint:
+                return
+            self._seen[key] = fingerprint
+        self._write({"t": "strapi", "ts": time.time(), "key": key, "path": path,
+                     "params": _params(params), **payload})
+
+    def transport(self, path: str, params: Optional[Dict[str, Any]], fetch: Callable[[], Dict[str, Any]]):
+        """strapi_client.Transport: обычный поход + запись ответа (или ошибки)."""
+        try:
+            body = fetch()
+        except Exception as e:
+            try:
+                self.strapi(path, params, error=e)
+            except Exception as we:
+                log.warning("record failed: %s", we)
+            raise
+        try:
+            self.strapi(path, params, body)
+        except Exception as e:
+            log.warning("record failed: %s", e)
+        return body
+
+    def request(self, req, status: int, ms: Optional[float]) -> None:
+        entry: Dict[str, Any] = {
+            "t": "req", "ts": time.time(), "method": req.method, "path": req.path,
+            "query": req.query_string.decode("latin-1"),
+            "headers": _headers(req),
+            "status": status, "ms": ms,
+        }
+        if req.method in ("POST", "PUT", "PATCH") and (req.content_length or 0) <= _body_max():
+            entry["body"] = req.get_data(as_text=True)
+        self._write(entry)
+
+
+_recorder: Optional[Recorder] = None
+
+def install_recorder(app) -> Optional[Recorder]:
+    """Включить запись, если задан CASSETTE_RECORD: перехват _get и хук на ответы Flask."""
+    global _recorder
+    path = record_path()
+    if not path:
+        return None
+    import strapi_client
+
+    _recorder = rec = Recorder(path, sample_rate())
+    strapi_client.set_transport(rec.transport)
+
+    @app.after_request
+    def _record(resp):
+        from flask import request
+        if rec.sample >= 1.0 or random.random() < rec.sample:
+            try:
+                rec.request(request, resp.status_code, elapsed_ms())
+            except Exception as e:
+                log.warning("record failed: %s", e)
+        return resp
+
+    log.info("recording", extra={"cassette": path, "sample": rec.sample})
+    return rec
+
+
+# ---- чтение и воспроизведение -------------------------------------------------
+
+def read(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # последняя строка могла оборваться, если процесс убили посреди записи
+                log.warning("bad cassette line", extra={"cassette": path, "line": n})
+
+
+class Cassette:
+    """Загруженная кассета: запросы по порядку и версии ответов Strapi по ключу."""
+
+    def __init__(self, paths) -> None:
+        self.requests: List[Dict[str, Any]] = []
+        self._versions: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+        for path in ([paths] if isinstance(paths, str) else paths):
+            for entry in read(path):
+                if entry.get("t") == "req":
+                    self.requests.append(entry)
+                elif entry.get("t") == "strapi":
+                    self._versions.setdefault(entry["key"], []).append((float(entry.get("ts") or 0), entry))
+        self.requests.sort(key=lambda e: e.get("ts") or 0)
+        for versions in self._versions.values():
+            versions.sort(key=lambda v: v[0])
+        self._times = {key: [ts for ts, _ in versions] for key, versions in self._versions.items()}
+        self.clock: Optional[float] = None      # время записи текущего воспроизводимого запроса
+        self.hits = 0
+        self.misses: Dict[str, int] = {}
+
+    @property
+    def responses(self) -> int:
+        return sum(len(v) for v in self._versions.values())
+
+    def lookup(self, path: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Запись ответа, действовавшая на момент clock (иначе — самая ранняя)."""
+        from strapi_client import cache_key
+
+        key = cache_key(path, params)
+        versions = self._versions.get(key)
+        if not versions:
+            self.misses[key] = self.misses.get(key, 0) + 1
+            raise CassetteMiss(key)
+        self.hits += 1
+        if self.clock is None:
+            return versions[-1][1]
+        i = bisect.bisect_right(self._times[key], self.clock)
+        return versions[max(i - 1, 0)][1]
+
+    def transport(self, path: str, params: Optional[Dict[str, Any]], _fetch: Callable[[], Dict[str, Any]]):
+        """strapi_client.Transport: ответ из кассеты, сеть не трогается."""
+        entry = self.lookup(path, params)
+        if "error" in entry:
+            raise ReplayedError(entry["error"])
+        return entry["body"]
+
+
+__all__ = [
+    "HEADERS", "COOKIES", "CassetteMiss", "ReplayedError", "Recorder", "Cassette",
+    "record_path", "sample_rate", "install_recorder", "read",
+]
@@ -0,0 +1,218 @@
+# apps/backend/core/catalog.py
+"""Компактная модель каталога: категории, уроки, слова.
+
+to_divkit_lesson / list_categories_with_lessons отдают вложенные dict'ы — на
+каждое слово свой dict с теми же пятью ключами и абсолютными URL. Для одного
+запроса это нормально, но каталог, который держим в памяти под кэш, так
+раздувается в разы. Здесь:
+  - классы на __slots__ (без __dict__ у каждого экземпляра);
+  - слова урока — колонки (WordColumns): все строки одним UTF-8 blob'ом плюс
+    array смещений; одинаковые строки (уровни, повторы дистракторов) лежат
+    в blob один раз. Word собирается по требованию при чтении;
+  - остальные строки интернированы: заголовки/slug категорий хранятся в
+    одном экземпляре на процесс;
+  - URL медиа хранятся как пришли из Strapi (обычно "/uploads/..."), абсолютными
+    становятся только в to_dict(media_base).
+
+to_dict() возвращает ровно ту форму, что отдавали раньше, — вызывающий код
+и шаблоны не меняются.
+"""
+from __future__ import annotations
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_intern = sys.intern
+
+
+def istr(value: Any) -> str:
+    """Строка из Strapi: strip + intern ("" для None)."""
+    return _intern((value or "").strip())
+
+def abs_url(url: str, media_base: str) -> str:
+    """URL медиа как в strapi_client._abs_url: '/uploads/..' -> media_base + url."""
+    if not url:
+        return ""
+    return f"{media_base}{url}" if url.startswith("/") else url
+
+
+class Word:
+    __slots__ = ("term", "translation", "distractor1", "level", "image")
+
+    def __init__(self, term: str, translation: str, distractor1: str, level: str, image: str) -> None:
+        self.term = term
+        self.translation = translation
+        self.distractor1 = distractor1
+        self.level = level
+        self.image = image
+
+    def to_dict(self, media_base: str = "") -> Dict[str, Any]:
+        return {
+            "term": self.term,
+            "translation": self.translation,
+            "distractor1": self.distractor1,
+            "level": self.level,
+            "image_url": abs_url(self.image, media_base),
+        }
+
+
+class WordColumns:
+    """Слова урока колонками: term/translation/distractor1/level/image.
+
+    Ячейка i*5+k — срез blob[start:start+length] (UTF-8). На слово уходит
+    5 * 8 байт смещений + уникальные байты строк, вместо dict + 5 str-объектов.
+    """
+    __slots__ = ("_blob", "_start", "_len")
+    FIELDS = Word.__slots__
+    _WIDTH = len(FIELDS)
+
+    def __init__(self, rows: Iterable[Tuple[str, str, str, str, str]] = ()) -> None:
+        parts: List[bytes] = []
+        seen: Dict[str, Tuple[int, int]] = {}
+        start, length = array("I"), array("I")
+        pos = 0
+        for row in rows:
+            for value in row:
+                span = seen.get(value)
+                if span is None:
+                    raw = value.encode("utf-8")
+                    span = seen[value] = (pos, len(raw))
+                    parts.append(raw)
+                    pos += len(raw)
+                start.append(span[0])
+                length.append(span[1])
+        self._blob = b"".join(parts)
+        self._start = start
+        self._len = length
+
+    def __len__(self) -> int:
+        return len(self._start) // self._WIDTH
+
+    def _cell(self, idx: int) -> str:
+        s = self._start[idx]
+        return self._blob[s:s + self._len[idx]].decode("utf-8")
+
+    def field(self, i: int, name: str) -> str:
+        return self._cell(i * self._WIDTH + self.FIELDS.index(name))
+
+    def __getitem__(self, i: int) -> Word:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        base = i * self._WIDTH
+        return Word(*(self._cell(base + k) for k in range(self._WIDTH)))
+
+    def __iter__(self) -> Iterator[Word]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self) -> int:
+        """Сколько занимают данные колонок (для диагностики)."""
+        return len(self._blob) + self._start.itemsize * len(self._start) * 2
+
+
+class CategoryRef:
+    """Категория, как она видна из урока (без списка уроков)."""
+    __slots__ = ("id", "title", "slug", "order", "icon")
+
+    def __init__(self, id: Optional[int], title: str, slug: str, order: Any, icon: str) -> None:
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.order = order
+        self.icon = icon
+
+    def to_dict(self, media_base: str = "") -> Dict[str, Any]:
+        return {
+            "title": self.title,
+            "slug": self.slug,
+            "order": self.order,
+            "icon_url": abs_url(self.icon, media_base),
+        }
+
+
+# шагов у урока не больше этого: слова дальше в Strapi есть, но урок их не показывает
+LESSON_MAX_WORDS = 10
+
+
+class LessonNotFound(LookupError):
+    """Урока нет (в Strapi, индексе каталога, хранилище слов) — это ответ, а не сбой upstream."""
+
+
+class Lesson:
+    __slots__ = ("id", "title", "slug", "cover", "categories", "words", "state")
+
+    def __init__(self, id: Optional[int], title: str, slug: str, cover: str,
+                 categories: Tuple[CategoryRef, ...] = (), words: Optional[WordColumns] = None,
+                 state: Any = None) -> None:
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.cover = cover
+        self.categories = categories
+        self.words = words if words is not None else _NO_WORDS
+        self.state = state  # сырое состояние карточки на /home (state/ui_state/status), если пришло
+
+    def to_dict(self, media_base: str = "") -> Dict[str, Any]:
+        """Форма to_divkit_lesson."""
+        categories = [c.to_dict(media_base) for c in self.categories]
+        return {
+            "id": self.id,
+            "title": self.title,
+            "slug": self.slug,
+            "cover_url": abs_url(self.cover, media_base),
+            "category": categories[0] if categories else {},  # backward compatibility
+            "categories": categories,
+            "words": [w.to_dict(media_base) for w in self.words],
+        }
+
+    def to_ref_dict(self, media_base: str = "") -> Dict[str, Any]:
+        """Форма урока внутри категории (list_categories_with_lessons)."""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "slug": self.slug,
+            "cover_url": abs_url(self.cover, media_base),
+        }
+
+
+_NO_WORDS = WordColumns()
+
+
+class Category:
+    __slots__ = ("id", "title", "slug", "order", "icon", "lessons")
+
+    def __init__(self, id: Optional[int], title: str, slug: str, order: Any, icon: str,
+                 lessons: Tuple[Lesson, ...] = ()) -> None:
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.order = order
+        self.icon = icon
+        self.lessons = lessons
+
+    def to_dict(self, media_base: str = "") -> Dict[str, Any]:
+        """Форма list_categories_with_lessons."""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "slug": self.slug,
+            "order": self.order,
+            "icon_url": abs_url(self.icon, media_base),
+            "lessons": [l.to_ref_dict(media_base) for l in self.lessons],
+        }
+
+
+def lessons_to_dicts(lessons: List[Lesson], media_base: str = "") -> List[Dict[str, Any]]:
+    return [l.to_dict(media_base) for l in lessons]
+
+def categories_to_dicts(categories: List[Category], media_base: str = "") -> List[Dict[str, Any]]:
+    return [c.to_dict(media_base) for c in categories]
+
+
+__all__ = [
+    "Word", "WordColumns", "CategoryRef", "Lesson", "Category", "LessonNotFound",
+    "istr", "abs_url", "lessons_to_dicts", "categories_to_dicts",
+]
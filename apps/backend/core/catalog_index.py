@@ -0,0 +1,217 @@
+# apps/backend/core/catalog_index.py
+"""Индекс каталога в памяти: поиск урока по id/slug без запросов в Strapi.
+
+Раньше каждый /lesson/<id> и /lesson/by|slug/<slug> делал filters[...][$eq]
+в Strapi, а /home заново выводил состав категорий. Теперь каталог грузится
+пачкой (категории + все уроки постранично) и раскладывается в словари:
+  - by_id:         id урока -> Lesson (со словами);
+  - by_slug:       slug -> id;
+  - by_category:   slug категории -> id уроков в порядке категории;
+  - categories_of: id урока -> slug'и его категорий.
+Поиск — O(1) в процессе; Strapi нужен только для обновления индекса.
+
+Обновление: индекс старше CATALOG_TTL пересобирается в фоне, запросы пока
+читают старый. Первая загрузка синхронна только вне запроса (boot, lifespan ASGI,
+инструменты): внутри запроса она не влезает в бюджет REQUEST_BUDGET
+(core/deadline.py) и съела бы его целиком — там загрузка уходит в фон, а запрос
+идёт прямым путём в Strapi. После неудачной загрузки следующая попытка — не
+раньше чем через CATALOG_RETRY секунд, а не на каждом запросе. Промах по id/slug тоже будит фоновое обновление (не чаще раза
+в CATALOG_MISS_REFRESH секунд) — свежесозданный урок появится сам. Если
+индекса нет (Strapi не ответил на первой загрузке), поиск идёт прямыми
+запросами, как раньше.
+
+ENV:
+  CATALOG_INDEX         — "0"/"off" выключает индекс (прямые запросы в Strapi);
+  CATALOG_TTL           — возраст индекса до фонового обновления, сек (60);
+  CATALOG_MISS_REFRESH  — минимальный возраст для обновления по промаху, сек (5);
+  CATALOG_RETRY         — пауза после неудачной загрузки, сек (30).
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import strapi_client
+from core import deadline, memdiag
+from core.logs import get_logger
+from core.catalog import Category, Lesson, LessonNotFound
+from core.singleflight import SingleFlight
+
+
+class CatalogIndex:
+    __slots__ = ("by_id", "by_slug", "by_category", "categories_of", "categories", "loaded_at")
+
+    def __init__(self, categories: List[Category], lessons: List[Lesson]) -> None:
+        self.categories: Tuple[Category, ...] = tuple(categories)
+        self.by_id: Dict[int, Lesson] = {}
+        self.by_slug: Dict[str, int] = {}
+        self.by_category: Dict[str, Tuple[int, ...]] = {}
+        self.categories_of: Dict[int, Tuple[str, ...]] = {}
+        self.loaded_at = time.monotonic()
+
+        member: Dict[int, List[str]] = {}
+        for lesson in lessons:
+            if lesson.id is None:
+                continue
+            self.by_id[lesson.id] = lesson
+            if lesson.slug:
+                self.by_slug[lesson.slug] = lesson.id
+            member[lesson.id] = [c.slug for c in lesson.categories if c.slug]
+
+        for cat in self.categories:
+            ids = tuple(l.id for l in cat.lessons if l.id is not None)
+            self.by_category[cat.slug] = ids
+            for lid in ids:
+                slugs = member.setdefault(lid, [])
+                if cat.slug and cat.slug not in slugs:
+                    slugs.append(cat.slug)
+
+        self.categories_of = {lid: tuple(slugs) for lid, slugs in member.items()}
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+    def lesson(self, lesson_id: int) -> Optional[Lesson]:
+        return self.by_id.get(lesson_id)
+
+    def lesson_by_slug(self, slug: str) -> Optional[Lesson]:
+        lid = self.by_slug.get(slug)
+        return self.by_id.get(lid) if lid is not None else None
+
+    def lessons_in(self, category_slug: str) -> List[Lesson]:
+        return [self.by_id[i] for i in self.by_category.get(category_slug, ()) if i in self.by_id]
+
+
+log = get_logger("catalog")
+_index: Optional[CatalogIndex] = None
+_flight = SingleFlight("catalog-index")
+_refreshing = threading.Lock()
+_last_miss_refresh = 0.0
+_last_failure = 0.0
+
+
+def _describe(index: Optional[CatalogIndex]) -> Dict[str, int]:
+    if index is None:
+        return {"lessons": 0}
+    return {
+        "lessons": len(index.by_id),
+        "categories": len(index.categories),
+        "words": sum(len(l.words) for l in index.by_id.values()),
+        "word_columns_bytes": sum(l.words.nbytes() for l in index.by_id.values()),
+    }
+
+memdiag.register_cache("catalog.index", lambda: _index, describe=_describe)
+
+
+def enabled() -> bool:
+    return str(os.getenv("CATALOG_INDEX", "1")).lower() not in ("0", "false", "no", "off")
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(float(os.getenv(name, str(default))), 0.0)
+    except ValueError:
+        return default
+
+def load() -> CatalogIndex:
+    """Собрать индекс из Strapi (категории + все уроки) и опубликовать его."""
+    global _index
+    index = CatalogIndex(
+        strapi_client.parse_categories(strapi_client.get_categories()),
+        strapi_client.get_all_lessons(),
+    )
+    _index = index  # атомарная подмена ссылки: читатели видят старый или новый индекс целиком
+    log.info("index loaded", extra={"lessons": len(index.by_id), "categories": len(index.categories)})
+    return index
+
+def _backing_off() -> bool:
+    """Недавно не удалось загрузить — не пробуем снова до CATALOG_RETRY."""
+    return bool(_last_failure) and time.monotonic() - _last_failure < _env_float("CATALOG_RETRY", 30.0)
+
+def _load_failed(e: Exception, message: str) -> None:
+    global _last_failure
+    _last_failure = time.monotonic()
+    log.warning(message, e)
+
+def _refresh_in_background() -> None:
+    if _backing_off() or not _refreshing.acquire(blocking=False):
+        return  # уже обновляется или недавно не удалось
+
+    def _run():
+        # новый поток не наследует contextvars — дедлайна запроса здесь нет
+        try:
+            _flight.do("load", load)
+        except Exception as e:
+            _load_failed(e, "background load failed: %s" if _index is None else "refresh failed, keeping old index: %s")
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=_run, name="catalog-refresh", daemon=True).start()
+
+def current() -> Optional[CatalogIndex]:
+    """Индекс без I/O (или None, если ещё не загружен/выключен)."""
+    return _index if enabled() else None
+
+def get_index() -> Optional[CatalogIndex]:
+    """Индекс; вне запроса первый вызов грузит синхронно, в запросе — в фоне (пока None).
+    Устаревший обновляется в фоне."""
+    if not enabled():
+        return None
+    index = _index
+    if index is None:
+        if deadline.active():
+            _refresh_in_background()
+            return None
+        if _backing_off():
+            return None
+        try:
+            return _flight.do("load", load)
+        except Exception as e:
+            _load_failed(e, "index load failed: %s")
+            return None
+    if index.age() > _env_float("CATALOG_TTL", 60.0):
+        _refresh_in_background()
+    return index
+
+def _on_miss(index: CatalogIndex) -> None:
+    global _last_miss_refresh
+    now = time.monotonic()
+    min_age = _env_float("CATALOG_MISS_REFRESH", 5.0)
+    if index.age() > min_age and now - _last_miss_refresh > min_age:
+        _last_miss_refresh = now
+        _refresh_in_background()
+
+
+# ---- lookups (та же семантика, что у strapi_client.get_lesson / get_lesson_by_slug) ----
+
+def lesson_by_id(lesson_id: int):
+    """Lesson по id; без индекса — сырой entry из Strapi. LessonNotFound, если не найден."""
+    index = get_index()
+    if index is None:
+        return strapi_client.get_lesson(lesson_id)
+    lesson = index.lesson(lesson_id)
+    if lesson is None:
+        _on_miss(index)
+        raise LessonNotFound(f"Lesson id={lesson_id} not found")
+    return lesson
+
+def lesson_by_slug(slug: str):
+    """Lesson по slug (None, если не найден); без индекса — сырой entry из Strapi."""
+    index = get_index()
+    if index is None:
+        return strapi_client.get_lesson_by_slug(slug)
+    lesson = index.lesson_by_slug(slug)
+    if lesson is None:
+        _on_miss(index)
+    return lesson
+
+def categories() -> Optional[List[Category]]:
+    """Категории (с уроками) из индекса; None — индекса нет, берите из Strapi."""
+    index = get_index()
+    return list(index.categories) if index is not None else None
+
+
+__all__ = [
+    "CatalogIndex", "enabled", "load", "current", "get_index",
+    "lesson_by_id", "lesson_by_slug", "categories",
+]
@@ -0,0 +1,96 @@
+# apps/backend/core/deadline.py
+"""Дедлайн запроса: общий бюджет времени на все походы в Strapi за один запрос.
+
+Раньше каждый вызов Strapi ждал до 15 секунд сам по себе, а запрос из
+нескольких вызовов (или ожидание чужого single-flight) — сколько получится.
+Теперь в начале запроса ставится дедлайн (contextvar — виден в потоке запроса
+и в корутинах/asyncio.to_thread, запущенных из него), а:
+  - timeout(default) отдаёт таймаут очередного вызова: min(default, остаток бюджета);
+  - ожидания single-flight и аренды общего кэша не длятся дольше остатка;
+  - если бюджет кончился — DeadlineExceeded (это TimeoutError), и маршрут
+    отдаёт последнюю удачную версию данных (core/lkg.py), помеченную как устаревшая.
+Фоновые потоки (обновление каталога) дедлайна не видят и живут со своими таймаутами.
+
+ENV:
+  REQUEST_BUDGET  — бюджет запроса, сек (5; 0 — без дедлайна, как раньше);
+  STRAPI_TIMEOUT  — потолок одного запроса в Strapi, сек (15).
+"""
+from __future__ import annotations
+import contextvars
+import os
+import time
+from typing import Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет запроса исчерпан."""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(float(os.getenv(name, str(default))), 0.0)
+    except ValueError:
+        return default
+
+def budget() -> float:
+    return _env_float("REQUEST_BUDGET", 5.0)
+
+def strapi_timeout() -> float:
+    return _env_float("STRAPI_TIMEOUT", 15.0) or 15.0
+
+
+def start(seconds: Optional[float] = None) -> Optional[contextvars.Token]:
+    """Поставить дедлайн через seconds (по умолчанию REQUEST_BUDGET). None — бюджет выключен."""
+    seconds = budget() if seconds is None else seconds
+    if not seconds:
+        return None
+    return _deadline.set(time.monotonic() + seconds)
+
+def active() -> bool:
+    return _deadline.get() is not None
+
+def reset(token: Optional[contextvars.Token]) -> None:
+    if token is not None:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Секунд до дедлайна (может быть <= 0) или None, если дедлайна нет."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+def check() -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("request budget exhausted")
+
+def timeout(default: Optional[float] = None) -> float:
+    """Таймаут очередного вызова: min(default, остаток бюджета); DeadlineExceeded, если остатка нет."""
+    default = strapi_timeout() if default is None else default
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request budget exhausted")
+    return min(default, left)
+
+
+def install_deadline(app) -> None:
+    """Дедлайн на каждый запрос Flask. Уже выставленный (ASGI-обёртка) не перезаписывается."""
+    from flask import g
+
+    @app.before_request
+    def _start():
+        if not active():
+            g._deadline_token = start()
+
+    @app.teardown_request
+    def _end(_exc):
+        reset(g.pop("_deadline_token", None))
+
+
+__all__ = [
+    "DeadlineExceeded", "budget", "strapi_timeout", "start", "active", "reset",
+    "remaining", "check", "timeout", "install_deadline",
+]
@@ -0,0 +1,235 @@
+# apps/backend/core/images.py
+"""Локальный прокси картинок слов с дисковым кэшем и ресайзом.
+
+Карточки урока ссылаются не на STRAPI_URL/uploads/..., а на `/img/<key>?w=<ширина>`:
+  - key = sha256(upstream url)[:32] — по нему находим исходный URL (память + диск);
+  - оригинал скачивается один раз и кладётся по хэшу содержимого (blobs/<sha256>);
+  - варианты режутся по «корзинам» ширины и перекодируются в WebP/JPEG (Pillow),
+    лежат рядом (variants/<sha256>_w<ширина>.<fmt>) и отдаются с долгим кэшем.
+
+Pillow — опционален: без него отдаём оригинал как есть (кэш всё равно работает).
+
+ENV:
+  IMG_PROXY        — "0"/"off" выключает прокси (в карточках останутся прямые URL);
+  IMG_CACHE_DIR    — каталог кэша (по умолчанию apps/backend/.cache/img);
+  IMG_PROXY_WIDTH  — ширина по умолчанию для карточек урока (640);
+  IMG_MAX_BYTES    — оригинал больше этого не скачиваем, /img отвечает 502 (10 МБ).
+
+Скачивание оригинала — потоком, с таймаутом из бюджета запроса (core/deadline.py).
+"""
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from core import deadline, memdiag
+from core.logs import get_logger
+from core.paths import BACKEND_DIR
+
+WIDTH_BUCKETS = (160, 320, 480, 640, 960, 1280)
+_PASSTHROUGH_TYPES = ("image/svg+xml", "image/gif")
+_DOWNLOAD_TIMEOUT = 15.0
+_CHUNK = 64 * 1024
+
+log = get_logger("img")
+_sources: Dict[str, str] = {}            # key -> upstream url
+# локи по полосам: ключей (картинок × ширин) сколько угодно, локов — фиксированное число
+_locks: Tuple[threading.Lock, ...] = tuple(threading.Lock() for _ in range(64))
+
+memdiag.register_cache("img.sources", _sources)
+
+
+def enabled() -> bool:
+    return str(os.getenv("IMG_PROXY", "1")).lower() not in ("0", "false", "no", "off")
+
+def cache_dir() -> Path:
+    return Path(os.getenv("IMG_CACHE_DIR") or (BACKEND_DIR / ".cache" / "img"))
+
+def default_width() -> int:
+    try:
+        return int(os.getenv("IMG_PROXY_WIDTH", "640"))
+    except ValueError:
+        return 640
+
+def max_bytes() -> int:
+    try:
+        return int(os.getenv("IMG_MAX_BYTES", str(10 * 1024 * 1024)))
+    except ValueError:
+        return 10 * 1024 * 1024
+
+def bucket(width: Optional[int]) -> int:
+    """Ближайшая сверху ширина из WIDTH_BUCKETS (чтобы вариантов было конечное число)."""
+    if not width or width <= 0:
+        return default_width()
+    for b in WIDTH_BUCKETS:
+        if width <= b:
+            return b
+    return WIDTH_BUCKETS[-1]
+
+def _key_lock(key: str) -> threading.Lock:
+    return _locks[hash(key) % len(_locks)]
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# ---- registry: key <-> upstream url -----------------------------------------
+
+def proxy_url(upstream: str, width: Optional[int] = None) -> str:
+    """URL картинки через прокси. Пустой/локальный (/ui/...) url возвращаем как есть."""
+    if not upstream or not upstream.startswith(("http://", "https://")) or not enabled():
+        return upstream
+    key = hashlib.sha256(upstream.encode("utf-8")).hexdigest()[:32]
+    if _sources.get(key) != upstream:
+        _sources[key] = upstream
+        src_file = cache_dir() / "src" / key
+        if not src_file.exists():
+            try:
+                # чтобы ключ понимали и другие воркеры, и процесс после рестарта
+                _atomic_write(src_file, upstream.encode("utf-8"))
+            except OSError as e:
+                log.warning("cannot persist source: %s", e)
+    return f"/img/{key}?w={bucket(width or default_width())}"
+
+def source_url(key: str) -> Optional[str]:
+    url = _sources.get(key)
+    if url is None:
+        try:
+            url = (cache_dir() / "src" / key).read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+        if url:
+            _sources[key] = url
+    return url
+
+
+# ---- originals (content-addressed) -------------------------------------------
+
+def _download(url: str) -> Tuple[bytes, str]:
+    """(тело, content-type) из upstream: потоком, не больше max_bytes(), в пределах бюджета запроса."""
+    limit = max_bytes()
+    with requests.get(url, timeout=deadline.timeout(_DOWNLOAD_TIMEOUT), stream=True) as r:
+        r.raise_for_status()
+        declared = r.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > limit:
+            raise ValueError(f"image too large: {declared} bytes > {limit}")
+        chunks, size = [], 0
+        for chunk in r.iter_content(_CHUNK):
+            size += len(chunk)
+            if size > limit:
+                raise ValueError(f"image too large: over {limit} bytes")
+            deadline.check()
+            chunks.append(chunk)
+        ctype = (r.headers.get("Content-Type") or "application/octet-stream").split(";")[0].strip()
+    return b"".join(chunks), ctype
+
+def _original(key: str) -> Optional[Tuple[Path, str]]:
+    """(путь к оригиналу, content-type). Скачивает из upstream один раз."""
+    ref = cache_dir() / "ref" / key
+    blobs = cache_dir() / "blobs"
+
+    def _read_ref() -> Optional[Tuple[Path, str]]:
+        try:
+            digest, ctype = ref.read_text(encoding="utf-8").split("\n", 1)
+        except (OSError, ValueError):
+            return None
+        blob = blobs / digest
+        return (blob, ctype.strip()) if blob.exists() else None
+
+    found = _read_ref()
+    if found:
+        return found
+
+    upstream = source_url(key)
+    if not upstream:
+        return None
+
+    with _key_lock(key):
+        found = _read_ref()  # пока ждали лок, мог скачать соседний поток
+        if found:
+            return found
+        data, ctype = _download(upstream)
+        digest = hashlib.sha256(data).hexdigest()
+        blob = blobs / digest
+        if not blob.exists():
+            _atomic_write(blob, data)
+        _atomic_write(ref, f"{digest}\n{ctype}".encode("utf-8"))
+        return blob, ctype
+
+
+# ---- variants -----------------------------------------------------------------
+
+def _pillow():
+    try:
+        from PIL import Image, features  # type: ignore
+    except ImportError:
+        return None, False
+    return Image, bool(features.check("webp"))
+
+def variant(key: str, width: Optional[int], accept: str = "") -> Optional[Tuple[Path, str]]:
+    """(файл, mimetype) для ключа и ширины; None — ключ неизвестен."""
+    orig = _original(key)
+    if orig is None:
+        return None
+    blob, ctype = orig
+
+    Image, has_webp = _pillow()
+    if Image is None or ctype in _PASSTHROUGH_TYPES or not ctype.startswith("image/"):
+        return blob, ctype
+
+    want_webp = has_webp and "image/webp" in (accept or "")
+    w = bucket(width)
+    fmt, ext, mime = ("WEBP", "webp", "image/webp") if want_webp else ("JPEG", "jpg", "image/jpeg")
+    out = cache_dir() / "variants" / f"{blob.name}_w{w}.{ext}"
+    if out.exists():
+        return out, mime
+    if fmt == "JPEG" and out.with_suffix(".png").exists():
+        return out.with_suffix(".png"), "image/png"
+
+    with _key_lock(f"{blob.name}:{w}:{ext}"):
+        if out.exists():
+            return out, mime
+        try:
+            with Image.open(blob) as im:
+                im.load()
+                has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+                if fmt == "JPEG" and has_alpha:
+                    # JPEG без альфы: прозрачное отдаём PNG, чтобы не получить чёрный фон
+                    fmt, ext, mime = "PNG", "png", "image/png"
+                    out = out.with_suffix(".png")
+                    if out.exists():
+                        return out, mime
+                if im.width > w:
+                    im = im.resize((w, max(1, round(im.height * w / im.width))), Image.LANCZOS)
+                if fmt == "JPEG":
+                    im = im.convert("RGB")
+                elif im.mode not in ("RGB", "RGBA"):
+                    im = im.convert("RGBA" if has_alpha else "RGB")
+                tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+                out.parent.mkdir(parents=True, exist_ok=True)
+                save_opts = {"quality": 82} if fmt in ("JPEG", "WEBP") else {"optimize": True}
+                im.save(tmp, fmt, **save_opts)
+                os.replace(tmp, out)
+        except Exception as e:
+            log.warning("resize failed, serving original: %s", e)
+            return blob, ctype
+    return out, mime
+
+
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="600" height="600" viewBox="0 0 600 600">'
+    '<rect width="600" height="600" fill="#EEEEEE"/>'
+    '<text x="300" y="316" font-family="sans-serif" font-size="48" fill="#AAAAAA" '
+    'text-anchor="middle">img</text></svg>'
+)
+
+
+__all__ = ["proxy_url", "source_url", "variant", "bucket", "enabled", "PLACEHOLDER_SVG", "WIDTH_BUCKETS"]
@@ -0,0 +1,96 @@
+# apps/backend/core/json_stream.py
+"""Потоковая JSON-сериализация больших деревьев карточек.
+
+json.dumps строит весь ответ одной строкой: на мегабайтном /home это копия
+всего дерева в памяти, и первый байт уходит только после последнего. Здесь
+дерево обходится сверху, а поддеревья меньше `leaf_nodes` узлов (карточка,
+ячейка сетки) кодируются целиком быстрым C-энкодером — так большие узлы
+(табы, сетка вкладки) отдаются кусками по мере кодирования, а на один узел
+не тратится питоновский обход.
+
+Результат байт-в-байт совпадает с json.dumps(obj, separators=(",", ":"),
+ensure_ascii=..., sort_keys=...).
+"""
+from __future__ import annotations
+import json
+from typing import Any, Iterable, Iterator, List
+
+CHUNK_SIZE = 64 * 1024
+LEAF_NODES = 256
+
+
+def _small(node: Any, budget: int) -> bool:
+    """True, если в поддереве не больше budget контейнеров/элементов (обход обрывается рано)."""
+    stack = [node]
+    while stack:
+        o = stack.pop()
+        if isinstance(o, dict):
+            budget -= len(o)
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple)):
+            budget -= len(o)
+            stack.extend(o)
+        if budget < 0:
+            return False
+    return True
+
+
+def iter_fragments(obj: Any, *, ensure_ascii: bool = True, sort_keys: bool = False,
+                   leaf_nodes: int = LEAF_NODES) -> Iterator[str]:
+    """Фрагменты JSON по порядку; каждое маленькое поддерево — один фрагмент."""
+    encode = json.JSONEncoder(ensure_ascii=ensure_ascii, sort_keys=sort_keys, separators=(",", ":")).encode
+
+    def _walk(node: Any) -> Iterator[str]:
+        if isinstance(node, dict) and node and all(isinstance(k, str) for k in node) and not _small(node, leaf_nodes):
+            items = sorted(node.items()) if sort_keys else node.items()
+            sep = "{"
+            for k, v in items:
+                yield sep + encode(k) + ":"
+                yield from _walk(v)
+                sep = ","
+            yield "}"
+        elif isinstance(node, (list, tuple)) and node and not _small(node, leaf_nodes):
+            sep = "["
+            for v in node:
+                yield sep
+                yield from _walk(v)
+                sep = ","
+            yield "]"
+        else:
+            yield encode(node)
+
+    return _walk(obj)
+
+
+def iter_json(obj: Any, *, ensure_ascii: bool = True, sort_keys: bool = False,
+              chunk_size: int = CHUNK_SIZE, leaf_nodes: int = LEAF_NODES) -> Iterator[bytes]:
+    """JSON-байты кусками не меньше chunk_size (последний — сколько осталось).
+    Фрагмент никогда не режется между кусками: строковое значение целиком в одном куске.
+    """
+    return coalesce(
+        (f.encode("utf-8") for f in iter_fragments(obj, ensure_ascii=ensure_ascii, sort_keys=sort_keys,
+                                                    leaf_nodes=leaf_nodes)),
+        chunk_size,
+    )
+
+
+def coalesce(pieces: Iterable[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Склеить мелкие куски в куски ~chunk_size; большие отдаются как есть, без копии."""
+    buf: List[bytes] = []
+    size = 0
+    for piece in pieces:
+        if not piece:
+            continue
+        if len(piece) >= chunk_size and not buf:
+            yield piece
+            continue
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+__all__ = ["iter_fragments", "iter_json", "coalesce", "CHUNK_SIZE", "LEAF_NODES"]
@@ -0,0 +1,104 @@
+# apps/backend/core/lkg.py
+"""Last-known-good: последние удачные данные для деградированного ответа.
+
+Когда Strapi не ответил или бюджет запроса (core/deadline.py) кончился, /home
+раньше показывал вкладку «Ошибка», а урок — пустой шаблон. Теперь маршруты
+после каждой удачной загрузки кладут сюда данные, из которых строится ответ
+(строки табов /home, слова урока), и при сбое отдают их — с пометкой, что ответ
+устаревший (заголовки X-Stale: 1 и Age).
+
+Хранится в памяти процесса и на диске (JSON-файл на ключ, атомарная запись):
+переживает рестарт и видно соседним воркерам. На диск пишется только изменившееся
+значение (по отпечатку), чтобы удачные запросы не делали I/O каждый раз.
+
+ENV:
+  LKG       — "0"/"off" выключает (сбой — прежняя деградация);
+  LKG_DIR   — каталог файлов (по умолчанию apps/backend/.cache/lkg).
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from core import memdiag
+from core.logs import get_logger
+from core.paths import BACKEND_DIR
+
+log = get_logger("lkg")
+_mem: Dict[Tuple[str, str], Tuple[Any, float, str]] = {}   # (kind, key) -> (value, saved, отпечаток)
+_written: Dict[Tuple[str, str], float] = {}                 # когда ключ последний раз писался на диск
+_lock = threading.Lock()
+_REWRITE = 60.0
+
+memdiag.register_cache("lkg.entries", _mem)
+
+
+def enabled() -> bool:
+    return str(os.getenv("LKG", "1")).lower() not in ("0", "false", "no", "off")
+
+def lkg_dir() -> Path:
+    return Path(os.getenv("LKG_DIR") or (BACKEND_DIR / ".cache" / "lkg"))
+
+def _file(kind: str, key: str) -> Path:
+    digest = hashlib.sha1(f"{kind}\0{key}".encode("utf-8")).hexdigest()[:24]
+    return lkg_dir() / f"{kind}-{digest}.json"
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def remember(kind: str, key: str, value: Any, *, fingerprint: Optional[str] = None) -> None:
+    """Запомнить удачные данные (JSON-совместимые). fingerprint — готовый отпечаток, если есть."""
+    if not enabled():
+        return
+    if fingerprint is None:
+        blob = json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        fingerprint = hashlib.sha1(blob).hexdigest()[:16]
+    now = time.time()
+    with _lock:
+        cur = _mem.get((kind, key))
+        _mem[(kind, key)] = (value, now, fingerprint)
+        if cur is not None and cur[2] == fingerprint and now - _written.get((kind, key), 0.0) < _REWRITE:
+            return      # то же самое уже на диске; время сохранения там обновляется не чаще _REWRITE
+        _written[(kind, key)] = now
+    try:
+        payload = {"kind": kind, "key": key, "saved": now, "fingerprint": fingerprint, "value": value}
+        _atomic_write(_file(kind, key), json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    except (OSError, TypeError, ValueError) as e:
+        log.warning("persist failed: %s", e, extra={"kind": kind})
+
+def recall(kind: str, key: str) -> Optional[Tuple[Any, float]]:
+    """(данные, возраст в секундах) последней удачной версии или None."""
+    if not enabled():
+        return None
+    with _lock:
+        cur = _mem.get((kind, key))
+    if cur is None:
+        try:
+            with open(_file(kind, key), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            cur = (payload["value"], float(payload["saved"]), str(payload.get("fingerprint") or ""))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        with _lock:
+            _mem.setdefault((kind, key), cur)
+    return cur[0], max(time.time() - cur[1], 0.0)
+
+
+def mark_stale(resp, age: float):
+    """Пометить ответ как устаревший (данные из last-known-good)."""
+    resp.headers["X-Stale"] = "1"
+    resp.headers["Age"] = str(int(age))
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+__all__ = ["enabled", "lkg_dir", "remember", "recall", "mark_stale"]
@@ -0,0 +1,240 @@
+# apps/backend/core/logs.py
+"""Структурные логи без блокировки потока запроса.
+
+Раньше маршруты писали print() на каждый запрос: небуферизованная запись в
+stdout в потоке запроса сериализует запросы между собой. Теперь:
+  - логгеры "worb.<name>" (get_logger) кладут запись в очередь (QueueHandler) —
+    это дешёво и не ждёт I/O; пишет в stdout один фоновый поток (QueueListener);
+  - запись — одна JSON-строка: ts, level, logger, msg, request_id, path,
+    elapsed_ms (с начала запроса) и поля из extra=...;
+  - request id берётся из заголовка X-Request-Id (или генерируется) и
+    возвращается в ответе; в фоновых потоках его нет;
+  - повторяющиеся WARNING+ с одинаковым шаблоном сообщения ограничены:
+    не больше LOG_RATE_LIMIT за LOG_RATE_WINDOW секунд, число проглоченных
+    приходит полем "suppressed" в следующей записи.
+
+ENV:
+  LOG_LEVEL        — общий уровень (INFO);
+  LOG_LEVELS       — уровни отдельных логгеров: "home=DEBUG,access=WARNING";
+  LOG_FORMAT       — "json" (по умолчанию) или "text" для разработки;
+  LOG_RATE_LIMIT   — сколько одинаковых предупреждений пропускать за окно (10, 0 — без лимита);
+  LOG_RATE_WINDOW  — окно лимита, сек (60).
+"""
+from __future__ import annotations
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+ROOT = "worb"
+REQUEST_ID_HEADER = "X-Request-Id"
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_request_path: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_path", default=None)
+_request_t0: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_t0", default=None)
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+
+# поля LogRecord, которые не относятся к extra=...
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(float(os.getenv(name, str(default))), 0.0)
+    except ValueError:
+        return default
+
+
+# ---- request context ------------------------------------------------------------
+
+def request_id() -> Optional[str]:
+    return _request_id.get()
+
+def begin_request(rid: Optional[str], path: str) -> str:
+    """Запомнить id/путь/начало запроса в контексте текущего потока (корутины)."""
+    rid = (rid or "").strip()[:64] or uuid.uuid4().hex[:16]
+    _request_id.set(rid)
+    _request_path.set(path)
+    _request_t0.set(time.perf_counter())
+    return rid
+
+def elapsed_ms() -> Optional[float]:
+    t0 = _request_t0.get()
+    return round((time.perf_counter() - t0) * 1000, 2) if t0 is not None else None
+
+def end_request() -> None:
+    _request_id.set(None)
+    _request_path.set(None)
+    _request_t0.set(None)
+
+
+class _ContextFilter(logging.Filter):
+    """Снимает request id и тайминг в потоке запроса — до очереди, пока контекст жив."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        record.path = _request_path.get()
+        record.elapsed_ms = elapsed_ms()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше `limit` одинаковых (логгер + шаблон) WARNING+ за `window` секунд."""
+
+    def __init__(self, limit: int, window: float) -> None:
+        super().__init__()
+        self.limit, self.window = limit, window
+        self._seen: Dict[Tuple[str, str], list] = {}   # key -> [начало окна, пропущено в окне, проглочено]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno < logging.WARNING:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            slot = self._seen.get(key)
+            if slot is None or now - slot[0] >= self.window:
+                suppressed = slot[2] if slot else 0
+                self._seen[key] = [now, 1, 0]
+            elif slot[1] < self.limit:
+                slot[1] += 1
+                suppressed, slot[2] = slot[2], 0
+            else:
+                slot[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and value is not None:
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        extra = " ".join(
+            f"{k}={v}" for k, v in record.__dict__.items() if k not in _RESERVED and v is not None
+        )
+        line = f"[{record.name.removeprefix(ROOT + '.')}] {record.levelname} {record.getMessage()}"
+        line = f"{line} {extra}" if extra else line
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+# ---- setup ------------------------------------------------------------------------
+
+def _levels() -> Dict[str, str]:
+    levels = {ROOT: (os.getenv("LOG_LEVEL") or "INFO").upper()}
+    for item in (os.getenv("LOG_LEVELS") or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[f"{ROOT}.{name.strip()}"] = level.strip().upper()
+    return levels
+
+def setup_logging(force: bool = False) -> None:
+    """Подключить очередь и фоновый писатель к логгеру "worb" (один раз на процесс).
+    После fork поток писателя не наследуется — повторный вызов в ребёнке поднимает новый.
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid() and not force:
+        return
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid() and not force:
+            return
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+
+        sink = logging.StreamHandler(sys.stdout)
+        text = (os.getenv("LOG_FORMAT") or "json").lower() == "text"
+        sink.setFormatter(TextFormatter() if text else JsonFormatter())
+
+        q: queue.SimpleQueue = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(q)
+        handler.addFilter(_ContextFilter())
+        handler.addFilter(RateLimitFilter(int(_env_float("LOG_RATE_LIMIT", 10)), _env_float("LOG_RATE_WINDOW", 60)))
+
+        root = logging.getLogger(ROOT)
+        root.handlers[:] = [handler]
+        root.propagate = False
+        for name, level in _levels().items():
+            try:
+                logging.getLogger(name).setLevel(level)
+            except (ValueError, TypeError):
+                root.warning("unknown log level", extra={"target": name, "level_name": level})
+
+        _listener = logging.handlers.QueueListener(q, sink, respect_handler_level=False)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+def shutdown_logging() -> None:
+    """Дописать очередь и остановить фоновый поток."""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+# ---- Flask ------------------------------------------------------------------------
+
+def install_request_logging(app) -> None:
+    """Request id и access-лог (logger "worb.access") для Flask-приложения."""
+    access = get_logger("access")
+
+    @app.before_request
+    def _begin():
+        from flask import request
+        begin_request(request.headers.get(REQUEST_ID_HEADER), request.path)
+
+    @app.after_request
+    def _finish(resp):
+        from flask import request
+        rid = request_id()
+        if rid:
+            resp.headers.setdefault(REQUEST_ID_HEADER, rid)
+        if access.isEnabledFor(logging.INFO):
+            access.info("request", extra={"method": request.method, "status": resp.status_code})
+        return resp
+
+    @app.teardown_request
+    def _end(_exc):
+        end_request()
+
+
+__all__ = [
+    "get_logger", "setup_logging", "shutdown_logging", "install_request_logging",
+    "begin_request", "end_request", "request_id", "elapsed_ms",
+    "JsonFormatter", "TextFormatter", "RateLimitFilter", "REQUEST_ID_HEADER",
+]
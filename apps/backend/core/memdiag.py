@@ -0,0 +1,198 @@
+# apps/backend/core/memdiag.py
+"""Диагностика памяти воркера: реестр кэшей с оценкой размера + tracemalloc.
+
+Кэши (шаблоны, токены, ответы Strapi, готовые карточки, индекс каталога...)
+регистрируются здесь по имени; /admin/mem/caches показывает для каждого число
+записей и оценку байт (глубокий sys.getsizeof с учётом общих объектов). Большие
+кэши оцениваются по выборке и экстраполируются — отчёт не должен вешать воркер.
+
+tracemalloc включается/выключается на лету; снимки хранятся в памяти процесса
+(последний и предыдущий), их diff показывает, какие места кода растят память
+между двумя моментами.
+"""
+from __future__ import annotations
+import os
+import sys
+import threading
+import tracemalloc
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_SAMPLE = 500                    # сколько записей большого кэша измерять честно
+
+_registry: Dict[str, Tuple[Callable[[], Any], Optional[Callable[[Any], Dict[str, Any]]]]] = {}
+_snapshots: Dict[str, tracemalloc.Snapshot] = {}
+_lock = threading.Lock()
+
+
+# ---- cache registry --------------------------------------------------------------
+
+def register_cache(name: str, target: Any, *, describe: Optional[Callable[[Any], Dict[str, Any]]] = None) -> None:
+    """Зарегистрировать кэш: сам контейнер или функцию, возвращающую его (для подменяемых ссылок).
+    describe(obj) — необязательные доп. поля отчёта (например, размер файла БД).
+    """
+    getter = target if callable(target) else (lambda: target)
+    _registry[name] = (getter, describe)
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Оценка байт объекта со всем, на что он ссылается (каждый объект — один раз)."""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        oid = id(o)
+        if oid in seen:
+            continue
+        seen.add(oid)
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, bytearray, int, float, bool, type(None), array)):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            slots = getattr(type(o), "__slots__", ())
+            for s in ((slots,) if isinstance(slots, str) else slots):
+                if hasattr(o, s):
+                    stack.append(getattr(o, s))
+            d = getattr(o, "__dict__", None)
+            if d is not None:
+                stack.append(d)
+    return total
+
+def _entries(obj: Any) -> Optional[int]:
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+def _estimate(obj: Any) -> Tuple[int, bool]:
+    """(байт, exact). Для больших dict/list — по выборке из _SAMPLE записей."""
+    n = _entries(obj)
+    if n is None or n <= _SAMPLE or not isinstance(obj, (dict, list, tuple, set, frozenset)):
+        return deep_sizeof(obj), True
+    seen: set = set()
+    sample_bytes = 0
+    items = obj.items() if isinstance(obj, dict) else obj
+    for i, item in enumerate(items):
+        if i >= _SAMPLE:
+            break
+        sample_bytes += deep_sizeof(item, seen)
+    return sys.getsizeof(obj) + int(sample_bytes * n / _SAMPLE), False
+
+def cache_report() -> Dict[str, Any]:
+    caches = []
+    total = 0
+    for name in sorted(_registry):
+        getter, describe = _registry[name]
+        row: Dict[str, Any] = {"name": name}
+        try:
+            obj = getter()
+            size, exact = _estimate(obj)
+            row.update({"entries": _entries(obj), "bytes": size, "exact": exact})
+            if describe is not None:
+                row.update(describe(obj))
+            total += size
+        except Exception as e:
+            row["error"] = str(e)
+        caches.append(row)
+    return {"rss_bytes": rss_bytes(), "caches_bytes": total, "caches": caches}
+
+def rss_bytes() -> Optional[int]:
+    """Текущий RSS процесса (Linux /proc), иначе пиковый из getrusage."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+# ---- tracemalloc --------------------------------------------------------------------
+
+def tracing_status() -> Dict[str, Any]:
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "snapshots": sorted(_snapshots),
+        "pid": os.getpid(),
+    }
+
+def start_tracing(frames: int = 1) -> Dict[str, Any]:
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, min(frames, 64)))
+    return tracing_status()
+
+def stop_tracing() -> Dict[str, Any]:
+    with _lock:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _snapshots.clear()  # снимки без трассировки сравнивать не с чем
+    return tracing_status()
+
+def take_snapshot() -> Dict[str, Any]:
+    """Снять снимок: прежний "latest" становится "previous"."""
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    snap = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    with _lock:
+        if "latest" in _snapshots:
+            _snapshots["previous"] = _snapshots["latest"]
+        _snapshots["latest"] = snap
+    return tracing_status()
+
+def _frames(stat) -> List[str]:
+    return [f"{fr.filename}:{fr.lineno}" for fr in stat.traceback]
+
+def top_allocations(n: int = 20, group: str = "lineno") -> Dict[str, Any]:
+    snap = _snapshots.get("latest")
+    if snap is None:
+        raise RuntimeError("no snapshot: POST /admin/mem/snapshot first")
+    group = group if group in ("lineno", "filename", "traceback") else "lineno"
+    stats = snap.statistics(group)
+    return {
+        "group": group,
+        "total_bytes": sum(s.size for s in stats),
+        "top": [{"where": _frames(s), "bytes": s.size, "count": s.count} for s in stats[:max(n, 1)]],
+    }
+
+def diff_allocations(n: int = 20, group: str = "lineno") -> Dict[str, Any]:
+    new, old = _snapshots.get("latest"), _snapshots.get("previous")
+    if new is None or old is None:
+        raise RuntimeError("need two snapshots: POST /admin/mem/snapshot twice")
+    group = group if group in ("lineno", "filename", "traceback") else "lineno"
+    stats = new.compare_to(old, group)
+    return {
+        "group": group,
+        "delta_bytes": sum(s.size_diff for s in stats),
+        "top": [
+            {"where": _frames(s), "bytes": s.size, "delta_bytes": s.size_diff,
+             "count": s.count, "delta_count": s.count_diff}
+            for s in stats[:max(n, 1)]
+        ],
+    }
+
+
+__all__ = [
+    "register_cache", "deep_sizeof", "cache_report", "rss_bytes",
+    "tracing_status", "start_tracing", "stop_tracing", "take_snapshot",
+    "top_allocations", "diff_allocations",
+]
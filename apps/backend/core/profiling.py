@@ -0,0 +1,224 @@
+# apps/backend/core/profiling.py
+"""Сэмплирующий профайлер запросов (cProfile) — опциональный WSGI-middleware.
+
+Профилируется доля запросов PROFILE_SAMPLE_RATE и любой запрос с заголовком
+`X-Profile: <ADMIN_TOKEN>`. Каждый профиль — файл pstats (`*.prof`) в
+PROFILE_DIR; хранятся последние PROFILE_KEEP файлов. Файлы открываются
+snakeviz / flameprof (flamegraph) / `python -m pstats`, а сводный top-N
+горячих функций отдаёт /admin/profile/top (routes/admin.py).
+
+Одновременно профилируется не больше одного запроса (cProfile в 3.12+
+допускает только один активный профайлер); остальные в это время идут без
+профиля. Запись файла и ротация — в отдельном потоке-писателе (очередь до
+_SAVE_QUEUE профилей, лишние отбрасываются), не в потоке запроса. Async-маршруты asgi.py идут мимо WSGI и не профилируются.
+
+ENV:
+  PROFILE_SAMPLE_RATE — доля запросов под профайлером, 0..1 (0 — только по заголовку);
+  PROFILE_DIR         — каталог профилей (по умолчанию apps/backend/.cache/profiles);
+  PROFILE_KEEP        — сколько последних профилей хранить (200);
+  ADMIN_TOKEN         — токен для X-Profile и /admin/* (без него заголовок игнорируется).
+"""
+from __future__ import annotations
+import cProfile
+import hmac
+import os
+import pstats
+import queue
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from core.logs import get_logger
+from core.paths import BACKEND_DIR
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+_busy = threading.Lock()
+log = get_logger("profile")
+_seq = 0                       # только в потоке-писателе
+_SAVE_QUEUE = 32
+_saves: "queue.Queue[tuple]" = queue.Queue(maxsize=_SAVE_QUEUE)
+_writer_lock = threading.Lock()
+_writer_pid = 0
+
+
+def sample_rate() -> float:
+    try:
+        return min(max(float(os.getenv("PROFILE_SAMPLE_RATE", "0")), 0.0), 1.0)
+    except ValueError:
+        return 0.0
+
+def profile_dir() -> Path:
+    return Path(os.getenv("PROFILE_DIR") or (BACKEND_DIR / ".cache" / "profiles"))
+
+def _keep() -> int:
+    try:
+        return max(int(os.getenv("PROFILE_KEEP", "200")), 1)
+    except ValueError:
+        return 200
+
+def admin_token() -> str:
+    return os.getenv("ADMIN_TOKEN", "")
+
+def token_ok(value: Optional[str]) -> bool:
+    token = admin_token()
+    return bool(token) and bool(value) and hmac.compare_digest(str(value), token)
+
+def enabled() -> bool:
+    return sample_rate() > 0 or bool(admin_token())
+
+
+# ---- storage ------------------------------------------------------------------
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+
+def _save(prof: cProfile.Profile, method: str, path: str, elapsed_ms: float) -> Path:
+    global _seq
+    out_dir = profile_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _seq += 1
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{_seq:05d}_{method}_{_slug(path)}_{int(elapsed_ms)}ms.prof"
+    out = out_dir / name
+    tmp = out.with_suffix(".tmp")
+    prof.dump_stats(str(tmp))
+    os.replace(tmp, out)
+    _rotate(out_dir)
+    return out
+
+def _write_loop() -> None:
+    while True:
+        args = _saves.get()
+        try:
+            _save(*args)
+        except Exception as e:
+            log.warning("save failed: %s", e)
+
+def _enqueue_save(prof: cProfile.Profile, method: str, path: str, elapsed_ms: float) -> None:
+    """Отдать профиль потоку-писателю (поднимается лениво и заново после fork)."""
+    global _writer_pid
+    if _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer_pid != os.getpid():
+                threading.Thread(target=_write_loop, name="profile-writer", daemon=True).start()
+                _writer_pid = os.getpid()
+    try:
+        _saves.put_nowait((prof, method, path, elapsed_ms))
+    except queue.Full:
+        log.debug("save queue full, profile dropped", extra={"path": path})
+
+def _mtime(p: Path) -> float:
+    try:
+        return p.stat().st_mtime
+    except OSError:  # файл удалила ротация другого процесса
+        return 0.0
+
+def _rotate(out_dir: Path) -> None:
+    files = sorted(out_dir.glob("*.prof"), key=_mtime)
+    for old in files[:-_keep()]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+def list_profiles(path_filter: str = "") -> List[Path]:
+    """Профили (новые последними); path_filter — подстрока пути запроса ("/home")."""
+    files = sorted(profile_dir().glob("*.prof"), key=_mtime)
+    if path_filter:
+        needle = f"_{_slug(path_filter)}_"
+        files = [p for p in files if needle in p.name]
+    return files
+
+
+# ---- report -------------------------------------------------------------------
+
+_SORTS = {"tottime", "cumtime", "ncalls"}
+
+def top_functions(n: int = 30, sort: str = "tottime", path_filter: str = "",
+                  last: int = 0) -> Dict[str, Any]:
+    """Сводный top-N функций по сохранённым профилям."""
+    files = list_profiles(path_filter)
+    if last > 0:
+        files = files[-last:]
+    if not files:
+        return {"profiles": 0, "functions": []}
+    sort = sort if sort in _SORTS else "tottime"
+    stats: Optional[pstats.Stats] = None
+    loaded = 0
+    for f in files:
+        try:
+            if stats is None:
+                stats = pstats.Stats(str(f))
+            else:
+                stats.add(str(f))
+            loaded += 1
+        except Exception as e:  # файл мог уехать в ротацию между glob и чтением
+            log.warning("skip %s: %s", f.name, e)
+    if stats is None:
+        return {"profiles": 0, "functions": []}
+
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            "function": f"{func} ({Path(filename).name}:{line})" if line else func,
+            "file": filename,
+            "ncalls": nc,
+            "primcalls": cc,
+            "tottime_ms": round(tt * 1000, 3),
+            "cumtime_ms": round(ct * 1000, 3),
+        })
+    key = {"tottime": "tottime_ms", "cumtime": "cumtime_ms", "ncalls": "ncalls"}[sort]
+    rows.sort(key=lambda r: r[key], reverse=True)
+    return {
+        "profiles": loaded,
+        "total_time_ms": round(stats.total_tt * 1000, 3),
+        "sort": sort,
+        "functions": rows[:max(n, 1)],
+    }
+
+
+# ---- middleware ------------------------------------------------------------------
+
+class ProfilerMiddleware:
+    """WSGI-обёртка: профилирует выбранные запросы (вызов приложения, без отдачи тела)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    def _wanted(self, environ) -> bool:
+        if token_ok(environ.get(PROFILE_HEADER)):
+            return True
+        rate = sample_rate()
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ) or not _busy.acquire(blocking=False):
+            return self.app(environ, start_response)
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        try:
+            prof.enable()
+            try:
+                return self.app(environ, start_response)
+            finally:
+                prof.disable()
+        finally:
+            elapsed = (time.perf_counter() - t0) * 1000
+            _busy.release()
+            _enqueue_save(prof, environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", "/"), elapsed)
+
+
+def install_profiler(app) -> bool:
+    """Обернуть app.wsgi_app, если профилирование включено (PROFILE_SAMPLE_RATE или ADMIN_TOKEN)."""
+    if not enabled():
+        return False
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app)
+    return True
+
+
+__all__ = [
+    "ProfilerMiddleware", "install_profiler", "top_functions", "list_profiles",
+    "token_ok", "admin_token", "sample_rate", "profile_dir",
+]
@@ -0,0 +1,201 @@
+# apps/backend/core/progress.py
+"""Прогресс пользователя по урокам: SQLite (WAL) + отложенная пакетная запись.
+
+Состояние урока хранится в тех же значениях, что state_id карточки на /home:
+  "0" — обычный, "1" — пройден (brand), "2" — закрыт (disabled).
+
+Запись не ходит в БД на каждый запрос: record() кладёт изменение в буфер,
+фоновый поток сбрасывает буфер одной транзакцией раз в PROGRESS_FLUSH_INTERVAL
+секунд (или сразу, если набралось PROGRESS_BATCH изменений). states() читает
+БД и накрывает её ещё не сброшенным буфером — свой воркер видит запись сразу,
+соседние — после сброса.
+
+Пользователь — cookie `worb_uid` (ставит POST /progress) или заголовок
+`X-User-Id` для не-браузерных клиентов. Заголовку на слово не верим (любой
+клиент назвался бы чужим id): значение — "<id>.<подпись>", подпись —
+HMAC-SHA256 от id на PROGRESS_SECRET (sign_user_id; POST /progress отдаёт её
+новому пользователю). Без PROGRESS_SECRET заголовок игнорируется.
+
+ENV:
+  PROGRESS_DB_PATH         — файл БД (по умолчанию apps/backend/.cache/progress.sqlite3);
+  PROGRESS_FLUSH_INTERVAL  — период сброса буфера, сек (0.5);
+  PROGRESS_BATCH           — размер буфера для внеочередного сброса (256);
+  PROGRESS_SECRET          — ключ подписи X-User-Id (без него заголовок не принимается).
+"""
+from __future__ import annotations
+import atexit
+import hashlib
+import hmac
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from core import memdiag
+from core.logs import get_logger
+from core.paths import BACKEND_DIR
+
+USER_COOKIE = "worb_uid"
+USER_HEADER = "X-User-Id"
+_UID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    user_id   TEXT    NOT NULL,
+    lesson_id INTEGER NOT NULL,
+    state     TEXT    NOT NULL,
+    updated   REAL    NOT NULL,
+    PRIMARY KEY (user_id, lesson_id)
+);
+"""
+
+log = get_logger("progress")
+_pending: Dict[Tuple[str, int], Tuple[str, float]] = {}
+_pending_lock = threading.Lock()
+_wake = threading.Event()
+_flusher: Optional[threading.Thread] = None
+_flusher_pid: Optional[int] = None
+_tls = threading.local()
+
+memdiag.register_cache("progress.pending", _pending)
+
+
+def db_path() -> Path:
+    return Path(os.getenv("PROGRESS_DB_PATH") or (BACKEND_DIR / ".cache" / "progress.sqlite3"))
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return max(float(os.getenv(name, str(default))), 0.0)
+    except ValueError:
+        return default
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_tls, "conn", None)
+    if conn is not None and getattr(_tls, "pid", None) == os.getpid():
+        return conn
+    path = db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=5, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _tls.conn, _tls.pid = conn, os.getpid()
+    return conn
+
+
+# ---- user id ------------------------------------------------------------------
+
+def valid_user_id(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip()
+    return value if _UID_RE.fullmatch(value) else None
+
+def _secret() -> bytes:
+    return os.getenv("PROGRESS_SECRET", "").encode("utf-8")
+
+def _signature(uid: str, secret: bytes) -> str:
+    return hmac.new(secret, uid.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+def sign_user_id(uid: str) -> Optional[str]:
+    """Значение X-User-Id для uid ("<id>.<подпись>"); None — PROGRESS_SECRET не задан."""
+    secret = _secret()
+    return f"{uid}.{_signature(uid, secret)}" if secret else None
+
+def verified_user_id(value: Optional[str]) -> Optional[str]:
+    """Id из подписанного значения X-User-Id; None — подписи нет, она неверна или нет ключа."""
+    secret = _secret()
+    uid, _, sig = (value or "").strip().rpartition(".")
+    if not secret or not valid_user_id(uid):
+        return None
+    return uid if hmac.compare_digest(sig, _signature(uid, secret)) else None
+
+def request_user_id(req) -> Optional[str]:
+    """Id пользователя из запроса Flask (подписанный заголовок важнее cookie) или None."""
+    return verified_user_id(req.headers.get(USER_HEADER)) or valid_user_id(req.cookies.get(USER_COOKIE))
+
+def new_user_id() -> str:
+    return uuid.uuid4().hex
+
+
+# ---- write-behind ---------------------------------------------------------------
+
+def flush() -> int:
+    """Сбросить буфер в БД одной транзакцией. Возвращает число записанных строк."""
+    with _pending_lock:
+        if not _pending:
+            return 0
+        batch = [(uid, lid, state, ts) for (uid, lid), (state, ts) in _pending.items()]
+        _pending.clear()
+    try:
+        conn = _conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO progress (user_id, lesson_id, state, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id, lesson_id) DO UPDATE SET state=excluded.state, updated=excluded.updated "
+                "WHERE excluded.updated >= progress.updated",
+                batch,
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        log.warning("flush failed, will retry: %s", e, extra={"batch": len(batch)})
+        with _pending_lock:
+            for uid, lid, state, ts in batch:
+                cur = _pending.get((uid, lid))
+                if cur is None or cur[1] < ts:
+                    _pending[(uid, lid)] = (state, ts)
+        return 0
+    return len(batch)
+
+def _flush_loop() -> None:
+    while True:
+        _wake.wait(_env_num("PROGRESS_FLUSH_INTERVAL", 0.5))
+        _wake.clear()
+        flush()
+
+def _ensure_flusher() -> None:
+    global _flusher, _flusher_pid
+    if _flusher is not None and _flusher_pid == os.getpid() and _flusher.is_alive():
+        return
+    _flusher_pid = os.getpid()
+    _flusher = threading.Thread(target=_flush_loop, name="progress-flush", daemon=True)
+    _flusher.start()
+
+def record(user_id: str, lesson_id: int, state: str) -> None:
+    """Запомнить состояние урока пользователя (в БД попадёт при следующем сбросе)."""
+    with _pending_lock:
+        _pending[(user_id, int(lesson_id))] = (str(state), time.time())
+        full = len(_pending) >= _env_num("PROGRESS_BATCH", 256)
+    _ensure_flusher()
+    if full:
+        _wake.set()
+
+def states(user_id: str) -> Dict[int, str]:
+    """{lesson_id: state} пользователя: БД + ещё не сброшенный буфер."""
+    out: Dict[int, str] = {}
+    try:
+        for lid, state in _conn().execute(
+            "SELECT lesson_id, state FROM progress WHERE user_id=?", (user_id,)
+        ):
+            out[int(lid)] = state
+    except sqlite3.Error as e:
+        log.warning("read failed: %s", e)
+    with _pending_lock:
+        for (uid, lid), (state, _ts) in _pending.items():
+            if uid == user_id:
+                out[lid] = state
+    return out
+
+atexit.register(flush)
+
+
+__all__ = [
+    "USER_COOKIE", "USER_HEADER", "db_path", "valid_user_id", "sign_user_id",
+    "verified_user_id", "request_user_id", "new_user_id", "record", "states", "flush",
+]
@@ -0,0 +1,330 @@
+# apps/backend/core/search_index.py
+"""Поиск слова по всем урокам: инвертированный индекс в памяти.
+
+Запрос в Strapi с $containsi на каждое нажатие клавиши — медленно и тяжело для
+Strapi. Здесь индекс строится из слов индекса каталога (core/catalog_index.py —
+те же term/translation/level, что отдаёт to_divkit_lesson):
+  - нормализация: NFKC + casefold, диакритика снимается (ё -> е, ударения,
+    é -> e), но й остаётся й; всё, что не буква/цифра, — пробел;
+  - постинги по term (заглавные буквы ключа) и translation (строчные):
+    точное совпадение поля ("T"/"R"), префикс всего поля ("S"/"P") и префикс
+    любого токена поля ("t"/"r"), префиксы — до PREFIX_MAX символов;
+  - триграммы обоих полей ("g") — для опечаток и совпадений в середине слова,
+    когда по префиксам нашлось меньше limit.
+Документ — слово урока (урок, позиция слова); индексируются только слова, у
+которых есть шаг урока (первые LESSON_MAX_WORDS), — каждая находка открывается. Каждый постинг — кортеж id
+документов, отсортированный по статическому рангу (короче term — выше). Поиск
+идёт по ярусам: точный term > префикс term > токены term > то же для перевода >
+триграммы; внутри яруса постинг читается по порядку и останавливается на limit,
+поэтому короткий и частый запрос («п») стоит столько же, сколько редкий.
+
+Обновление инкрементальное: у каждого урока отпечаток его слов; когда индекс
+каталога подменился (фоновое обновление), пересобираются только постинги
+изменившихся, новых и удалённых уроков, остальные переиспользуются. Новый
+индекс собирается рядом и подменяется ссылкой — запросы читают старый, пока
+строится новый (как у каталога). Без индекса каталога (CATALOG_INDEX=0) поиска нет.
+"""
+from __future__ import annotations
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from core import catalog_index, memdiag
+from core.catalog import LESSON_MAX_WORDS
+from core.logs import get_logger
+
+log = get_logger("search")
+
+PREFIX_MAX = 16
+TRIGRAM_MIN = 0.7            # доля триграмм запроса, которая должна найтись в документе
+_NON_WORD = re.compile(r"[\W_]+")
+_KEEP_MARKS = {"\u0306"}          # кратка: й/ў — отдельные буквы, а не «и с ударением»
+
+Postings = Tuple[int, ...]
+
+
+def normalize(text: str) -> str:
+    """Строка для сравнения: регистр, диакритика (кроме краткой), пунктуация."""
+    if not text:
+        return ""
+    s = unicodedata.normalize("NFD", unicodedata.normalize("NFKC", text).casefold())
+    s = "".join(ch for ch in s if ch in _KEEP_MARKS or not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", unicodedata.normalize("NFC", s)).split())
+
+def _field_keys(exact: str, whole: str, token: str, text: str) -> Iterable[str]:
+    if not text:
+        return
+    yield exact + text
+    for n in range(1, min(len(text), PREFIX_MAX) + 1):
+        yield whole + text[:n]
+    for tok in text.split():
+        for n in range(1, min(len(tok), PREFIX_MAX) + 1):
+            yield token + tok[:n]
+
+def _trigrams(text: str) -> Iterable[str]:
+    if not text:
+        return
+    padded = f" {text} "
+    for i in range(len(padded) - 2):
+        yield "g" + padded[i:i + 3]
+
+def _tokens_match(words: Tuple[str, ...], tokens: List[str]) -> bool:
+    return all(any(w.startswith(t) for w in words) for t in tokens)
+
+
+class Doc:
+    __slots__ = ("lesson_id", "index", "term", "translation", "level", "level_n",
+                 "term_n", "tr_n", "term_words", "tr_words", "rank")
+
+    def __init__(self, lesson_id: int, index: int, term: str, translation: str, level: str) -> None:
+        self.lesson_id = lesson_id
+        self.index = index            # позиция слова в уроке (= шаг урока)
+        self.term = term
+        self.translation = translation
+        self.level = level
+        self.level_n = normalize(level)
+        self.term_n = normalize(term)
+        self.tr_n = normalize(translation)
+        self.term_words = tuple(self.term_n.split())
+        self.tr_words = tuple(self.tr_n.split())
+        self.rank = (len(self.term_n), lesson_id, index)
+
+    def keys(self) -> Set[str]:
+        return {
+            *_field_keys("T", "S", "t", self.term_n), *_field_keys("R", "P", "r", self.tr_n),
+            *_trigrams(self.term_n), *_trigrams(self.tr_n),
+        }
+
+
+class Hit:
+    __slots__ = ("doc", "score", "title", "slug")
+
+    def __init__(self, doc: Doc, score: float, title: str, slug: str) -> None:
+        self.doc = doc
+        self.score = score
+        self.title = title
+        self.slug = slug
+
+
+def _step_words(lesson) -> Iterable[Tuple[int, Any]]:
+    """(шаг, слово) — только слова, у которых в уроке есть шаг (первые LESSON_MAX_WORDS)."""
+    words = lesson.words
+    for i in range(min(len(words), LESSON_MAX_WORDS)):
+        yield i, words[i]
+
+def _fingerprint(lesson) -> int:
+    return hash((lesson.title, lesson.slug, tuple((w.term, w.translation, w.level) for _i, w in _step_words(lesson))))
+
+
+class SearchIndex:
+    """Неизменяемый после сборки снимок; build(catalog, prev) собирает следующий."""
+    __slots__ = ("source", "docs", "postings", "lessons", "next_id", "stats")
+
+    def __init__(self) -> None:
+        self.source = None                                  # индекс каталога, из которого собран
+        self.docs: Dict[int, Doc] = {}
+        self.postings: Dict[str, Postings] = {}
+        # id урока -> (отпечаток, заголовок, slug, id документов, ключи постингов)
+        self.lessons: Dict[int, Tuple[int, str, str, Tuple[int, ...], FrozenSet[str]]] = {}
+        self.next_id = 0
+        self.stats: Dict[str, object] = {}
+
+    @classmethod
+    def build(cls, catalog, prev: Optional["SearchIndex"] = None) -> "SearchIndex":
+        t0 = time.perf_counter()
+        new = cls()
+        new.source = catalog
+        new.next_id = prev.next_id if prev is not None else 0
+        old_lessons = prev.lessons if prev is not None else {}
+        new.docs = dict(prev.docs) if prev is not None else {}
+        postings = dict(prev.postings) if prev is not None else {}
+
+        removed: Dict[str, Set[int]] = {}
+        added: Dict[str, List[int]] = {}
+        changed = 0
+
+        def drop(old) -> None:
+            for key in old[4]:
+                removed.setdefault(key, set()).update(old[3])
+            for doc_id in old[3]:
+                new.docs.pop(doc_id, None)
+
+        for lid, lesson in catalog.by_id.items():
+            fp = _fingerprint(lesson)
+            old = old_lessons.get(lid)
+            if old is not None and old[0] == fp:
+                new.lessons[lid] = old
+                continue
+            changed += 1
+            if old is not None:
+                drop(old)
+            ids: List[int] = []
+            keys: Set[str] = set()
+            for i, w in _step_words(lesson):
+                doc = Doc(lid, i, w.term, w.translation, w.level)
+                doc_id = new.next_id
+                new.next_id += 1
+                new.docs[doc_id] = doc
+                ids.append(doc_id)
+                for key in doc.keys():
+                    keys.add(key)
+                    added.setdefault(key, []).append(doc_id)
+            new.lessons[lid] = (fp, lesson.title, lesson.slug, tuple(ids), frozenset(keys))
+
+        for lid, old in old_lessons.items():
+            if lid not in catalog.by_id:
+                changed += 1
+                drop(old)
+
+        docs = new.docs
+
+        def rank(doc_id: int):
+            return docs[doc_id].rank
+
+        for key in removed.keys() | added.keys():
+            kept = postings.get(key, ())
+            gone = removed.get(key)
+            if gone:
+                kept = [d for d in kept if d not in gone]
+            fresh = sorted(added.get(key, ()), key=rank)
+            merged = tuple(heapq.merge(kept, fresh, key=rank)) if fresh else tuple(kept)
+            if merged:
+                postings[key] = merged
+            else:
+                postings.pop(key, None)
+        new.postings = postings
+        new.stats = {
+            "docs": len(docs), "keys": len(postings), "lessons": len(new.lessons),
+            "changed": changed, "ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+        return new
+
+    # ---- поиск --------------------------------------------------------------
+
+    def _walk(self, key: str, accept: Callable[[Doc], bool]) -> Iterable[int]:
+        for doc_id in self.postings.get(key, ()):
+            if accept(self.docs[doc_id]):
+                yield doc_id
+
+    def _tokens_tier(self, tag: str, tokens: List[str], field: str) -> Iterable[int]:
+        """Документы, где каждый токен запроса — префикс токена поля: обход самого короткого постинга."""
+        shortest = min((self.postings.get(tag + t[:PREFIX_MAX], ()) for t in tokens), key=len)
+        for doc_id in shortest:
+            if _tokens_match(getattr(self.docs[doc_id], field), tokens):
+                yield doc_id
+
+    def search(self, query: str, *, limit: int = 20, level: Optional[str] = None) -> List[Hit]:
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        tokens = q.split()
+        head = q[:PREFIX_MAX]
+        want_level = normalize(level) if level else None
+        out: List[Tuple[int, float]] = []
+        seen: Set[int] = set()
+
+        tiers = (
+            (100.0, self._walk("T" + q, lambda d: True)),
+            (80.0, self._walk("S" + head, lambda d: d.term_n.startswith(q))),
+            (60.0, self._tokens_tier("t", tokens, "term_words")),
+            (50.0, self._walk("R" + q, lambda d: True)),
+            (40.0, self._walk("P" + head, lambda d: d.tr_n.startswith(q))),
+            (30.0, self._tokens_tier("r", tokens, "tr_words")),
+        )
+        for score, ids in tiers:
+            for doc_id in ids:
+                if doc_id in seen or (want_level and self.docs[doc_id].level_n != want_level):
+                    continue
+                seen.add(doc_id)
+                out.append((doc_id, score))
+                if len(out) >= limit:
+                    return self._hits(out)
+
+        if len(q) >= 3:
+            # опечатки и середина слова: доля общих триграмм (ниже всех префиксных ярусов).
+            # Документ с need из G триграмм содержит хотя бы одну из G - need + 1 самых редких —
+            # кандидаты берутся только из их постингов, частые триграммы не обходятся.
+            grams = sorted(set(_trigrams(q)), key=lambda g: len(self.postings.get(g, ())))
+            need = max(2, math.ceil(len(grams) * TRIGRAM_MIN))
+            fuzzy: List[Tuple[int, int]] = []
+            checked: Set[int] = set(seen)
+            for g in grams[:len(grams) - need + 1]:
+                for doc_id in self.postings.get(g, ()):
+                    if doc_id in checked:
+                        continue
+                    checked.add(doc_id)
+                    doc = self.docs[doc_id]
+                    if want_level and doc.level_n != want_level:
+                        continue
+                    have = {*_trigrams(doc.term_n), *_trigrams(doc.tr_n)}
+                    n = sum(1 for x in grams if x in have)
+                    if n >= need:
+                        fuzzy.append((n, doc_id))
+            best = heapq.nsmallest(limit - len(out), fuzzy, key=lambda f: (-f[0], self.docs[f[1]].rank))
+            out.extend((doc_id, round(20.0 * n / len(grams), 2)) for n, doc_id in best)
+        return self._hits(out)
+
+    def _hits(self, found: List[Tuple[int, float]]) -> List[Hit]:
+        hits = []
+        for doc_id, score in found:
+            doc = self.docs[doc_id]
+            _fp, title, slug, _ids, _keys = self.lessons[doc.lesson_id]
+            hits.append(Hit(doc, score, title, slug))
+        return hits
+
+
+_index: Optional[SearchIndex] = None
+_build_lock = threading.Lock()
+_refreshing = threading.Lock()
+
+memdiag.register_cache("search.index", lambda: _index,
+                       describe=lambda ix: dict(ix.stats) if ix is not None else {"docs": 0})
+
+
+def _publish(catalog, prev: Optional[SearchIndex]) -> SearchIndex:
+    global _index
+    index = SearchIndex.build(catalog, prev)
+    _index = index      # атомарная подмена ссылки
+    log.info("index built", extra=index.stats)
+    return index
+
+def _refresh_in_background(catalog) -> None:
+    if not _refreshing.acquire(blocking=False):
+        return
+
+    def _run():
+        try:
+            with _build_lock:
+                if _index is None or _index.source is not catalog:
+                    _publish(catalog, _index)
+        except Exception as e:
+            log.warning("refresh failed, keeping old index: %s", e)
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=_run, name="search-refresh", daemon=True).start()
+
+def get_index() -> Optional[SearchIndex]:
+    """Индекс поиска; первый — синхронно, после обновления каталога — в фоне (пока старый)."""
+    catalog = catalog_index.get_index()
+    if catalog is None:
+        return None
+    index = _index
+    if index is None:
+        with _build_lock:
+            return _index if _index is not None else _publish(catalog, None)
+    if index.source is not catalog:
+        _refresh_in_background(catalog)
+    return index
+
+def search(query: str, *, limit: int = 20, level: Optional[str] = None) -> Optional[List[Hit]]:
+    """Найденные слова по убыванию релевантности; None — индекса нет."""
+    index = get_index()
+    return index.search(query, limit=limit, level=level) if index is not None else None
+
+
+__all__ = ["normalize", "Doc", "Hit", "SearchIndex", "get_index", "search", "PREFIX_MAX", "TRIGRAM_MIN"]
@@ -0,0 +1,307 @@
+# apps/backend/core/shared_cache.py
+"""Общий для всех воркеров кэш: SQLite в WAL-режиме на локальном диске.
+
+Под gunicorn с N воркерами каждый in-process кэш дублируется и греется N раз,
+и каждый воркер сам ходит в Strapi. Здесь — один файл на машину:
+  - записи версионированы: (ns, key) -> (version, value, expires). Читатель
+    просит нужную версию (например, версию шаблона) — запись другой версии
+    считается промахом;
+  - публикация атомарна: одна транзакция INSERT OR REPLACE; читатели в WAL
+    видят либо старую запись, либо новую целиком;
+  - заполнение под арендой (lease): промахнувшийся воркер берёт аренду и
+    строит значение, остальные ждут публикации, а не строят то же самое.
+
+Значения — bytes (JSON-тела, ответы Strapi). Любая ошибка SQLite не ломает
+запрос: кэш просто пропускается. Не открывается БД (каталог только на чтение,
+нет места) — кэша нет, попытка повторяется не чаще раза в _REOPEN секунд.
+Ожидание блокировки SQLite (busy timeout) не дольше остатка бюджета запроса.
+
+ENV:
+  SHARED_CACHE       — "0"/"off" выключает (каждый воркер сам по себе, как раньше);
+  SHARED_CACHE_PATH  — файл БД (по умолчанию apps/backend/.cache/shared.sqlite3);
+  SHARED_CACHE_WAIT  — сколько секунд ждать значение под чужой арендой (5).
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from core import deadline as request_deadline, memdiag
+from core.logs import get_logger
+from core.paths import BACKEND_DIR
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ns      TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    version TEXT NOT NULL DEFAULT '',
+    value   BLOB NOT NULL,
+    meta    TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    expires REAL,
+    PRIMARY KEY (ns, key)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    ns      TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    owner   TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+"""
+
+_POLL = 0.02
+_PURGE_EVERY = 256
+_BUSY_MAX = 5.0     # потолок ожидания блокировки SQLite, сек
+_REOPEN = 30.0      # пауза после неудачного открытия БД, сек
+
+log = get_logger("shared-cache")
+_tls = threading.local()
+_owner = uuid.uuid4().hex          # id процесса для аренды (пересоздаётся после fork)
+_owner_pid = os.getpid()
+_puts = 0
+_open_failed = 0.0
+stats: Dict[str, int] = {"hit": 0, "miss": 0, "put": 0, "waited": 0, "error": 0}
+
+
+def enabled() -> bool:
+    return str(os.getenv("SHARED_CACHE", "1")).lower() not in ("0", "false", "no", "off")
+
+def db_path() -> Path:
+    return Path(os.getenv("SHARED_CACHE_PATH") or (BACKEND_DIR / ".cache" / "shared.sqlite3"))
+
+def _wait_limit() -> float:
+    try:
+        return max(float(os.getenv("SHARED_CACHE_WAIT", "5")), 0.0)
+    except ValueError:
+        return 5.0
+
+def _me() -> str:
+    global _owner, _owner_pid
+    if _owner_pid != os.getpid():
+        _owner, _owner_pid = uuid.uuid4().hex, os.getpid()
+    return _owner
+
+def _busy_timeout() -> float:
+    try:
+        return request_deadline.timeout(_BUSY_MAX)
+    except request_deadline.DeadlineExceeded:
+        return 0.0   # бюджет кончился — чужую блокировку не ждём вовсе
+
+def _open(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=_BUSY_MAX, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _conn() -> Optional[sqlite3.Connection]:
+    """Соединение на поток (и на процесс: после fork открываем заново); None — кэша нет."""
+    global _open_failed
+    if not enabled():
+        return None
+    conn = getattr(_tls, "conn", None)
+    if conn is None or getattr(_tls, "pid", None) != os.getpid():
+        if _open_failed and time.monotonic() - _open_failed < _REOPEN:
+            return None
+        try:
+            conn = _open(db_path())
+        except (OSError, sqlite3.Error) as e:
+            if not _open_failed:
+                stats["error"] += 1
+                log.warning("open failed, running without shared cache: %s", e)
+            _open_failed = time.monotonic()
+            return None
+        if _open_failed:
+            log.info("reopened")
+            _open_failed = 0.0
+        _tls.conn, _tls.pid, _tls.busy_ms = conn, os.getpid(), int(_BUSY_MAX * 1000)
+    busy_ms = int(_busy_timeout() * 1000)
+    if busy_ms != _tls.busy_ms:
+        conn.execute(f"PRAGMA busy_timeout={busy_ms}")
+        _tls.busy_ms = busy_ms
+    return conn
+
+def _failed(op: str, e: Exception) -> None:
+    stats["error"] += 1
+    log.warning("%s failed: %s", op, e)
+
+
+# ---- read / publish -----------------------------------------------------------
+
+def lookup(ns: str, key: str) -> Optional[Tuple[str, bytes, str]]:
+    """(version, value, meta) живой записи или None."""
+    try:
+        conn = _conn()
+        if conn is None:
+            return None
+        row = conn.execute(
+            "SELECT version, value, meta FROM entries WHERE ns=? AND key=? "
+            "AND (expires IS NULL OR expires > ?)",
+            (ns, key, time.time()),
+        ).fetchone()
+    except sqlite3.Error as e:
+        _failed("lookup", e)
+        return None
+    return (row[0], bytes(row[1]), row[2]) if row else None
+
+def get(ns: str, key: str, version: Optional[str] = None) -> Optional[bytes]:
+    """Значение записи; если задан version — только этой версии."""
+    found = lookup(ns, key)
+    if found is None or (version is not None and found[0] != version):
+        stats["miss"] += 1
+        return None
+    stats["hit"] += 1
+    return found[1]
+
+def put(ns: str, key: str, value: bytes, *, version: str = "", ttl: Optional[float] = None,
+        meta: str = "") -> None:
+    """Атомарно опубликовать запись (заменяет предыдущую версию целиком)."""
+    global _puts
+    try:
+        conn = _conn()
+        if conn is None:
+            return
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (ns, key, version, value, meta, created, expires) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (ns, key, version, sqlite3.Binary(value), meta, now, now + ttl if ttl else None),
+        )
+        stats["put"] += 1
+        _puts += 1
+        if _puts % _PURGE_EVERY == 0:
+            conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?", (now,))
+    except sqlite3.Error as e:
+        _failed("put", e)
+
+def delete(ns: str, key: Optional[str] = None) -> None:
+    """Удалить запись (или весь namespace, если key не задан)."""
+    try:
+        conn = _conn()
+        if conn is None:
+            return
+        if key is None:
+            conn.execute("DELETE FROM entries WHERE ns=?", (ns,))
+        else:
+            conn.execute("DELETE FROM entries WHERE ns=? AND key=?", (ns, key))
+    except sqlite3.Error as e:
+        _failed("delete", e)
+
+
+# ---- fill under lease -----------------------------------------------------------
+
+def _acquire(conn: sqlite3.Connection, ns: str, key: str, hold: float) -> bool:
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM leases WHERE ns=? AND key=? AND expires <= ?", (ns, key, now))
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO leases (ns, key, owner, expires) VALUES (?, ?, ?, ?)",
+            (ns, key, _me(), now + hold),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return cur.rowcount == 1
+
+def _release(conn: sqlite3.Connection, ns: str, key: str) -> None:
+    try:
+        conn.execute("DELETE FROM leases WHERE ns=? AND key=? AND owner=?", (ns, key, _me()))
+    except sqlite3.Error as e:
+        _failed("release", e)
+
+def _leased(conn: sqlite3.Connection, ns: str, key: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM leases WHERE ns=? AND key=? AND expires > ?", (ns, key, time.time())
+    ).fetchone()
+    return row is not None
+
+def get_or_fill(ns: str, key: str, build: Callable[[], Optional[bytes]], *,
+                version: Optional[str] = None, ttl: Optional[float] = None) -> Optional[bytes]:
+    """Значение из общего кэша или build() — но только в одном воркере.
+
+    Кто первым промахнулся, тот берёт аренду, строит и публикует; остальные
+    ждут публикации (до SHARED_CACHE_WAIT секунд), потом строят сами.
+    build() может вернуть None — тогда ничего не публикуется (ошибка/фолбэк).
+    """
+    value = get(ns, key, version)
+    if value is not None:
+        return value
+    try:
+        conn = _conn()
+    except sqlite3.Error as e:
+        _failed("connect", e)
+        conn = None
+    if conn is None:
+        return build()
+
+    hold = wait = _wait_limit()
+    left = request_deadline.remaining()
+    if left is not None:
+        wait = min(wait, max(left, 0.0))   # чужую аренду ждём не дольше бюджета запроса
+    deadline = time.monotonic() + wait
+    owner = False
+    try:
+        while True:
+            try:
+                owner = _acquire(conn, ns, key, hold=max(hold, 1.0))
+            except sqlite3.Error as e:
+                _failed("lease", e)
+                return build()
+            if owner:
+                break
+            # аренда у другого воркера — ждём его публикации
+            stats["waited"] += 1
+            while time.monotonic() < deadline:
+                time.sleep(_POLL)
+                value = get(ns, key, version)
+                if value is not None:
+                    return value
+                try:
+                    if not _leased(conn, ns, key):
+                        break  # владелец ушёл без публикации — пробуем сами
+                except sqlite3.Error:
+                    break
+            else:
+                return build()  # ждали слишком долго — строим сами, без публикации
+
+        value = get(ns, key, version)  # могли опубликовать между промахом и арендой
+        if value is not None:
+            return value
+        value = build()
+        if value is not None:
+            put(ns, key, value, version=version or "", ttl=ttl)
+        return value
+    finally:
+        if owner:
+            _release(conn, ns, key)
+
+
+def _describe(_obj) -> Dict[str, int]:
+    """Общий кэш живёт на диске — в отчёт идут размер файлов и число записей."""
+    out: Dict[str, int] = dict(stats)
+    path = db_path()
+    for suffix in ("", "-wal"):
+        try:
+            out[f"db{suffix.replace('-', '_')}_bytes"] = os.path.getsize(f"{path}{suffix}")
+        except OSError:
+            pass
+    try:
+        conn = _conn()
+        if conn is not None:
+            out["rows"] = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    except sqlite3.Error:
+        pass
+    return out
+
+memdiag.register_cache("shared.sqlite", lambda: None, describe=_describe)
+
+
+__all__ = ["enabled", "db_path", "lookup", "get", "put", "delete", "get_or_fill", "stats"]
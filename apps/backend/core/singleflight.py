@@ -0,0 +1,87 @@
+# apps/backend/core/singleflight.py
+"""Single-flight: одновременные вызовы с одинаковым ключом ждут один общий вызов.
+
+Нужен против «громового стада»: истёк кэш популярного урока или только что
+задеплоились — десятки параллельных /lesson/<id> не должны дёргать Strapi
+одинаковыми запросами. Первый вызвавший (лидер) выполняет функцию, остальные
+ждут и получают тот же результат (или исключение того же типа).
+
+Результат общий для всех ждущих — его нельзя мутировать. Исключение лидера
+ждущим не пробрасывается как есть: каждый raise того же объекта дописывал бы
+в его __traceback__ кадры очередного потока. Ждущий бросает копию (тот же тип
+и аргументы, своя трассировка, исходное — в __cause__), а если исключение не
+копируется — FlightError.
+"""
+from __future__ import annotations
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from core import deadline
+
+
+class FlightError(RuntimeError):
+    """Лидер упал с исключением, которое не удалось скопировать для ждущего (исходное — в __cause__)."""
+
+
+def _follower_error(error: BaseException, name: str) -> BaseException:
+    try:
+        fresh = copy.copy(error)
+    except Exception:
+        return FlightError(f"single-flight leader ({name}) failed: {error!r}")
+    return fresh.with_traceback(None)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str = "") -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0  # сколько вызовов не пошли в upstream (для диагностики)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            # ждущий не переживает свой бюджет запроса (лидер при этом продолжает)
+            left = deadline.remaining()
+            if not call.done.wait(None if left is None else max(left, 0.0)):
+                raise deadline.DeadlineExceeded(f"single-flight wait ({self.name}) exceeded request budget")
+            if call.error is not None:
+                raise _follower_error(call.error, self.name) from call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+__all__ = ["SingleFlight", "FlightError"]
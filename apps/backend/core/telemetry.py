@@ -0,0 +1,317 @@
+# apps/backend/core/telemetry.py
+"""Потоковая агрегация событий /log: воронка уроков без хранения сырых событий.
+
+Раньше события клиента (open_lesson, next_word, go_home, lesson_card_set_state)
+только писались в лог, и «где пользователи бросают урок» приходилось grep'ать.
+Теперь /log кладёт каждое событие сюда, и оно сразу превращается в счётчики:
+  - по уроку: открытия и завершения;
+  - по шагу урока: переходы дальше (верный ответ), выходы домой с шага и время
+    от прихода на шаг до перехода (count/sum + гистограмма для p50/p90).
+Счётчики лежат в кольце временных корзин (TELEMETRY_BUCKET сек × TELEMETRY_BUCKETS):
+запрос за окно суммирует последние корзины, старые перезаписываются по кругу.
+Память ограничена: число уроков в корзине (TELEMETRY_MAX_LESSONS), шагов (MAX_STEPS) и
+сессий, для которых помнится «на каком шаге и с какого момента» (TELEMETRY_SESSIONS, LRU).
+Реестр уроков свой у каждой корзины и уходит вместе с ней: мусорные ключи из
+клиентского view/url не занимают места навсегда. Если индекс каталога загружен,
+уроки не из каталога сразу идут в "other".
+
+Урок и шаг берутся из view — пути страницы клиента в момент клика
+(/view/lesson/<id>?i=N, /view/lesson/slug/<slug>?i=N), сессия — sid клиента
+(сид вкладки) или id пользователя. Ключ урока — как в routes/lessons.py: "id:1", "slug:x".
+Счётчики у каждого воркера свои.
+
+ENV:
+  TELEMETRY              — "0"/"off" выключает агрегацию (события только в лог);
+  TELEMETRY_BUCKET       — ширина корзины, сек (300);
+  TELEMETRY_BUCKETS      — число корзин в кольце (288 — сутки при 5 минутах);
+  TELEMETRY_MAX_LESSONS  — сколько разных уроков считать в одной корзине (2000, остальные — в "other");
+  TELEMETRY_SESSIONS     — сколько сессий помнить для времени шага (10000).
+"""
+from __future__ import annotations
+import bisect
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from core import catalog_index, memdiag
+
+MAX_STEPS = 64
+SESSION_TTL = 30 * 60.0      # дольше на шаге — уже не «время ответа», в гистограмму не идёт
+OTHER = "other"
+
+# верхние границы корзин гистограммы времени шага, мс (последняя — всё, что дольше)
+LATENCY_EDGES_MS = (250, 500, 1000, 2000, 3000, 5000, 8000, 13000, 20000, 30000, 60000, 120000)
+
+# события клиента, которые считаются по имени (остальные — в "other", чтобы имена не росли без границ)
+EVENTS = ("open_lesson", "next_word", "go_home", "lesson_card_set_state", "click", "error")
+
+_VIEW_RE = re.compile(r"^/(?:view/)?lesson/(?:slug/(?P<slug>[^/?#]+)|(?P<id>\d+))/?$")
+
+Key = Tuple[str, int, str]          # (урок, шаг или -1 для уровня урока, метрика)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(int(os.getenv(name, str(default))), 1)
+    except ValueError:
+        return default
+
+def enabled() -> bool:
+    return str(os.getenv("TELEMETRY", "1")).lower() not in ("0", "false", "no", "off")
+
+
+def parse_view(view: Any) -> Optional[Tuple[str, int]]:
+    """(ключ урока, шаг) из пути страницы клиента или None, если это не урок."""
+    if not isinstance(view, str) or not view:
+        return None
+    parts = urlsplit(view)
+    m = _VIEW_RE.match(parts.path)
+    if not m:
+        return None
+    lesson = f"id:{m.group('id')}" if m.group("id") else f"slug:{unquote(m.group('slug'))}"
+    try:
+        step = int((parse_qs(parts.query).get("i") or ["0"])[0])
+    except ValueError:
+        step = 0
+    return lesson, min(max(step, 0), MAX_STEPS - 1)
+
+
+def _in_catalog(lesson: str) -> bool:
+    """Урок есть в индексе каталога (без индекса проверить нечем — считаем, что есть)."""
+    index = catalog_index.current()
+    if index is None:
+        return True
+    kind, _, value = lesson.partition(":")
+    if kind == "id":
+        return value.isdigit() and int(value) in index.by_id
+    return value in index.by_slug
+
+
+class _Slot:
+    __slots__ = ("index", "counts", "latency", "lessons")
+
+    def __init__(self) -> None:
+        self.index = -1
+        self.lessons: set = set()            # уроки, посчитанные в этой корзине по имени
+        self.counts: Dict[Key, int] = {}
+        self.latency: Dict[Tuple[str, int], List[float]] = {}  # [count, sum_ms, *гистограмма]
+
+
+class Aggregator:
+    """Кольцо корзин со счётчиками + последние шаги сессий."""
+
+    def __init__(self, bucket: float, buckets: int, max_lessons: int, max_sessions: int) -> None:
+        self.bucket = float(bucket)
+        self.slots = [_Slot() for _ in range(buckets)]
+        self.max_lessons = max_lessons
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self.events = 0
+        self._lock = threading.Lock()
+
+    # -- запись (под замком) --
+
+    def _slot(self, now: float) -> _Slot:
+        index = int(now // self.bucket)
+        slot = self.slots[index % len(self.slots)]
+        if slot.index != index:
+            slot.index = index
+            slot.lessons = set()
+            slot.counts = {}
+            slot.latency = {}
+        return slot
+
+    def _lesson(self, slot: _Slot, lesson: str) -> str:
+        if lesson in slot.lessons:
+            return lesson
+        if len(slot.lessons) >= self.max_lessons or not _in_catalog(lesson):
+            return OTHER
+        slot.lessons.add(lesson)
+        return lesson
+
+    def _count(self, slot: _Slot, lesson: str, step: int, metric: str) -> None:
+        key = (lesson, step, metric)
+        slot.counts[key] = slot.counts.get(key, 0) + 1
+
+    def _latency(self, slot: _Slot, lesson: str, step: int, ms: float) -> None:
+        row = slot.latency.get((lesson, step))
+        if row is None:
+            row = slot.latency[(lesson, step)] = [0, 0.0] + [0] * (len(LATENCY_EDGES_MS) + 1)
+        row[0] += 1
+        row[1] += ms
+        row[2 + bisect.bisect_left(LATENCY_EDGES_MS, ms)] += 1
+
+    def _arrive(self, sid: Optional[str], lesson: str, step: int, now: float) -> None:
+        if not sid:
+            return
+        self.sessions[sid] = (lesson, step, now)
+        self.sessions.move_to_end(sid)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def add(self, event: str, *, view: Any = None, url: Any = None, sid: Optional[str] = None,
+            now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        where = parse_view(view)
+        with self._lock:
+            self.events += 1
+            slot = self._slot(now)
+            self._count(slot, "*", -1, event if event in EVENTS else OTHER)
+            if event == "open_lesson":
+                target = parse_view(url)
+                if target is None:
+                    return
+                lesson = self._lesson(slot, target[0])
+                self._count(slot, lesson, -1, "opens")
+                self._arrive(sid, lesson, target[1], now)
+            elif event == "next_word" and where is not None:
+                lesson, step = self._lesson(slot, where[0]), where[1]
+                self._count(slot, lesson, step, "advances")
+                prev = self.sessions.pop(sid, None) if sid else None
+                if prev is not None and prev[:2] == (lesson, step) and now - prev[2] <= SESSION_TTL:
+                    self._latency(slot, lesson, step, (now - prev[2]) * 1000)
+                if isinstance(url, str) and urlsplit(url).path in ("/view/home", "/home"):
+                    self._count(slot, lesson, -1, "completions")
+                else:
+                    self._arrive(sid, lesson, min(step + 1, MAX_STEPS - 1), now)
+            elif event == "go_home" and where is not None:
+                lesson, step = self._lesson(slot, where[0]), where[1]
+                self._count(slot, lesson, step, "exits")
+                if sid:
+                    self.sessions.pop(sid, None)
+
+    # -- чтение --
+
+    def _window(self, window: float, now: float) -> List[_Slot]:
+        lo = int((now - window) // self.bucket)
+        hi = int(now // self.bucket)
+        return [s for s in self.slots if lo < s.index <= hi]
+
+    def funnel(self, lesson: Optional[str] = None, window: float = 3600.0, now: Optional[float] = None) -> Dict[str, Any]:
+        """Воронка по урокам за окно: открытия, переходы/выходы по шагам, отвал и время шага."""
+        now = time.time() if now is None else now
+        window = min(max(window, self.bucket), self.bucket * len(self.slots))
+        counts: Dict[Key, int] = {}
+        latency: Dict[Tuple[str, int], List[float]] = {}
+        with self._lock:
+            for slot in self._window(window, now):
+                for key, n in slot.counts.items():
+                    if lesson is None or key[0] in (lesson, "*"):
+                        counts[key] = counts.get(key, 0) + n
+                for key, row in slot.latency.items():
+                    if lesson is None or key[0] == lesson:
+                        acc = latency.setdefault(key, [0] * len(row))
+                        for i, v in enumerate(row):
+                            acc[i] += v
+
+        per: Dict[str, Dict[str, Any]] = {}
+        for (name, step, metric), n in counts.items():
+            if name == "*":
+                continue
+            entry = per.setdefault(name, {"opens": 0, "completions": 0, "steps": {}})
+            if step < 0:
+                entry[metric] = n
+            else:
+                entry["steps"].setdefault(step, {})[metric] = n
+        for (name, step) in latency:
+            per.setdefault(name, {"opens": 0, "completions": 0, "steps": {}})["steps"].setdefault(step, {})
+
+        lessons_out = []
+        for name, entry in per.items():
+            reached = entry["opens"]
+            steps_out = []
+            for step in range(max(entry["steps"], default=-1) + 1):
+                row = entry["steps"].get(step, {})
+                advances, exits = row.get("advances", 0), row.get("exits", 0)
+                reached = max(reached, advances + exits)
+                steps_out.append({
+                    "step": step,
+                    "reached": reached,
+                    "advances": advances,
+                    "exits": exits,
+                    "drop": reached - advances,
+                    "drop_rate": round((reached - advances) / reached, 4) if reached else 0.0,
+                    "latency_ms": _latency_stats(latency.get((name, step))),
+                })
+                reached = advances
+            opens = entry["opens"]
+            lessons_out.append({
+                "lesson": name,
+                "opens": opens,
+                "completions": entry["completions"],
+                "completion_rate": round(entry["completions"] / opens, 4) if opens else None,
+                "steps": steps_out,
+            })
+        lessons_out.sort(key=lambda e: (-e["opens"], e["lesson"]))
+        return {
+            "window_s": window,
+            "bucket_s": self.bucket,
+            "events": {metric: n for (name, _s, metric), n in counts.items() if name == "*"},
+            "lessons": lessons_out,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "events": self.events, "lessons": len(self._slot(time.time()).lessons), "sessions": len(self.sessions),
+                "bucket_s": self.bucket, "buckets": len(self.slots),
+            }
+
+
+def _latency_stats(row: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+    """count/mean и p50/p90 по гистограмме (верхняя граница корзины; дольше последней — null)."""
+    if not row or not row[0]:
+        return None
+    count, total, hist = int(row[0]), row[1], row[2:]
+
+    def pct(q: float) -> Optional[int]:
+        need, seen = q * count, 0
+        for i, n in enumerate(hist):
+            seen += n
+            if seen >= need:
+                return LATENCY_EDGES_MS[i] if i < len(LATENCY_EDGES_MS) else None
+        return None
+
+    return {"count": count, "mean": round(total / count, 1), "p50_le": pct(0.5), "p90_le": pct(0.9)}
+
+
+_agg: Optional[Aggregator] = None
+_agg_lock = threading.Lock()
+
+def aggregator() -> Aggregator:
+    global _agg
+    if _agg is None:
+        with _agg_lock:
+            if _agg is None:
+                _agg = Aggregator(
+                    _env_int("TELEMETRY_BUCKET", 300), _env_int("TELEMETRY_BUCKETS", 288),
+                    _env_int("TELEMETRY_MAX_LESSONS", 2000), _env_int("TELEMETRY_SESSIONS", 10000),
+                )
+    return _agg
+
+memdiag.register_cache("telemetry.sessions", lambda: aggregator().sessions)
+memdiag.register_cache("telemetry.slots", lambda: aggregator().slots)
+
+
+def ingest(data: Dict[str, Any], uid: Optional[str] = None) -> None:
+    """Событие из /log: {"event", "payload", "view", "sid", "ts"} (ts клиента не используется)."""
+    if not enabled() or not isinstance(data, dict):
+        return
+    event = data.get("event")
+    if not isinstance(event, str) or not event:
+        return
+    payload = data.get("payload") if isinstance(data.get("payload"), dict) else {}
+    sid = data.get("sid") if isinstance(data.get("sid"), str) and data.get("sid") else uid
+    url = data.get("url") or payload.get("url") or payload.get("path")
+    aggregator().add(event, view=data.get("view"), url=url, sid=(sid or None) and sid[:64])
+
+
+def funnel(lesson: Optional[str] = None, window: float = 3600.0) -> Dict[str, Any]:
+    return aggregator().funnel(lesson, window)
+
+
+__all__ = ["EVENTS", "enabled", "parse_view", "Aggregator", "aggregator", "ingest", "funnel", "LATENCY_EDGES_MS"]
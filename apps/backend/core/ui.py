@@ -1,11 +1,15 @@
 # apps/backend/core/ui.py
 from __future__ import annotations
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-from copy import deepcopy
+from typing import Any, Dict, List, Optional, Tuple
+from contextlib import contextmanager
+import hashlib
 import json
 import os
+import re
+import threading
 
+from core import catalog_index, memdiag, shared_cache
 from core.paths import UI_DIR
 from strapi_client import get_categories  # только для вкладок на /home
 
@@ -22,11 +26,20 @@ def _deep_get(d: Dict[str, Any], dotted: str, default: Any = None) -> Any:
             return default
     return cur
 
+def known_theme(theme: Optional[str], default: str = "light") -> str:
+    """Тема из запроса, если для неё есть tokens/colors.<theme>.json, иначе default.
+    Ключи кэшей по теме не растут от произвольных ?theme=."""
+    theme = (theme or "").strip().lower()
+    if theme and re.fullmatch(r"[a-z0-9_-]+", theme) and (UI_DIR / "tokens" / f"colors.{theme}.json").is_file():
+        return theme
+    return default
+
 def load_tokens(theme: str = "light") -> Dict[str, Any]:
     key = f"colors.{theme}"
+    tokens_path = UI_DIR / "tokens" / f"colors.{theme}.json"
+    _record_dep(tokens_path)
     if key in _TOKENS_CACHE:
         return _TOKENS_CACHE[key]
-    tokens_path = UI_DIR / "tokens" / f"colors.{theme}.json"
     try:
         with open(tokens_path, "r", encoding="utf-8") as f:
             data = json.load(f)
@@ -45,6 +58,333 @@ def apply_design_tokens(node: Any, tokens: Dict[str, Any]) -> Any:
         return resolved if resolved is not None else node
     return node
 
+# ---------- template cache + include graph ----------
+#
+# Всё, что читается из UI_DIR во время сборки, записывается как зависимость:
+#   - _JSON_CACHE      — текст файлов (парсим на каждый запрос: json.loads дешевле диска);
+#   - _TEMPLATE_CACHE  — скомпилированные шаблоны (include раскрыты, опционально токены);
+#   - _RENDER_CACHE    — готовые ответы (например, тело /page/<name>).
+# У каждой записи есть множество файлов, от которых она транзитивно зависит.
+# Вотчер (core/ui_watch.py) зовёт invalidate_paths() и сбрасывает только то,
+# что реально задето изменением.
+
+_JSON_CACHE: Dict[str, str] = {}
+_TEMPLATE_CACHE: Dict[Any, Any] = {}
+_RENDER_CACHE: Dict[Any, Any] = {}
+_ENTRY_DEPS: Dict[Any, frozenset] = {}            # (cache_name, key) -> файлы
+_INCLUDE_GRAPH: Dict[str, set] = {}               # файл -> файлы, которые он включает
+_CACHE_LOCK = threading.RLock()
+_tls = threading.local()
+
+memdiag.register_cache("ui.tokens", _TOKENS_CACHE)
+memdiag.register_cache("ui.json_text", _JSON_CACHE)
+memdiag.register_cache("ui.templates", _TEMPLATE_CACHE)
+memdiag.register_cache("ui.rendered", _RENDER_CACHE)
+memdiag.register_cache("ui.entry_deps", _ENTRY_DEPS)
+memdiag.register_cache("ui.include_graph", _INCLUDE_GRAPH)
+
+
+def _recorders() -> List[set]:
+    stack = getattr(_tls, "recorders", None)
+    if stack is None:
+        stack = _tls.recorders = []
+    return stack
+
+def _record_dep(path: "Path|str") -> None:
+    """Отметить файл как зависимость всех собираемых сейчас записей кэша."""
+    stack = getattr(_tls, "recorders", None)
+    if stack:
+        p = str(path)
+        for deps in stack:
+            deps.add(p)
+
+@contextmanager
+def record_deps():
+    """Собрать множество файлов, прочитанных внутри блока (вложенно — во все уровни)."""
+    deps: set = set()
+    stack = _recorders()
+    stack.append(deps)
+    try:
+        yield deps
+    finally:
+        stack.pop()
+
+@contextmanager
+def _including(path: Path):
+    """Текущий включающий файл — для рёбер графа include."""
+    stack = getattr(_tls, "files", None)
+    if stack is None:
+        stack = _tls.files = []
+    child = str(path)
+    if stack:
+        with _CACHE_LOCK:
+            _INCLUDE_GRAPH.setdefault(stack[-1], set()).add(child)
+    stack.append(child)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+def include_graph() -> Dict[str, List[str]]:
+    """Снимок графа include: файл -> отсортированный список прямых зависимостей."""
+    with _CACHE_LOCK:
+        return {k: sorted(v) for k, v in _INCLUDE_GRAPH.items()}
+
+def _remember(cache: Dict[Any, Any], name: str, key: Any, value: Any, deps: set) -> None:
+    with _CACHE_LOCK:
+        cache[key] = value
+        _ENTRY_DEPS[(name, key)] = frozenset(deps)
+
+def _compiled(path: Path, theme: Optional[str]) -> Tuple[Any, str, Dict[str, List[tuple]]]:
+    """(замороженное дерево, версия, индекс id -> пути) из кэша шаблонов."""
+    path = Path(path).resolve()
+    key = (str(path), theme)
+    cached = _TEMPLATE_CACHE.get(key)
+    if cached is None:
+        with record_deps() as deps:
+            deps.add(str(path))
+            with _including(path):
+                # корневой шаблон, как и раньше, резолвится относительно UI_DIR; include и токены — за один проход
+                tree = freeze(render_tree(_load_json(path), tokens=theme))
+        # версия — по содержимому, поэтому совпадает у всех воркеров
+        blob = json.dumps(tree, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        cached = (tree, hashlib.sha1(blob).hexdigest()[:16], id_paths(tree))
+        _remember(_TEMPLATE_CACHE, "template", key, cached, deps)
+    # зависимости записи — и в объемлющую запись, если сборка вложенная
+    for dep in _ENTRY_DEPS.get(("template", key), ()):
+        _record_dep(dep)
+    return cached
+
+def compile_template(path: Path, *, theme: Optional[str] = None) -> Any:
+    """Шаблон страницы/компонента с раскрытыми include (и токенами, если задан theme).
+    Результат кэшируется до изменения любого файла, от которого он зависит;
+    наружу отдаётся изменяемая копия — её можно патчить на месте.
+    Если копия нужна только чтобы отдать или пропатчить шаблон — берите
+    template() / cow_patch() / render_template(): они не копируют дерево целиком.
+    """
+    return thaw(_compiled(path, theme)[0])
+
+def template(path: Path, *, theme: Optional[str] = None) -> Any:
+    """Скомпилированный шаблон как есть — общее замороженное дерево, без копии."""
+    return _compiled(path, theme)[0]
+
+def template_version(path: Path, *, theme: Optional[str] = None) -> str:
+    """Короткий хэш скомпилированного шаблона (меняется при правке любого include)."""
+    return _compiled(path, theme)[1]
+
+def _files_stamp(paths) -> str:
+    """Отпечаток набора файлов по (mtime, size) — версия записи в общем кэше воркеров."""
+    h = hashlib.sha1()
+    for p in sorted(paths):
+        try:
+            st = os.stat(p)
+            h.update(f"{p}\0{st.st_mtime_ns}\0{st.st_size}\n".encode("utf-8"))
+        except OSError:
+            h.update(f"{p}\0-\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def cached_render(key: Any, build) -> Any:
+    """Кэш готовых ответов: build() вызывается один раз до изменения его зависимостей.
+    Значение отдаётся как есть — кладите сюда неизменяемое (bytes/str).
+
+    bytes-значения публикуются и в общий кэш (core/shared_cache.py) вместе со
+    списком зависимостей: другой воркер берёт готовое тело, если отпечаток
+    этих файлов не изменился.
+    """
+    if key in _RENDER_CACHE:
+        return _RENDER_CACHE[key]
+    skey = repr(key)
+    found = shared_cache.lookup("render", skey)
+    if found is not None:
+        version, value, meta = found
+        deps = set(meta.split("\n")) if meta else set()
+        if _files_stamp(deps) == version:
+            _remember(_RENDER_CACHE, "render", key, value, deps)
+            for dep in deps:
+                _record_dep(dep)
+            return value
+    with record_deps() as deps:
+        value = build()
+    _remember(_RENDER_CACHE, "render", key, value, deps)
+    if isinstance(value, bytes):
+        shared_cache.put("render", skey, value, version=_files_stamp(deps), meta="\n".join(sorted(deps)))
+    return value
+
+def forget_render(key: Any) -> None:
+    """Убрать готовый ответ из кэша процесса (например, базу /home под устаревшие данные)."""
+    with _CACHE_LOCK:
+        _RENDER_CACHE.pop(key, None)
+        _ENTRY_DEPS.pop(("render", key), None)
+
+def watched_paths() -> List[str]:
+    """Файлы, изменение которых может что-то инвалидировать."""
+    with _CACHE_LOCK:
+        out: set = set(_JSON_CACHE)
+        for deps in _ENTRY_DEPS.values():
+            out.update(deps)
+        out.update(_INCLUDE_GRAPH)
+        return sorted(out)
+
+def invalidate_paths(paths) -> int:
+    """Сбросить записи, транзитивно зависящие от изменённых файлов. Возвращает число записей."""
+    changed = {str(Path(p).resolve()) for p in paths}
+    if not changed:
+        return 0
+    dropped = 0
+    with _CACHE_LOCK:
+        for p in changed:
+            if _JSON_CACHE.pop(p, None) is not None:
+                dropped += 1
+            _INCLUDE_GRAPH.pop(p, None)  # рёбра файла перезапишутся при следующей сборке
+        for name, key in [e for e, deps in _ENTRY_DEPS.items() if deps & changed]:
+            cache = _TEMPLATE_CACHE if name == "template" else _RENDER_CACHE
+            cache.pop(key, None)
+            _ENTRY_DEPS.pop((name, key), None)
+            dropped += 1
+        if any(Path(p).parent == UI_DIR / "tokens" for p in changed):
+            _TOKENS_CACHE.clear()
+    return dropped
+
+def clear_template_caches() -> None:
+    with _CACHE_LOCK:
+        _JSON_CACHE.clear()
+        _TEMPLATE_CACHE.clear()
+        _RENDER_CACHE.clear()
+        _ENTRY_DEPS.clear()
+        _INCLUDE_GRAPH.clear()
+        _TOKENS_CACHE.clear()
+
+# ---------- immutable templates + copy-on-write ----------
+#
+# Скомпилированный шаблон общий для всех запросов, поэтому хранится
+# замороженным: FrozenDict (dict, который не даёт себя менять) и tuple вместо
+# list. json.dumps/iter_json сериализуют их как обычные dict/list.
+# Патч на запрос не копирует шаблон: cow_patch() копирует только узлы на пути
+# от корня до изменяемых (пути берутся из индекса id, построенного при
+# компиляции), всё остальное — общие поддеревья шаблона. Память на запрос
+# пропорциональна патчам, а не размеру шаблона.
+
+class FrozenDict(dict):
+    """dict узла шаблона, запрещающий изменения. dict(node) — изменяемая копия верхнего уровня."""
+    __slots__ = ()
+
+    def _frozen(self, *args, **kwargs):
+        raise TypeError("template node is immutable: use cow_patch()/patch_path() or thaw()")
+
+    __setitem__ = __delitem__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+    __ior__ = _frozen
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(node: Any) -> Any:
+    """Неизменяемая копия JSON-дерева (уже замороженные поддеревья не копируются)."""
+    if isinstance(node, FrozenDict):
+        return node
+    if isinstance(node, dict):
+        return FrozenDict({k: freeze(v) for k, v in node.items()})
+    if isinstance(node, (list, tuple)):
+        return tuple(freeze(x) for x in node)
+    return node
+
+def thaw(node: Any) -> Any:
+    """Изменяемая копия дерева (dict/list/скаляры), без memo как у deepcopy."""
+    if isinstance(node, dict):
+        return {k: thaw(v) for k, v in node.items()}
+    if isinstance(node, (list, tuple)):
+        return [thaw(x) for x in node]
+    return node
+
+def id_paths(tree: Any) -> Dict[str, List[tuple]]:
+    """{id: [путь, ...]} для всех узлов с id; пути (ключи dict / индексы list) в порядке обхода в глубину."""
+    out: Dict[str, List[tuple]] = {}
+    stack: List[Tuple[Any, tuple]] = [(tree, ())]
+    while stack:
+        node, path = stack.pop()
+        if isinstance(node, dict):
+            nid = node.get("id")
+            if isinstance(nid, str):
+                out.setdefault(nid, []).append(path)
+            stack.extend(reversed([(v, path + (k,)) for k, v in node.items() if isinstance(v, (dict, list, tuple))]))
+        elif isinstance(node, (list, tuple)):
+            stack.extend(reversed([(v, path + (i,)) for i, v in enumerate(node) if isinstance(v, (dict, list, tuple))]))
+    return out
+
+
+_HERE = object()   # правка самого узла в дереве правок (остальные ключи — дети)
+
+def _cow(node: Any, edits: Dict[Any, Any]) -> Any:
+    op = edits.get(_HERE)
+    if op is not None and op[0] == "replace":
+        return op[1]
+    if isinstance(node, dict):
+        out = dict(node)
+        updates = op[1] if op is not None else {}
+        if updates:
+            _set_keys(out, updates)
+        for k, sub in edits.items():
+            if k is not _HERE and k not in updates and k in out:
+                out[k] = _cow(out[k], sub)
+        return FrozenDict(out)
+    if isinstance(node, (list, tuple)):
+        out_list = list(node)
+        for i, sub in edits.items():
+            if i is not _HERE and isinstance(i, int) and 0 <= i < len(out_list):
+                out_list[i] = _cow(out_list[i], sub)
+        return tuple(out_list)
+    return node
+
+def _edit_tree(ops: List[Tuple[tuple, tuple]]) -> Dict[Any, Any]:
+    root: Dict[Any, Any] = {}
+    for path, op in ops:
+        cur = root
+        for k in path:
+            cur = cur.setdefault(k, {})
+        cur[_HERE] = op
+    return root
+
+def cow_patch(tree: Any, anchors: Optional[Dict[str, Dict[str, Any]]],
+              index: Optional[Dict[str, List[tuple]]] = None) -> Any:
+    """Дерево с наложенной спекой якорей, без изменения исходного.
+
+    anchors — та же спека, что у render_tree: {id: {"set": {...}}} — все узлы с id
+    (None у "action" удаляет ключ), {id: {"replace": node}} — первый узел с id,
+    {id: {"render": node, "tokens": [...]}} — первый узел с id заменяется на
+    render_tree(node, tokens=...). Внутри заменённого поддерева "set" не действует.
+    Копируются только узлы на путях к правкам; значения вставляются как есть.
+    index — id_paths(tree), если уже посчитан (у шаблонов из кэша он есть).
+    """
+    if not anchors:
+        return tree
+    if index is None:
+        index = id_paths(tree)
+    ops: List[Tuple[tuple, tuple]] = []
+    replaced: List[tuple] = []
+    for anchor_id, op in anchors.items():
+        paths = index.get(anchor_id)
+        if not paths:
+            continue
+        if "replace" in op or "render" in op:
+            node = op["replace"] if "replace" in op else render_tree(op["render"], tokens=op.get("tokens") or None)
+            replaced.append(paths[0])
+            ops.append((paths[0], ("replace", node)))
+    for anchor_id, op in anchors.items():
+        if "set" not in op or "replace" in op or "render" in op:
+            continue
+        for path in index.get(anchor_id) or ():
+            if not any(path[:len(r)] == r for r in replaced):
+                ops.append((path, ("set", op["set"])))
+    # вложенная замена внутри другой замены не видна — как и в render_tree
+    ops = [(p, op) for p, op in ops
+           if not any(len(r) < len(p) and p[:len(r)] == r for r in replaced)]
+    return _cow(tree, _edit_tree(ops)) if ops else tree
+
+def patch_path(tree: Any, path: tuple, updates: Dict[str, Any]) -> Any:
+    """Дерево, где у узла по пути (ключи/индексы от корня) заменены ключи updates; копируется только путь."""
+    return _cow(tree, _edit_tree([(tuple(path), ("set", updates))]))
+
 # ---------- helpers: includes ----------
 
 def _safe_join(base: Path, rel: str) -> Path:
@@ -58,8 +398,15 @@ def _safe_join(base: Path, rel: str) -> Path:
     return p
 
 def _load_json(path: Path) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    key = str(path)
+    _record_dep(key)
+    text = _JSON_CACHE.get(key)
+    if text is None:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        with _CACHE_LOCK:
+            _JSON_CACHE[key] = text
+    return json.loads(text)
 
 def _missing_component_node(path: "Path|str") -> Dict[str, Any]:
     return {
@@ -96,13 +443,15 @@ def resolve_includes(node: Any, *, base_dir: Optional[Path] = None) -> Any:
 
             # migration fallback: components/header/*
             if not inc_path.exists() and inc_str.startswith("components/"):
+                _record_dep(inc_path)  # появится файл по основному пути — пересоберём
                 alt = (UI_DIR / "components" / "header" / Path(inc_str).name).resolve()
                 if alt.exists():
                     inc_path = alt
 
             try:
                 loaded = _load_json(inc_path)
-                return resolve_includes(loaded, base_dir=inc_path.parent)
+                with _including(inc_path):
+                    return resolve_includes(loaded, base_dir=inc_path.parent)
             except Exception:
                 return _missing_component_node(spec) if soft else (_ for _ in ()).throw(
                     RuntimeError(f"include failed: {spec}")
@@ -124,13 +473,15 @@ def resolve_includes(node: Any, *, base_dir: Optional[Path] = None) -> Any:
 
             # migration fallback: components/header/*
             if not inc_path.exists() and inc_str.startswith("components/"):
+                _record_dep(inc_path)  # появится файл по основному пути — пересоберём
                 alt = (UI_DIR / "components" / "header" / Path(inc_str).name).resolve()
                 if alt.exists():
                     inc_path = alt
 
             try:
                 loaded = _load_json(inc_path)
-                resolved = resolve_includes(loaded, base_dir=inc_path.parent)
+                with _including(inc_path):
+                    resolved = resolve_includes(loaded, base_dir=inc_path.parent)
             except Exception:
                 return _missing_component_node(path_str) if soft else (_ for _ in ()).throw(
                     RuntimeError(f"include failed: {path_str}")
@@ -223,15 +574,15 @@ def resolve_includes(node: Any, *, base_dir: Optional[Path] = None) -> Any:
 
                     # inline selected state's div when flatten is requested
                     if flatten and isinstance(chosen, dict) and "div" in chosen:
-                        from copy import deepcopy
-                        div_node = deepcopy(chosen["div"])
+                        div_node = thaw(chosen["div"])
                         # Apply patch to div_node
                         for k, v in div_patch.items():
                             div_node[k] = v
                         # Apply aspect if given
                         if aspect_ratio is not None:
                             div_node["aspect"] = {"ratio": float(aspect_ratio)}
-                        return resolve_includes(div_node, base_dir=inc_path.parent)
+                        with _including(inc_path):
+                            return resolve_includes(div_node, base_dir=inc_path.parent)
 
             return resolved
 
@@ -273,6 +624,22 @@ def patch_by_id(tree: Any, target_id: str, updates: Dict[str, Any]) -> bool:
                 applied = True
     return applied
 
+def find_by_id(tree: Any, target_id: str) -> Optional[Dict[str, Any]]:
+    """Первый узел с {"id": target_id} (обход в глубину), без изменений дерева."""
+    if isinstance(tree, dict):
+        if tree.get("id") == target_id:
+            return tree
+        for v in tree.values():
+            found = find_by_id(v, target_id)
+            if found is not None:
+                return found
+    elif isinstance(tree, (list, tuple)):
+        for item in tree:
+            found = find_by_id(item, target_id)
+            if found is not None:
+                return found
+    return None
+
 def replace_node_by_id(node: Any, node_id: str, replacement: Dict[str, Any]) -> bool:
     if isinstance(node, dict):
         if node.get("id") == node_id:
@@ -291,6 +658,343 @@ def replace_node_by_id(node: Any, node_id: str, replacement: Dict[str, Any]) ->
                 return True
     return False
 
+# ---------- render engine: один проход вместо цепочки ----------
+#
+# Раньше карточка собиралась цепочкой полных обходов: resolve_includes
+# (рекурсивно, с deepcopy при flatten), затем apply_design_tokens (ещё одна
+# копия дерева), затем по patch_by_id на каждый якорь шага. render_tree делает
+# всё за один обход с явным стеком (без глубокой рекурсии Python):
+#   - раскрывает $include / $include_optional (те же пути, фолбэки и заглушки);
+#   - применяет patch из include-спеки к узлам включённого поддерева, выбирает
+#     и инлайнит state (flatten_state, div_set/patch_div, aspect/square);
+#   - подставляет дизайн-токены (цепочкой: например, сначала light, потом тема);
+#   - применяет per-request спеку якорей: {id: {"set": {...}}} — как patch_by_id
+#     (None у "action" удаляет ключ), {id: {"replace": node}} — первый узел с id
+#     целиком, {id: {"render": node, "tokens": [...]}} — первый узел с id
+#     заменяется поддеревом, которое проходит тот же рендер (include + токены).
+# Значения из "set"/"replace" вставляются как есть — как раньше, когда патчи шага
+# накладывались на уже готовую карточку.
+# Выход совпадает с прежним конвейером (tools/bench_render.py сверяет байты).
+
+_ROOT_PATCH_IDS = (None, "", "*", "root")
+_STATE_KEYS = (
+    "state_id", "state", "selected", "selected_id",
+    "initial_state_id", "initial_state", "initial",
+    "default", "value", "current",
+)
+
+
+class _PatchScope:
+    """patch из object-include: применяется к узлам своего поддерева, запоминает, что сработало."""
+    __slots__ = ("ops", "applied")
+
+    def __init__(self, ops: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        self.ops = ops
+        self.applied: set = set()
+
+
+def _set_keys(node: Dict[str, Any], updates: Dict[str, Any]) -> None:
+    for k, v in updates.items():
+        if k == "action" and v is None:
+            node.pop("action", None)
+        else:
+            node[k] = v
+
+
+def _apply_token_chain(value: Any, chain: Tuple[Dict[str, Any], ...]) -> Any:
+    """То же, что apply_design_tokens(...) последовательно для каждого набора токенов."""
+    for i, tokens in enumerate(chain):
+        if not isinstance(value, str):
+            # токен раскрылся в контейнер — оставшиеся проходы как раньше, целиком
+            for rest in chain[i:]:
+                value = apply_design_tokens(value, rest)
+            return value
+        if value.startswith("@"):
+            resolved = _deep_get(tokens, value[1:], None)
+            if resolved is not None:
+                value = resolved
+    return value
+
+
+def _include_path(spec_path: str, base_dir: Path) -> Path:
+    inc_str = spec_path.lstrip("/")
+    if inc_str.startswith(("components/", "pages/")):
+        inc_path = _safe_join(UI_DIR, inc_str)
+    else:
+        inc_path = _safe_join(base_dir, inc_str)
+    # migration fallback: components/header/*
+    if not inc_path.exists() and inc_str.startswith("components/"):
+        _record_dep(inc_path)  # появится файл по основному пути — пересоберём
+        alt = (UI_DIR / "components" / "header" / Path(inc_str).name).resolve()
+        if alt.exists():
+            inc_path = alt
+    return inc_path
+
+
+def _link(parent_file: Optional[str], child: Path) -> None:
+    if parent_file:
+        with _CACHE_LOCK:
+            _INCLUDE_GRAPH.setdefault(parent_file, set()).add(str(child))
+
+
+class _Renderer:
+    __slots__ = ("set_ops", "replace_ops", "replaced")
+
+    def __init__(self, anchors: Optional[Dict[str, Dict[str, Any]]]) -> None:
+        self.set_ops: Dict[str, Dict[str, Any]] = {}
+        self.replace_ops: Dict[str, Dict[str, Any]] = {}
+        self.replaced: set = set()
+        for anchor_id, op in (anchors or {}).items():
+            if "set" in op:
+                self.set_ops[anchor_id] = op["set"]
+            if "replace" in op or "render" in op:
+                self.replace_ops[anchor_id] = op
+
+    # ---- include ----
+
+    def _include(self, inc_key: str, spec: Any, base_dir: Path, cur_file: Optional[str]):
+        """(узел для продолжения обхода, base_dir, текущий файл) на месте include-узла."""
+        soft = (inc_key == "$include_optional") or not _strict_includes()
+
+        def _missing(what):
+            if soft:
+                return _missing_component_node(what), base_dir, cur_file
+            raise RuntimeError(f"include failed: {what}")
+
+        if isinstance(spec, str):
+            inc_path = _include_path(spec, base_dir)
+            try:
+                loaded = _load_json(inc_path)
+            except Exception:
+                return _missing(spec)
+            _link(cur_file, inc_path)
+            return loaded, inc_path.parent, str(inc_path)
+
+        if not isinstance(spec, dict):
+            if soft:
+                return _missing_component_node(spec), base_dir, cur_file
+            raise ValueError("$include must be string or object")
+
+        path_str = spec.get("path")
+        if not isinstance(path_str, str):
+            if soft:
+                return _missing_component_node(spec), base_dir, cur_file
+            raise ValueError("$include object must contain 'path': str")
+        inc_path = _include_path(path_str, base_dir)
+        try:
+            loaded = _load_json(inc_path)
+        except Exception:
+            return _missing(path_str)
+        _link(cur_file, inc_path)
+
+        ops: List[Tuple[Any, Dict[str, Any]]] = []
+        patch_list = spec.get("patch") or []
+        if isinstance(patch_list, list):
+            for op in patch_list:
+                if isinstance(op, dict) and isinstance(op.get("set") or {}, dict):
+                    ops.append((op.get("id"), op.get("set") or {}))
+
+        # поддерево include целиком (своя область patch, без токенов и якорей) —
+        # выбор state и root-фолбэк patch смотрят на уже раскрытый корень
+        scope = _PatchScope([(tid, upd) for tid, upd in ops if isinstance(tid, str) and tid]) if ops else None
+        resolved = _Renderer(None)._walk(loaded, inc_path.parent, str(inc_path), scope, ())
+
+        for tid, updates in ops:
+            applied = scope is not None and isinstance(tid, str) and tid and any(
+                scope.ops[i][0] == tid for i in scope.applied
+            )
+            if not applied and isinstance(resolved, dict):
+                if tid in _ROOT_PATCH_IDS or resolved.get("type") == "state":
+                    _set_keys(resolved, updates)
+
+        _sentinel = object()
+        req_sid = _sentinel
+        for key in _STATE_KEYS:
+            if key in spec:
+                req_sid = spec[key]
+                break
+        keep_wrapper = bool(spec.get("keep_state") or spec.get("keep_wrapper"))
+        explicit_flatten = bool(spec.get("flatten_state") or spec.get("unwrap") or spec.get("inline"))
+        flatten = explicit_flatten or (req_sid is not _sentinel and not keep_wrapper)
+
+        if isinstance(resolved, dict) and resolved.get("type") == "state":
+            states = resolved.get("states")
+            if isinstance(states, list) and states:
+                def _sid(s):
+                    return s.get("state_id") if isinstance(s, dict) else None
+                def _eq(a, b):
+                    return (a is not None and b is not None and str(a) == str(b))
+
+                chosen = None
+                if req_sid is not _sentinel:
+                    chosen = next((s for s in states if _eq(_sid(s), req_sid)), None)
+                if chosen is None:
+                    cur = resolved.get("state_id")
+                    if cur is not None:
+                        chosen = next((s for s in states if _eq(_sid(s), cur)), None)
+                if chosen is None:
+                    chosen = states[0] if isinstance(states[0], dict) else None
+
+                sid_val = _sid(chosen)
+                if sid_val is not None:
+                    resolved["state_id"] = sid_val
+                try:
+                    idx = states.index(chosen)
+                    if idx > 0:
+                        states.insert(0, states.pop(idx))
+                except Exception:
+                    pass
+
+                div_patch = spec.get("patch_div") or spec.get("div_set") or {}
+                if not isinstance(div_patch, dict):
+                    div_patch = {}
+                aspect_ratio = spec.get("aspect_ratio")
+                if bool(spec.get("square") or spec.get("enforce_square")) and aspect_ratio is None:
+                    aspect_ratio = 1
+
+                if flatten and isinstance(chosen, dict) and "div" in chosen:
+                    div_node = chosen["div"]
+                    if isinstance(div_node, dict):
+                        div_node = dict(div_node)   # дальше обход всё равно копирует — хватит верхнего уровня
+                    for k, v in div_patch.items():
+                        div_node[k] = v
+                    if aspect_ratio is not None:
+                        div_node["aspect"] = {"ratio": float(aspect_ratio)}
+                    return div_node, inc_path.parent, str(inc_path)
+
+        return resolved, inc_path.parent, str(inc_path)
+
+    # ---- traversal ----
+
+    def _walk(self, root: Any, base_dir: Path, cur_file: Optional[str],
+              scope: Optional[_PatchScope], chain: Tuple[Dict[str, Any], ...]) -> Any:
+        holder: List[Any] = [None]
+        stack: List[tuple] = [(root, base_dir, cur_file, scope, chain, holder, 0)]
+        set_ops, replace_ops, replaced = self.set_ops, self.replace_ops, self.replaced
+        pop, push = stack.pop, stack.append
+
+        while stack:
+            src, bdir, cfile, sc, ch, parent, key = pop()
+
+            if isinstance(src, dict):
+                if "$include" in src or "$include_optional" in src:
+                    inc_key = "$include" if "$include" in src else "$include_optional"
+                    node, nbdir, nfile = self._include(inc_key, src[inc_key], bdir, cfile)
+                    push((node, nbdir, nfile, sc, ch, parent, key))
+                    continue
+
+                if sc is not None and "id" in src:
+                    for i, (tid, updates) in enumerate(sc.ops):
+                        if src.get("id") == tid:
+                            sc.applied.add(i)
+                            src = dict(src)
+                            _set_keys(src, updates)
+
+                raw: Optional[Dict[str, Any]] = None
+                if replace_ops or set_ops:
+                    nid = src.get("id")
+                    if nid is not None:
+                        op = replace_ops.get(nid)
+                        if op is not None and nid not in replaced:
+                            replaced.add(nid)
+                            if "replace" in op:
+                                parent[key] = dict(op["replace"])
+                                continue
+                            extra = tuple(load_tokens(t) if isinstance(t, str) else t for t in op.get("tokens") or ())
+                            push((op["render"], bdir, cfile, sc, extra + ch, parent, key))
+                            continue
+                        raw = set_ops.get(nid)
+
+                out: Dict[str, Any] = {}
+                parent[key] = out
+                pending = []
+                if raw is None:
+                    for k, v in src.items():
+                        if isinstance(v, (dict, list, tuple)):
+                            out[k] = None
+                            pending.append((v, bdir, cfile, sc, ch, out, k))
+                        elif ch and isinstance(v, str):
+                            out[k] = _apply_token_chain(v, ch)
+                        else:
+                            out[k] = v
+                else:
+                    for k, v in src.items():
+                        if k in raw:
+                            if not (k == "action" and raw[k] is None):
+                                out[k] = raw[k]
+                        elif isinstance(v, (dict, list, tuple)):
+                            out[k] = None
+                            pending.append((v, bdir, cfile, sc, ch, out, k))
+                        elif ch and isinstance(v, str):
+                            out[k] = _apply_token_chain(v, ch)
+                        else:
+                            out[k] = v
+                    for k, v in raw.items():
+                        if k not in src and not (k == "action" and v is None):
+                            out[k] = v
+                if pending:
+                    stack.extend(reversed(pending))
+
+            elif isinstance(src, (list, tuple)):
+                out_list: List[Any] = [None] * len(src)
+                parent[key] = out_list
+                pending = []
+                for i, v in enumerate(src):
+                    if isinstance(v, (dict, list, tuple)):
+                        pending.append((v, bdir, cfile, sc, ch, out_list, i))
+                    elif ch and isinstance(v, str):
+                        out_list[i] = _apply_token_chain(v, ch)
+                    else:
+                        out_list[i] = v
+                if pending:
+                    stack.extend(reversed(pending))
+
+            elif ch and isinstance(src, str):
+                parent[key] = _apply_token_chain(src, ch)
+            else:
+                parent[key] = src
+
+        return holder[0]
+
+
+def render_tree(node: Any, *, tokens: Any = None, anchors: Optional[Dict[str, Dict[str, Any]]] = None,
+                base_dir: Optional[Path] = None) -> Any:
+    """Новое дерево из node за один обход: include + state + patch + токены + якоря.
+
+    tokens  — набор токенов, имя темы ("light") или последовательность таковых
+              (применяются по очереди, как несколько проходов apply_design_tokens);
+    anchors — per-request спека якорей по id (см. комментарий выше).
+    Исходное дерево не меняется — его можно брать прямо из кэша шаблонов.
+    """
+    if tokens is None:
+        chain: Tuple[Dict[str, Any], ...] = ()
+    elif isinstance(tokens, (dict, str)):
+        chain = (load_tokens(tokens) if isinstance(tokens, str) else tokens,)
+    else:
+        chain = tuple(load_tokens(t) if isinstance(t, str) else t for t in tokens)
+    files = getattr(_tls, "files", None)
+    return _Renderer(anchors)._walk(node, base_dir or UI_DIR, files[-1] if files else None, None, chain)
+
+def render_template(path: Path, *, theme: Optional[str] = None, tokens: Any = None,
+                    anchors: Optional[Dict[str, Dict[str, Any]]] = None) -> Any:
+    """compile_template(path, theme=...) с наложенными якорями.
+    Без tokens — copy-on-write поверх общего шаблона (замороженное дерево, копируются
+    только пути к якорям); с tokens — полный проход render_tree (новое изменяемое дерево).
+    """
+    tree, _version, index = _compiled(path, theme)
+    if tokens is None:
+        return cow_patch(tree, anchors, index)
+    return render_tree(tree, tokens=tokens, anchors=anchors)
+
+def find_in_template(path: Path, ids, *, theme: Optional[str] = None) -> Optional[str]:
+    """Первый id из ids, который есть в скомпилированном шаблоне (по индексу, без обхода)."""
+    index = _compiled(path, theme)[2]
+    for node_id in ids:
+        if node_id in index:
+            return node_id
+    return None
+
+
 # ---------- helpers: strapi shapes + tabs ----------
 
 def _attrs(n: Any) -> Dict[str, Any]:
@@ -307,21 +1011,19 @@ def lesson_deeplink(step: int, *, slug: Optional[str] = None, lesson_id: Optiona
         return f"/view/lesson/{lesson_id}?i={step}"
     return "/view/home"
 
-def _lesson_item(title: str, lid: Optional[int], slug: Optional[str], *, state: str = "0") -> Dict[str, Any]:
-    """Карточка урока: визуал из components/lesson_card.json, данные из Strapi.
-    Возвращаем уже РЕЗОЛВНУТЫЙ div выбранного состояния (flatten_state), без внешней обёртки,
-    чтобы в финальном ответе не оставалось узлов `$include` (DivKit их не понимает).
-    """
+def _lesson_action(lid: Optional[int], slug: Optional[str]) -> Dict[str, Any]:
+    """Клик по карточке урока: открыть шаг 0."""
     path = lesson_deeplink(0, slug=slug, lesson_id=lid)
     payload: Dict[str, Any] = {"path": path}
     if lid is not None:
         payload["id"] = int(lid)
     if slug:
         payload["slug"] = slug
+    return {"log_id": "open_lesson", "url": path, "payload": payload}
 
-    # Готовим include-спеку для карточки и РЕШАЕМ её прямо здесь,
-    # чтобы наружу вернуть чистый div без $include.
-    include_spec = {
+def _lesson_item_spec(title: str, lid: Optional[int], slug: Optional[str], *, state: str = "0") -> Dict[str, Any]:
+    """include-спека карточки урока: визуал из components/lesson_card.json, данные из Strapi."""
+    return {
         "$include": {
             "path": "/components/lesson_card.json",
             "state_id": str(state),           # "0" | "1" | "2"
@@ -334,47 +1036,78 @@ def _lesson_item(title: str, lid: Optional[int], slug: Optional[str], *, state:
             ],
             # только клик на корневой div включённого state-а
             "div_set": {
-                "action": {"log_id": "open_lesson", "url": path, "payload": payload},
+                "action": _lesson_action(lid, slug),
                 "width":  {"type": "match_parent"},
                 "height": {"type": "match_parent"},
             },
         }
     }
 
+def _lesson_item(title: str, lid: Optional[int], slug: Optional[str], *, state: str = "0") -> Dict[str, Any]:
+    """Карточка урока — уже РЕЗОЛВНУТЫЙ div выбранного состояния (flatten_state), без внешней обёртки,
+    чтобы в финальном ответе не оставалось узлов `$include` (DivKit их не понимает).
+    """
     # База для относительного пути — папка `components`
-    resolved = resolve_includes(include_spec, base_dir=UI_DIR / "components")
-    # resolve_includes вернёт сам div (благодаря flatten_state). Нам нужно вернуть ровно его.
-    return resolved
+    return render_tree(_lesson_item_spec(title, lid, slug, state=state), base_dir=UI_DIR / "components")
+
+HomeRows = List[Tuple[str, List[Tuple[str, Optional[int], Optional[str], str]]]]
+
+def home_rows_from_strapi() -> HomeRows:
+    """Данные табов /home: из индекса каталога (без запросов), если он есть, иначе — из Strapi."""
+    cats = catalog_index.categories()
+    if cats is not None:
+        return home_rows_from_catalog(cats)
+    return home_rows(get_categories())
 
 def build_home_tabs_from_strapi() -> Dict[str, Any]:
-    raw = get_categories()
-    data = raw.get("data") if isinstance(raw, dict) else raw
-    categories = data or []
+    return home_tabs(home_rows_from_strapi())
+
+_STATE_MAP = {
+    "0": "0", "1": "1", "2": "2",
+    "brand": "1", "success": "1", "ready": "1", "done": "1", "completed": "1",
+    "disabled": "2", "locked": "2", "off": "2",
+}
+
+def lesson_card_state(raw_state: Any) -> str:
+    """Состояние карточки урока из Strapi -> state_id lesson_card ("0" | "1" | "2")."""
+    if isinstance(raw_state, bool):
+        return "1" if raw_state else "0"
+    if isinstance(raw_state, int):
+        return "2" if raw_state == 2 else ("1" if raw_state == 1 else "0")
+    if isinstance(raw_state, str):
+        return _STATE_MAP.get(raw_state.strip().lower(), raw_state.strip())
+    return "0"
+
+def home_rows_from_catalog(categories: List[Any]) -> HomeRows:
+    """[(заголовок категории, [(заголовок урока, id, slug, state), ...]), ...] из core.catalog.Category."""
+    rows = []
+    for cat in categories:
+        lessons = []
+        for l in cat.lessons:
+            slug = l.slug or None
+            lid = l.id
+            try:
+                lid_int = int(lid) if lid is not None else None
+            except Exception:
+                lid_int = None
+            lessons.append((l.title or f"Урок {lid or slug or ''}", lid_int, slug, lesson_card_state(l.state)))
+        rows.append((cat.title or "Категория", lessons))
+    return rows
 
-    def _grid_with_cards(cards: List[Dict[str, Any]]) -> Dict[str, Any]:
-        # Каждую карточку заворачиваем в квадратную ячейку, чтобы не было конфликта
-        # wrap_content (у грида) vs match_parent (у карточки).
-        cells: List[Dict[str, Any]] = []
-        for card in cards:
-            cells.append({
-                "type": "container",
-                "width": {"type": "match_parent"},
-                "aspect": {"ratio": 1},
-                "margins": {"left": 4, "right": 4, "bottom": 4,"top": 4},
-                "items": [card]
-            })
+def build_home_tabs_from_catalog(categories: List[Any]) -> Dict[str, Any]:
+    """Табы /home из моделей core.catalog.Category (индекс каталога)."""
+    return home_tabs(home_rows_from_catalog(categories))
 
-        return {
-            "type": "grid",
-            "id": "category_grid",
-            "width": {"type": "match_parent"},
-            "height": {"type": "wrap_content"},
-            "column_count": 2,
-            # высоту ячейки задаём через aspect в самой ячейке, поэтому item_height не используем
-            "items": cells,
-        }
+def build_home_tabs(raw: Any) -> Dict[str, Any]:
+    """Табы /home из уже полученного ответа Strapi /api/categories (без I/O)."""
+    return home_tabs(home_rows(raw))
 
-    items: List[Dict[str, Any]] = []
+def home_rows(raw: Any) -> HomeRows:
+    """То же, что home_rows_from_catalog, но из сырого ответа Strapi /api/categories."""
+    data = raw.get("data") if isinstance(raw, dict) else raw
+    categories = data or []
+
+    rows = []
     for cat in categories:
         ca = _attrs(cat)
         title = (ca.get("title") or ca.get("name") or "Категория").strip()
@@ -387,7 +1120,7 @@ def build_home_tabs_from_strapi() -> Dict[str, Any]:
         else:
             l_items = []
 
-        lesson_views: List[Dict[str, Any]] = []
+        lessons = []
         for l in l_items:
             la = _attrs(l)
             lid = None
@@ -409,21 +1142,46 @@ def build_home_tabs_from_strapi() -> Dict[str, Any]:
                 or la.get("status")
                 or la.get("uiState")
             )
-            state_map = {
-                "0": "0", "1": "1", "2": "2",
-                "brand": "1", "success": "1", "ready": "1", "done": "1", "completed": "1",
-                "disabled": "2", "locked": "2", "off": "2",
-            }
-            if isinstance(raw_state, bool):
-                state_val = "1" if raw_state else "0"
-            elif isinstance(raw_state, int):
-                state_val = "2" if raw_state == 2 else ("1" if raw_state == 1 else "0")
-            elif isinstance(raw_state, str):
-                state_val = state_map.get(raw_state.strip().lower(), raw_state.strip())
-            else:
-                state_val = "0"
+            lessons.append((ltitle, lid_int, slug, lesson_card_state(raw_state)))
+        rows.append((title, lessons))
+    return rows
 
-            lesson_views.append(_lesson_item(ltitle, lid_int, slug, state=state_val))
+def _lesson_cell(view: Any) -> Dict[str, Any]:
+    # Каждую карточку заворачиваем в квадратную ячейку, чтобы не было конфликта
+    # wrap_content (у грида) vs match_parent (у карточки).
+    return {
+        "type": "container",
+        "width": {"type": "match_parent"},
+        "aspect": {"ratio": 1},
+        "margins": {"left": 4, "right": 4, "bottom": 4,"top": 4},
+        "items": [view]
+    }
+
+def home_tabs_spec(rows: HomeRows, card=None, cell=None) -> Dict[str, Any]:
+    """div tabs из [(заголовок категории, [(заголовок, id, slug, state), ...]), ...] с include-спеками
+    карточек (ещё не раскрытыми). card(title, id, slug, state) — свой узел вместо спеки карточки
+    (None — обычная спека); cell(view) — своя ячейка сетки вокруг карточки.
+    """
+    def _view(ltitle, lid, slug, state):
+        view = card(ltitle, lid, slug, state) if card is not None else None
+        return view if view is not None else _lesson_item_spec(ltitle, lid, slug, state=state)
+
+    def _grid_with_cards(cards: List[Any]) -> Dict[str, Any]:
+        cells = [(cell or _lesson_cell)(view) for view in cards]
+
+        return {
+            "type": "grid",
+            "id": "category_grid",
+            "width": {"type": "match_parent"},
+            "height": {"type": "wrap_content"},
+            "column_count": 2,
+            # высоту ячейки задаём через aspect в самой ячейке, поэтому item_height не используем
+            "items": cells,
+        }
+
+    items: List[Dict[str, Any]] = []
+    for title, lessons in rows:
+        lesson_views = [_view(ltitle, lid, slug, state) for ltitle, lid, slug, state in lessons]
 
         if not lesson_views:
             # Пустая категория — дружелюбный плейсхолдер
@@ -479,11 +1237,88 @@ def build_home_tabs_from_strapi() -> Dict[str, Any]:
         },
         "items": items,
     }
+    return tabs
+
+def home_tabs(rows: HomeRows) -> Dict[str, Any]:
+    """Собрать div tabs (карточки раскрыты, светлые токены) — include и токены за один проход."""
+    return render_tree(home_tabs_spec(rows), tokens="light")
+
+
+def home_lesson_card(title: str, lid: Optional[int], slug: Optional[str], state: str,
+                     theme: str = "light") -> Dict[str, Any]:
+    """Карточка урока ровно такой, какой она оказывается в готовом /home
+    (те же проходы include и токенов) — для подмены карточки по состоянию пользователя.
+    """
+    return render_tree(_lesson_item_spec(title, lid, slug, state=state), tokens=("light", theme),
+                       base_dir=UI_DIR / "components")
+
+
+# ---------- DivKit templates: карточки уроков и ячейки /home ----------
+#
+# На /home каждая карточка урока — один и тот же раскрытый div состояния из
+# components/lesson_card.json в одной и той же ячейке сетки; различаются только
+# заголовок и action. Вместо повторения всего div в ответе карточки и ячейка
+# объявляются один раз в секции "templates" (по шаблону на состояние карточки),
+# а урок становится маленьким экземпляром:
+#   {"type": "lesson_cell", "items": [{"type": "lesson_card_1", "title": ..., "action": {...}}]}
+# В шаблоне карточки поля с данными урока привязаны к параметрам экземпляра
+# ("$text": "title", "$action": "action"); остальное — ровно то, что раньше
+# попадало в /home (тот же include, state, div_set и токены light + тема).
+
+LESSON_CARD_COMPONENT = UI_DIR / "components" / "lesson_card.json"
+LESSON_CELL_TEMPLATE = "lesson_cell"
+_CARD_TEMPLATE = "lesson_card_{}"
+_PARAM = "\x00param:{}\x00"
+
+
+def _bind_params(node: Any) -> Any:
+    """Заменить значения-метки _PARAM на привязки DivKit: {"text": <метка title>} -> {"$text": "title"}."""
+    if isinstance(node, dict):
+        out: Dict[str, Any] = {}
+        for k, v in node.items():
+            if isinstance(v, str) and v.startswith("\x00param:"):
+                out["$" + k] = v[len("\x00param:"):-1]
+            else:
+                out[k] = _bind_params(v)
+        return out
+    if isinstance(node, (list, tuple)):
+        return [_bind_params(x) for x in node]
+    return node
+
+def _card_states() -> Tuple[List[str], str]:
+    """(state_id карточки урока, состояние по умолчанию) — как их выбирает include с flatten_state."""
+    tree = _compiled(LESSON_CARD_COMPONENT, None)[0]
+    states = tree.get("states") if isinstance(tree, dict) else None
+    ids = [str(s["state_id"]) for s in states or () if isinstance(s, dict) and s.get("state_id") is not None]
+    cur = tree.get("state_id") if isinstance(tree, dict) else None
+    return ids, (str(cur) if cur is not None and str(cur) in ids else (ids[0] if ids else "0"))
+
+def home_card_templates(theme: str = "light") -> Dict[str, Any]:
+    """Секция "templates" для /home: шаблон карточки урока на каждое состояние + ячейка сетки."""
+    out: Dict[str, Any] = {}
+    for sid in _card_states()[0]:
+        spec = _lesson_item_spec(_PARAM.format("title"), None, None, state=sid)
+        spec["$include"]["div_set"]["action"] = _PARAM.format("action")
+        node = render_tree(spec, tokens=("light", theme), base_dir=UI_DIR / "components")
+        out[_CARD_TEMPLATE.format(sid)] = _bind_params(node)
+    cell = _lesson_cell(None)
+    del cell["items"]                 # карточку кладёт экземпляр
+    out[LESSON_CELL_TEMPLATE] = cell
+    return out
+
+def home_card_instance(title: str, lid: Optional[int], slug: Optional[str], state: str) -> Dict[str, Any]:
+    """Экземпляр шаблона карточки урока (см. home_card_templates)."""
+    ids, default = _card_states()
+    state = str(state)
+    return {
+        "type": _CARD_TEMPLATE.format(state if state in ids else default),
+        "title": title,
+        "action": _lesson_action(lid, slug),
+    }
 
-    resolved = resolve_includes(deepcopy(tabs))
-    tokens = load_tokens("light")
-    resolved = apply_design_tokens(resolved, tokens)
-    return resolved
+def home_cell_instance(view: Any) -> Dict[str, Any]:
+    """Экземпляр шаблона ячейки сетки с карточкой внутри."""
+    return {"type": LESSON_CELL_TEMPLATE, "items": [view]}
 
 
 def inject_home_lessons_tabs(card_tree: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,125 @@
+# apps/backend/core/ui_watch.py
+"""Фоновый вотчер шаблонов apps/web/ui.
+
+Правки JSON подхватываются без рестарта воркеров: вотчер сообщает в core.ui,
+какие файлы изменились, и там сбрасываются только записи кэша, транзитивно
+от них зависящие (см. core.ui.invalidate_paths).
+
+Бэкенды:
+  - inotify через `inotify_simple`, если пакет установлен (Linux);
+  - иначе дешёвый поллинг: stat() только тех файлов, что реально участвовали в сборке.
+
+ENV:
+  UI_WATCH           — "0"/"off" выключает вотчер (прод с неизменными шаблонами);
+  UI_WATCH_INTERVAL  — период поллинга в секундах (по умолчанию 1.0).
+"""
+from __future__ import annotations
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from core.paths import UI_DIR
+from core import ui
+from core.logs import get_logger
+
+log = get_logger("ui-watch")
+
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _enabled() -> bool:
+    return str(os.getenv("UI_WATCH", "1")).lower() not in ("0", "false", "no", "off")
+
+def _interval() -> float:
+    try:
+        return max(float(os.getenv("UI_WATCH_INTERVAL", "1.0")), 0.05)
+    except ValueError:
+        return 1.0
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _poll_loop(interval: float) -> None:
+    seen: Dict[str, Optional[Tuple[int, int]]] = {}
+    while not _stop.wait(interval):
+        changed = []
+        for path in ui.watched_paths():
+            cur = _stamp(path)
+            if path not in seen:
+                seen[path] = cur
+                continue
+            if seen[path] != cur:
+                seen[path] = cur
+                changed.append(path)
+        if changed:
+            dropped = ui.invalidate_paths(changed)
+            log.info("templates changed", extra={"changed": len(changed), "invalidated": dropped})
+
+
+def _inotify_loop(inotify_simple) -> None:
+    flags = inotify_simple.flags
+    mask = (flags.MODIFY | flags.CLOSE_WRITE | flags.CREATE | flags.DELETE
+            | flags.MOVED_TO | flags.MOVED_FROM)
+    ino = inotify_simple.INotify()
+    dirs: Dict[int, Path] = {}
+
+    def _watch(d: Path) -> None:
+        try:
+            dirs[ino.add_watch(str(d), mask)] = d
+        except OSError:
+            pass
+
+    for d in [UI_DIR, *(p for p in UI_DIR.rglob("*") if p.is_dir())]:
+        _watch(d)
+
+    while not _stop.is_set():
+        events = ino.read(timeout=int(_interval() * 1000))
+        changed = []
+        for ev in events:
+            base = dirs.get(ev.wd)
+            if base is None or not ev.name:
+                continue
+            path = base / ev.name
+            if ev.mask & flags.ISDIR:
+                if ev.mask & flags.CREATE:
+                    _watch(path)
+                continue
+            changed.append(str(path.resolve()))
+        if changed:
+            dropped = ui.invalidate_paths(changed)
+            log.info("templates changed", extra={"changed": len(changed), "invalidated": dropped})
+
+
+def start_watcher() -> Optional[threading.Thread]:
+    """Запустить вотчер (один на процесс). Возвращает поток или None, если выключен."""
+    global _thread
+    if not _enabled():
+        return None
+    if _thread is not None and _thread.is_alive():
+        return _thread
+    _stop.clear()
+    try:
+        import inotify_simple  # type: ignore
+        target, args = _inotify_loop, (inotify_simple,)
+    except ImportError:
+        target, args = _poll_loop, (_interval(),)
+    _thread = threading.Thread(target=target, args=args, name="ui-watch", daemon=True)
+    _thread.start()
+    return _thread
+
+def stop_watcher() -> None:
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=2)
+    _thread = None
+
+
+__all__ = ["start_watcher", "stop_watcher"]
@@ -0,0 +1,150 @@
+# apps/backend/core/word_store.py
+"""Слова всех уроков в памяти — для /review (повторение вперемешку из разных уроков).
+
+Собрать сессию повторения «в лоб» — это get_lesson в Strapi на каждый урок-источник.
+Здесь слова не копируются: индекс каталога (core/catalog_index.py) и так держит
+их колонками, хранилище — только ссылки (id урока, позиция слова) в array("I")
+и заранее разложенные корзины по уровню:
+  - levels:  нормализованный уровень (как в поиске: "b1", "a2 ...") -> номера ссылок;
+  - "":      все слова (level не задан).
+Сессия — выборка N слов из корзины без повторов (одинаковые term из разных уроков
+берутся один раз) генератором, засеянным (seed, уровень, N): один и тот же URL
+даёт те же слова и тот же порядок в любом воркере, поэтому шаги кэшируются, как
+шаги урока. Хранилище пересобирается, когда подменился индекс каталога (сборка —
+один проход по словам, ~2 мс на 1000 слов; сессия из 10 слов — ~0.1 мс).
+"""
+from __future__ import annotations
+import random
+import threading
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core import catalog_index, memdiag
+from core.catalog import Lesson, LessonNotFound, Word, WordColumns
+from core.logs import get_logger
+from core.search_index import normalize
+
+log = get_logger("review")
+
+REVIEW_TITLE = "Повторение"
+
+
+class WordStore:
+    """Неизменяемый снимок: ссылки на слова индекса каталога + корзины по уровням."""
+    __slots__ = ("source", "refs", "buckets", "levels", "built_ms")
+
+    def __init__(self, catalog) -> None:
+        t0 = time.perf_counter()
+        self.source = catalog                       # индекс каталога, на слова которого ссылаемся
+        self.refs = array("I")                      # плоские пары: id урока, позиция слова
+        buckets: Dict[str, array] = {"": array("I")}
+        self.levels: Dict[str, str] = {}            # ключ корзины -> уровень как в Strapi
+        keys: Dict[str, str] = {}                   # уровней единицы — нормализуем каждый один раз
+        for lid in sorted(catalog.by_id):
+            words = catalog.by_id[lid].words
+            for i in range(len(words)):
+                ref = len(self.refs) // 2
+                self.refs.extend((lid, i))
+                buckets[""].append(ref)
+                level = words.field(i, "level")
+                key = keys.get(level)
+                if key is None:
+                    key = keys[level] = normalize(level)
+                if key:
+                    buckets.setdefault(key, array("I")).append(ref)
+                    self.levels.setdefault(key, level)
+        self.buckets = buckets
+        self.built_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    def __len__(self) -> int:
+        return len(self.refs) // 2
+
+    def word(self, ref: int) -> Word:
+        lid, i = self.refs[2 * ref], self.refs[2 * ref + 1]
+        return self.source.by_id[lid].words[i]
+
+    def _shuffled(self, bucket: array, rng: random.Random) -> Iterator[int]:
+        # выборка без повторов по O(1) на слово: короткая сессия из большой корзины
+        # не перемешивает всю корзину
+        taken: Dict[int, int] = {}
+        for k in range(len(bucket)):
+            j = rng.randrange(k, len(bucket))
+            yield bucket[taken.get(j, j)]
+            taken[j] = taken.get(k, k)
+
+    def session(self, seed: str, *, level: str = "", n: int = 10) -> List[Word]:
+        """N разных слов уровня level (все уровни, если пусто); детерминировано по аргументам."""
+        key = normalize(level)
+        bucket = self.buckets.get(key)
+        if not bucket or n <= 0:
+            return []
+        rng = random.Random(f"{seed}|{key}|{n}")
+        out: List[Word] = []
+        terms = set()
+        for ref in self._shuffled(bucket, rng):
+            w = self.word(ref)
+            term = normalize(w.term)
+            if term in terms:
+                continue
+            terms.add(term)
+            out.append(w)
+            if len(out) >= n:
+                break
+        return out
+
+
+_store: Optional[WordStore] = None
+_lock = threading.Lock()
+
+
+def _describe(store: Optional[WordStore]) -> Dict[str, object]:
+    if store is None:
+        return {"words": 0}
+    return {
+        "words": len(store),
+        "refs_bytes": store.refs.itemsize * len(store.refs),
+        "levels": {store.levels.get(k, k) or "*": len(b) for k, b in store.buckets.items()},
+        "built_ms": store.built_ms,
+    }
+
+memdiag.register_cache("review.words", lambda: _store, describe=_describe)
+
+
+def get_store() -> Optional[WordStore]:
+    """Хранилище слов для текущего индекса каталога; None — каталога нет (CATALOG_INDEX=0 и т.п.)."""
+    global _store
+    catalog = catalog_index.get_index()
+    if catalog is None:
+        return None
+    store = _store
+    if store is not None and store.source is catalog:
+        return store
+    with _lock:
+        if _store is None or _store.source is not catalog:
+            _store = WordStore(catalog)   # атомарная подмена ссылки
+            log.info("word store built", extra={"words": len(_store), "levels": len(_store.levels),
+                                                 "ms": _store.built_ms})
+        return _store
+
+def session_lesson(seed: str, *, level: str = "", n: int = 10) -> Lesson:
+    """Сессия повторения как урок без id (форма для to_divkit_lesson / шагов урока).
+    LessonNotFound — в корзине уровня нет слов; RuntimeError — хранилища нет (каталог не загружен)."""
+    store = get_store()
+    if store is None:
+        raise RuntimeError("review: word store unavailable")
+    words = store.session(seed, level=level, n=n)
+    if not words:
+        raise LessonNotFound(f"review: no words for level={level!r}")
+    rows: List[Tuple[str, str, str, str, str]] = [
+        (w.term, w.translation, w.distractor1, w.level, w.image) for w in words
+    ]
+    return Lesson(None, REVIEW_TITLE, "", "", words=WordColumns(rows))
+
+def levels() -> List[str]:
+    """Уровни, по которым есть слова (как в Strapi)."""
+    store = get_store()
+    return sorted(store.levels.values()) if store is not None else []
+
+
+__all__ = ["WordStore", "get_store", "session_lesson", "levels", "REVIEW_TITLE"]
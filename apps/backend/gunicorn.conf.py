@@ -0,0 +1,29 @@
+# apps/backend/gunicorn.conf.py
+"""gunicorn: приложение грузится и прогревается в мастере, воркеры делят память через fork.
+
+    cd apps/backend && gunicorn app:app
+
+ENV:
+  PORT / GUNICORN_BIND  — адрес (0.0.0.0:5050);
+  WEB_CONCURRENCY       — число воркеров (2 * CPU + 1);
+  GUNICORN_THREADS      — потоков на воркер (1 — sync-воркеры);
+  GUNICORN_TIMEOUT      — таймаут воркера, сек (30).
+Что именно прогревается и что пересоздаётся после fork — core/boot.py.
+"""
+import multiprocessing
+import os
+
+# до импорта app: create_app не запускает фоновые потоки в мастере, app.py зовёт boot.preload()
+os.environ.setdefault("APP_PRELOAD", "1")
+
+bind = os.getenv("GUNICORN_BIND") or f"0.0.0.0:{os.getenv('PORT', '5050')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+preload_app = True
+accesslog = None          # access-лог пишет само приложение (logger "worb.access")
+
+
+def post_fork(server, worker):
+    from core import boot
+    boot.after_fork()
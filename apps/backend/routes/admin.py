@@ -0,0 +1,120 @@
+# apps/backend/routes/admin.py
+from __future__ import annotations
+from functools import wraps
+
+from flask import Blueprint, abort, jsonify, request
+
+from core import memdiag, profiling, telemetry
+
+bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+def _admin_only(view):
+    """Доступ по ADMIN_TOKEN (X-Admin-Token или Authorization: Bearer). Без токена в env — 404."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiling.admin_token():
+            abort(404)
+        auth = request.headers.get("Authorization", "")
+        given = request.headers.get("X-Admin-Token") or (auth[7:] if auth.startswith("Bearer ") else "")
+        if not profiling.token_ok(given):
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# ---- profiles ---------------------------------------------------------------------
+
+@bp.get("/profile/top")
+@_admin_only
+def profile_top():
+    """Сводный top-N горячих функций: ?n=30&sort=tottime|cumtime|ncalls&path=/home&last=50"""
+    return jsonify(profiling.top_functions(
+        n=request.args.get("n", default=30, type=int),
+        sort=request.args.get("sort", default="tottime"),
+        path_filter=request.args.get("path", default=""),
+        last=request.args.get("last", default=0, type=int),
+    ))
+
+@bp.get("/profile/list")
+@_admin_only
+def profile_list():
+    files = profiling.list_profiles(request.args.get("path", default=""))
+    return jsonify({
+        "dir": str(profiling.profile_dir()),
+        "sample_rate": profiling.sample_rate(),
+        "profiles": [p.name for p in files],
+    })
+
+
+# ---- memory -----------------------------------------------------------------------
+
+def _conflict(e: RuntimeError):
+    return jsonify({"error": str(e)}), 409
+
+@bp.get("/mem/status")
+@_admin_only
+def mem_status():
+    return jsonify({**memdiag.tracing_status(), "rss_bytes": memdiag.rss_bytes()})
+
+@bp.get("/mem/caches")
+@_admin_only
+def mem_caches():
+    """Размер каждого зарегистрированного кэша (записи, оценка байт) и RSS воркера."""
+    return jsonify(memdiag.cache_report())
+
+@bp.post("/mem/tracemalloc/start")
+@_admin_only
+def mem_trace_start():
+    """Включить tracemalloc: ?frames=1 (глубина стека; больше — точнее и дороже)."""
+    return jsonify(memdiag.start_tracing(request.args.get("frames", default=1, type=int)))
+
+@bp.post("/mem/tracemalloc/stop")
+@_admin_only
+def mem_trace_stop():
+    return jsonify(memdiag.stop_tracing())
+
+@bp.post("/mem/snapshot")
+@_admin_only
+def mem_snapshot():
+    try:
+        return jsonify(memdiag.take_snapshot())
+    except RuntimeError as e:
+        return _conflict(e)
+
+@bp.get("/mem/top")
+@_admin_only
+def mem_top():
+    """Top-N мест выделения в последнем снимке: ?n=20&group=lineno|filename|traceback"""
+    try:
+        return jsonify(memdiag.top_allocations(
+            n=request.args.get("n", default=20, type=int),
+            group=request.args.get("group", default="lineno"),
+        ))
+    except RuntimeError as e:
+        return _conflict(e)
+
+@bp.get("/mem/diff")
+@_admin_only
+def mem_diff():
+    """Рост памяти между двумя последними снимками: ?n=20&group=lineno|filename|traceback"""
+    try:
+        return jsonify(memdiag.diff_allocations(
+            n=request.args.get("n", default=20, type=int),
+            group=request.args.get("group", default="lineno"),
+        ))
+    except RuntimeError as e:
+        return _conflict(e)
+
+
+# ---- telemetry ----------------------------------------------------------------------
+
+@bp.get("/funnel")
+@_admin_only
+def funnel():
+    """Воронка уроков из /log за окно: ?window=3600&lesson=id:1|slug:x (счётчики этого воркера)."""
+    lesson = (request.args.get("lesson") or "").strip() or None
+    return jsonify({
+        **telemetry.funnel(lesson, request.args.get("window", default=3600.0, type=float)),
+        "status": telemetry.aggregator().status(),
+    })
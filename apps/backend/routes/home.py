@@ -1,18 +1,41 @@
 # apps/backend/routes/home.py
 from __future__ import annotations
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, request
+from core import catalog_index, lkg, progress
+from core.json_stream import coalesce, iter_json
+from core.logs import get_logger
 from core.paths import UI_DIR
+from core.singleflight import SingleFlight
 from core.ui import (
-    resolve_includes,
-    apply_design_tokens,
-    load_tokens,
-    build_home_tabs_from_strapi,
-    replace_node_by_id,
+    cached_render,
+    find_in_template,
+    forget_render,
+    home_card_instance,
+    home_card_templates,
+    home_cell_instance,
+    home_lesson_card,
+    home_rows_from_catalog,
+    home_rows_from_strapi,
+    home_tabs_spec,
+    known_theme,
+    patch_path,
+    render_template,
 )
-import json
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import threading
 
 bp = Blueprint("home", __name__)
+log = get_logger("home")
+
+# данные табов общие для всех ждущих запросов — дальше их только читают
+_rows_flight = SingleFlight("home-rows")
 
 TABS_CONTAINER_IDS = [
     "home_tabs",          # новое id
@@ -22,106 +45,307 @@ TABS_CONTAINER_IDS = [
     "tabs_container",
 ]
 
-def _replace_into_any(tree, ids, node) -> bool:
-    for _id in ids:
-        try:
-            if replace_node_by_id(tree, _id, node):
-                return True
-        except Exception:
-            pass
-    return False
-
-def _load_page(template: str | None) -> dict:
+def _page_path(template: str | None) -> Path:
     """
-    Загружаем шаблон страницы:
+    Шаблон страницы:
       - ?template=home_lessons => pages/home_lessons.json (если есть)
       - иначе pages/home.json, а если его нет — fallback на home_lessons.json.
     """
     candidates: list[Path] = []
-    if template:
+    if template and re.fullmatch(r"[A-Za-z0-9_-]+", template):
         candidates.append(UI_DIR / "pages" / f"{template}.json")
     candidates.append(UI_DIR / "pages" / "home.json")
     candidates.append(UI_DIR / "pages" / "home_lessons.json")
 
     for p in candidates:
         if p.exists():
-            with open(p, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return p
     raise FileNotFoundError("UI pages/home(.json) не найдён (и home_lessons.json тоже).")
 
 @bp.get("/home")
 def get_home():
-    # параметры
-    template = request.args.get("template")  # 'home' | 'home_lessons'
-    theme = (request.args.get("theme") or "light").lower()
-    active_tab = request.args.get("tab") or None
+    return render_home()
+
+
+# ---- общий /home + персональные состояния карточек ----------------------------
+#
+# Готовый /home одинаков для всех, кроме состояний карточек уроков ("0"/"1"/"2").
+# Поэтому база собирается один раз (на шаблон/тему/табы и данные каталога) и
+# хранится как JSON-байты, разрезанные по карточкам: [сегмент, карточка, сегмент, ...].
+# Для пользователя подменяются только карточки уроков, чьё состояние у него
+# отличается от общего, — O(изменённых уроков), без пересборки дерева.
+#
+# По умолчанию (HOME_TEMPLATES=1) карточки и ячейки сетки отдаются экземплярами
+# DivKit-шаблонов из секции "templates" (core.ui.home_card_templates): карточка
+# в теле — несколько десятков байт вместо полного div. HOME_TEMPLATES=0 — прежний
+# полностью раскрытый JSON.
+
+_CARD_MARK = "\x00card{}\x00"
+_CARD_MARK_RE = re.compile(rb'"\\u0000card(\d+)\\u0000"')
+
+
+def _json_opts() -> Dict[str, bool]:
+    provider = current_app.json
+    return {
+        "ensure_ascii": getattr(provider, "ensure_ascii", True),
+        "sort_keys": getattr(provider, "sort_keys", True),
+    }
+
+def _dumps(obj) -> bytes:
+    """Компактный JSON с настройками провайдера Flask (сегменты и карточки склеиваются байтово)."""
+    return json.dumps(obj, separators=(",", ":"), **_json_opts()).encode("utf-8")
+
+def _templates_enabled() -> bool:
+    return (os.getenv("HOME_TEMPLATES") or "1").lower() in ("1", "true", "yes", "on")
+
+def _card_bytes(meta: Tuple[str, int, Optional[str], str], theme: str, templates: bool) -> bytes:
+    """Байты карточки урока в теле /home: экземпляр шаблона или раскрытый div."""
+    if templates:
+        return _dumps(home_card_instance(*meta))
+    return _dumps(home_lesson_card(*meta, theme))
+
+
+# состояния, которые пользователь может выставить уроку (core/progress.py)
+_USER_STATES = ("0", "1", "2")
+
+
+class _HomeBase:
+    """Собранная база /home — общая для всех запросов и потоков, после сборки не меняется:
+    куски тела, карточки и все их варианты по состояниям готовы заранее."""
+    __slots__ = ("parts", "cards", "by_lesson", "variants", "size", "body")
+
+    def __init__(self, parts: List[bytes], cards: List[Tuple[str, int, Optional[str], str]], theme: str,
+                 templates: bool = False) -> None:
+        self.parts: Tuple[bytes, ...] = tuple(parts)   # чётные — сегменты, нечётные — карточки
+        self.cards: Tuple[Tuple[str, int, Optional[str], str], ...] = tuple(cards)  # (заголовок, id, slug, общее состояние)
+        by_lesson: Dict[int, List[int]] = {}
+        for n, card in enumerate(cards):
+            by_lesson.setdefault(card[1], []).append(n)
+        self.by_lesson: Dict[int, Tuple[int, ...]] = {lid: tuple(ns) for lid, ns in by_lesson.items()}
+        # байты карточки n в каждом состоянии _USER_STATES; своё состояние — те же байты, что в parts
+        self.variants: Tuple[Tuple[bytes, ...], ...] = tuple(
+            tuple(self.parts[2 * n + 1] if state == own else _card_bytes((title, lid, slug, state), theme, templates)
+                  for state in _USER_STATES)
+            for n, (title, lid, slug, own) in enumerate(self.cards)
+        )
+        self.size = sum(len(p) for p in self.parts)
+        # склеенное тело держим, только если /home отдаётся одним телом (иначе — лишняя копия)
+        self.body: Optional[bytes] = None if _streamed(self.size) else b"".join(self.parts)
+
+    def render_parts(self, states: Dict[int, str]) -> List[bytes]:
+        """Куски тела с карточками пользователя (ссылки на общие байты, без склейки)."""
+        parts = None
+        for lid, state in states.items():
+            if state not in _USER_STATES:
+                continue
+            for n in self.by_lesson.get(lid, ()):
+                if self.cards[n][3] == state:
+                    continue
+                if parts is None:
+                    parts = list(self.parts)
+                parts[2 * n + 1] = self.variants[n][_USER_STATES.index(state)]
+        return self.parts if parts is None else parts
+
+    def render(self, states: Dict[int, str]) -> bytes:
+        parts = self.render_parts(states)
+        if parts is self.parts and self.body is not None:
+            return self.body
+        return b"".join(parts)
+
+
+def _split_cards(tree, cards: List[Tuple[str, int, Optional[str], str]], theme: str, templates: bool):
+    """Разрезать JSON страницы по меткам карточек; карточки — те же байты, что и подмена по состоянию.
+    JSON кодируется потоком: метка — строковый лист, поэтому целиком лежит в одном куске,
+    и всё тело одной строкой не строится ни разу.
+    """
+    parts: List[bytes] = []
+    order: List[Tuple[str, int, Optional[str], str]] = []
+    segment: List[bytes] = []
+    for chunk in iter_json(tree, **_json_opts()):
+        pieces = _CARD_MARK_RE.split(chunk)
+        for i, piece in enumerate(pieces):
+            if i % 2 == 0:
+                segment.append(piece)
+                continue
+            parts.append(b"".join(segment))
+            segment = []
+            meta = cards[int(piece)]
+            parts.append(_card_bytes(meta, theme, templates))
+            order.append(meta)
+    parts.append(b"".join(segment))
+    return parts, order
+
+
+def _build_base(template: Optional[str], theme: str, rows, templates: bool = False) -> _HomeBase:
+    page = _page_path(template)
+
+    # карточки уроков с id встают в табы метками: их байты собираются отдельно
+    # (ровно те же, что потом подменяются по состоянию пользователя)
+    cards: List[Tuple[str, int, Optional[str], str]] = []
+
+    def _card(title, lid, slug, state):
+        if lid is None:
+            # без id подменять по состоянию нечего — карточка сразу на месте
+            return home_card_instance(title, lid, slug, state) if templates else None
+        cards.append((title, lid, slug, state))
+        return _CARD_MARK.format(len(cards) - 1)
 
-    # 1) читаем страницу БЕЗ токенов
-    card = _load_page(template)
+    # 1-3) табы из данных каталога — ещё include-спеками, раскроются вместе со страницей
+    tabs = home_tabs_spec(rows, card=_card, cell=home_cell_instance if templates else None)
 
-    # 2) раскрываем инклюды шаблона (чтобы найти контейнер для табов)
-    card = resolve_includes(card)
+    # 4-6) скомпилированная страница темы (общая, не копируется) + табы на месте контейнера:
+    #      копируется только путь до контейнера; табы, как и раньше, сначала
+    #      получают светлые токены, потом токены темы
+    container = find_in_template(page, TABS_CONTAINER_IDS, theme=theme)
+    if container is None:
+        log.warning("tabs container not found", extra={"tried": TABS_CONTAINER_IDS})
+    anchors = {container: {"render": tabs, "tokens": ["light", theme]}} if container else None
+    tree = render_template(page, theme=theme, anchors=anchors)
+    if templates and isinstance(tree, dict):
+        tree = patch_path(tree, (), {"templates": {**(tree.get("templates") or {}), **home_card_templates(theme)}})
 
-    # 3) собираем табы из Strapi
+    # 7) немного диагностики в лог — по данным, без обхода дерева
+    if log.isEnabledFor(logging.DEBUG) and container:
+        log.debug("tabs ok", extra={"tabs": max(len(rows), 1), "first_tab_children": len(rows[0][1]) if rows else 0})
+
+    parts, order = _split_cards(tree, cards, theme, templates)
+    return _HomeBase(parts, order, theme, templates)
+
+
+def _stream_mode() -> str:
+    return (os.getenv("HOME_STREAM") or "auto").lower()
+
+def _stream_min() -> int:
     try:
+        return max(int(os.getenv("HOME_STREAM_MIN", str(256 * 1024))), 0)
+    except ValueError:
+        return 256 * 1024
+
+def _streamed(size: int) -> bool:
+    mode = _stream_mode()
+    return mode in ("1", "true", "yes", "on") or (mode == "auto" and size >= _stream_min())
+
+def _respond(base: _HomeBase, states: Dict[int, str]):
+    """Большой /home отдаём потоком кусков (без склейки тела на запрос), маленький — одним телом."""
+    mimetype = current_app.json.mimetype
+    if not _streamed(base.size):
+        return current_app.response_class(base.render(states) + b"\n", mimetype=mimetype)
+    parts = base.render_parts(states)
+    resp = current_app.response_class(coalesce(itertools.chain(parts, (b"\n",))), mimetype=mimetype)
+    resp.content_length = sum(len(p) for p in parts) + 1
+    return resp
+
+
+def _error_home(template: Optional[str], theme: str) -> bytes:
+    page = _page_path(template)
+    tabs = {
+        "type": "tabs",
+        "items": [{
+            "title": "Ошибка",
+            "div": {
+                "type": "container",
+                "items": [{
+                    "type": "text",
+                    "text": "Не удалось загрузить категории",
+                    "paddings": {"top": 16, "bottom": 16},
+                    "text_alignment_horizontal": "center",
+                }],
+            },
+        }],
+    }
+    container = find_in_template(page, TABS_CONTAINER_IDS, theme=theme)
+    if container is None:
+        log.warning("tabs container not found", extra={"tried": TABS_CONTAINER_IDS})
+    anchors = {container: {"render": tabs, "tokens": [theme]}} if container else None
+    return _dumps(render_template(page, theme=theme, anchors=anchors))
+
+
+def _rows_from_json(rows) -> list:
+    """Строки табов из last-known-good: с диска они приходят списками, в ключ кэша — кортежами."""
+    return [(title, [tuple(lesson) for lesson in lessons]) for title, lessons in rows]
+
+
+def _rows_hash(rows) -> str:
+    return hashlib.sha1(repr(rows).encode("utf-8")).hexdigest()[:16]
+
+
+# ключ текущей базы на (страница, тема, шаблоны): база под прежние данные каталога
+# выбрасывается, как только собрана новая, — в кэше по одной базе на вариант страницы
+_latest_base: Dict[tuple, tuple] = {}
+_latest_lock = threading.Lock()
+
+def _home_base(slot: tuple, data_key: str, build) -> _HomeBase:
+    key = ("home",) + slot + (data_key,)
+    base = cached_render(key, build)
+    with _latest_lock:
+        prev = _latest_base.get(slot)
+        if prev == key:
+            return base
+        _latest_base[slot] = key
+    if prev is not None:
+        forget_render(prev)
+    return base
+
+
+# табы из индекса каталога и их отпечаток — один раз на индекс: перезагрузка с теми же
+# данными даёт тот же отпечаток, и база /home не пересобирается
+_index_rows: Tuple[object, list, str] = (None, [], "")
+_index_rows_lock = threading.Lock()
+
+def _rows_of_index(index) -> Tuple[list, str]:
+    global _index_rows
+    cached = _index_rows
+    if cached[0] is not index:
+        with _index_rows_lock:
+            cached = _index_rows
+            if cached[0] is not index:
+                rows = home_rows_from_catalog(list(index.categories))
+                cached = _index_rows = (index, rows, _rows_hash(rows))
+    return cached[1], cached[2]
+
+
+def render_home(build_rows: Optional[Callable[[], list]] = None):
+    """Сборка /home в контексте текущего запроса.
+    build_rows — готовые данные табов (async-режим передаёт их из уже полученного
+    ответа Strapi); по умолчанию — из индекса каталога или Strapi синхронно.
+    """
+    # параметры: ключ кэша — по реально существующим файлам страницы и токенов
+    # (неизвестный ?template= — это home.json, неизвестная ?theme= — light)
+    page = _page_path(request.args.get("template"))
+    template = page.stem
+    theme = known_theme(request.args.get("theme"))
+    templates = _templates_enabled()
+
+    stale_age: Optional[float] = None
+    index = catalog_index.get_index() if build_rows is None else None
+    if index is not None:
+        # данные — целиком из индекса: табы и отпечаток посчитаны один раз на индекс
+        rows, data_key = _rows_of_index(index)
+
+        def _build():
+            lkg.remember("home", "rows", rows, fingerprint=data_key)
+            return _build_base(template, theme, rows, templates)
+    else:
         try:
-            tabs = build_home_tabs_from_strapi(active_tab=active_tab)
-        except TypeError:
-            tabs = build_home_tabs_from_strapi()
-    except Exception as e:
-        print("Build home tabs failed:", e)
-        tabs = {
-            "type": "tabs",
-            "items": [{
-                "title": "Ошибка",
-                "div": {
-                    "type": "container",
-                    "items": [{
-                        "type": "text",
-                        "text": "Не удалось загрузить категории",
-                        "paddings": {"top": 16, "bottom": 16},
-                        "text_alignment_horizontal": "center",
-                    }],
-                },
-            }],
-        }
-
-    # 4) подставляем табы
-    ok = _replace_into_any(card, TABS_CONTAINER_IDS, tabs)
-    if not ok:
-        print("WARN: Не нашли контейнер табов. Пробовали id:", ", ".join(TABS_CONTAINER_IDS))
-
-    # 5) ЕЩЁ РАЗ раскрываем инклюды — уже с подставленными табами (внутри них есть $include)
-    card = resolve_includes(card)
-
-    # 6) применяем дизайн-токены ПОСЛЕ полной сборки дерева
-    card = apply_design_tokens(card, load_tokens(theme))
-
-    # 7) немного диагностики в лог
-    try:
-        # посчитаем кол-во карточек в первой вкладке, чтобы понимать, что реально пришло
-        first_tab = None
-        def _find_tabs(node):
-            if isinstance(node, dict):
-                if node.get("type") == "tabs" and node.get("items"):
-                    return node
-                for v in node.values():
-                    found = _find_tabs(v)
-                    if found: return found
-            elif isinstance(node, list):
-                for it in node:
-                    found = _find_tabs(it)
-                    if found: return found
-            return None
-
-        tnode = _find_tabs(card)
-        if tnode and tnode.get("items"):
-            first_tab = tnode["items"][0]
-            grid = (first_tab.get("div") or {}).get("items") or []
-            print(f"[home] tabs ok: tabs={len(tnode['items'])}, first_tab_children={len(grid)}")
-        else:
-            print("[home] tabs not found after injection")
-    except Exception:
-        pass
-
-    return jsonify(card)
\ No newline at end of file
+            rows = build_rows() if build_rows is not None else _rows_flight.do("home_rows", home_rows_from_strapi)
+            data_key = _rows_hash(rows)
+            lkg.remember("home", "rows", rows, fingerprint=data_key)
+        except Exception as e:
+            # Strapi упал или кончился бюджет запроса — последние удачные табы, помеченные как устаревшие
+            found = lkg.recall("home", "rows")
+            if found is None:
+                log.error("build home tabs failed: %s", e)
+                return current_app.response_class(_error_home(template, theme) + b"\n", mimetype=current_app.json.mimetype)
+            rows, stale_age = _rows_from_json(found[0]), found[1]
+            data_key = _rows_hash(rows)
+            log.warning("serving last known good home: %s", e, extra={"age_s": round(stale_age)})
+
+        def _build():
+            return _build_base(template, theme, rows, templates)
+
+    # база кэшируется до правки шаблонов/токенов (cached_render) и до смены данных каталога
+    base = _home_base((template, theme, templates), data_key, _build)
+
+    uid = progress.request_user_id(request)
+    resp = _respond(base, progress.states(uid) if uid else {})
+    return lkg.mark_stale(resp, stale_age) if stale_age is not None else resp
@@ -0,0 +1,35 @@
+from __future__ import annotations
+from flask import Blueprint, Response, abort, request, send_file
+
+from core.images import PLACEHOLDER_SVG, variant
+from core.logs import get_logger
+
+bp = Blueprint("img", __name__)
+log = get_logger("img")
+
+# варианты адресуются ключом + шириной и не меняются — кэшируем надолго
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+@bp.get("/img/placeholder.svg")
+def img_placeholder():
+    resp = Response(PLACEHOLDER_SVG, mimetype="image/svg+xml")
+    resp.headers["Cache-Control"] = _IMMUTABLE
+    return resp
+
+@bp.get("/img/<string:key>")
+def img_proxy(key: str):
+    if not key.isalnum() or len(key) > 64:
+        abort(404)
+    width = request.args.get("w", default=None, type=int)
+    try:
+        found = variant(key, width, request.headers.get("Accept", ""))
+    except Exception as e:
+        log.warning("upstream fetch failed: %s", e, extra={"key": key})
+        abort(502)
+    if found is None:
+        abort(404)
+    path, mimetype = found
+    resp = send_file(path, mimetype=mimetype, conditional=True, max_age=31536000)
+    resp.headers["Cache-Control"] = _IMMUTABLE
+    resp.headers["Vary"] = "Accept"
+    return resp
@@ -1,10 +1,19 @@
 from __future__ import annotations
-from flask import Blueprint, jsonify, send_from_directory, request
+from flask import Blueprint, current_app, jsonify, send_from_directory, request
 from core.paths import UI_DIR, WEB_DIR
-from core.ui import resolve_includes, apply_design_tokens, load_tokens, patch_by_id
-from strapi_client import get_lesson as fetch_lesson, get_lesson_by_slug, to_divkit_lesson
+from core import catalog_index, lkg, shared_cache, word_store
+from core.catalog import LESSON_MAX_WORDS, LessonNotFound
+from core.images import proxy_url
+from core.logs import get_logger
+from core.singleflight import SingleFlight
+from core.ui import resolve_includes, render_template, template, template_version, patch_by_id, patch_path
+from strapi_client import to_divkit_lesson, cache_ttl
 from pathlib import Path
-import json, os, random
+from typing import Optional
+from urllib.parse import urlencode
+import hashlib, json, os, re, secrets
+
+log = get_logger("lessons")
 
 # local recursive patcher: patch all nodes with given id (not just first one)
 def _patch_all_by_id(node, target_id, patch):
@@ -89,72 +98,100 @@ def _find_first_by_id(node, target_id):
                 return found
     return None
 
-def _merge_card_variables(card_root: dict, values: dict):
+def _merge_card_variables(card_root: dict, values: dict) -> dict:
     """Merge/update DivKit card-level variables.
     DivKit expects variables on the **card** node, not at the top level.
+    Returns a new tree (copy-on-write: the template may be shared and frozen).
     """
     # find the actual card node
-    card_node = card_root.get("card") if isinstance(card_root, dict) and "card" in card_root else card_root
+    in_card = isinstance(card_root, dict) and "card" in card_root
+    card_node = card_root.get("card") if in_card else card_root
     if not isinstance(card_node, dict):
-        return
+        return card_root
 
-    vars_list = card_node.setdefault("variables", [])
-    # turn list to dict for easy update
-    by_name = {v.get("name"): v for v in vars_list if isinstance(v, dict) and v.get("name")}
+    vars_list = list(card_node.get("variables") or [])
+    # turn list to index for easy update
+    by_name = {v.get("name"): i for i, v in enumerate(vars_list) if isinstance(v, dict) and v.get("name")}
     for name, val in values.items():
-        entry = by_name.get(name)
         vtype = "number" if isinstance(val, (int, float)) else "string"
-        if entry is not None:
-            entry["type"] = vtype
-            entry["value"] = val
+        i = by_name.get(name)
+        if i is not None:
+            vars_list[i] = {**vars_list[i], "type": vtype, "value": val}
         else:
             vars_list.append({"name": name, "type": vtype, "value": val})
+    return patch_path(card_root, ("card",) if in_card else (), {"variables": vars_list})
+
+def _progress_bar_node(done: int, total: int) -> dict:
+    """Weighted two-segment bar that replaces the node with id=progress_bar."""
+    # clamp values
+    total = max(int(total or 0), 1)
+    done = max(min(int(done or 0), total), 0)
+    rest = max(total - done, 0)
+    return {
+        "type": "container",
+        "id": "progress_bar",
+        "orientation": "horizontal",
+        "width": {"type": "match_parent"},
+        "height": {"type": "fixed", "value": 8},
+        "weight": 1,  # let header allocate the remaining space
+        "clip_to_bounds": True,
+        "border": {"corner_radius": 4},
+        "background": [{"type": "solid", "color": "#E5E7EB"}],
+        "items": [
+            {
+                "type": "container",
+                "id": "progress_done",
+                "height": {"type": "match_parent"},
+                "weight": done,
+                "background": [{"type": "solid", "color": "#46B100"}],
+            },
+            {
+                "type": "container",
+                "id": "progress_rest",
+                "height": {"type": "match_parent"},
+                "weight": rest
+            }
+        ]
+    }
 
 def _hard_set_progress_bar(card_root: dict, done: int, total: int) -> None:
     """Hard-replace the node with id=progress_bar by a weighted two-segment bar.
     Works in DivKit/SDUI because weights are applied inside a horizontal container.
     """
     try:
-        # clamp values
-        total = max(int(total or 0), 1)
-        done = max(min(int(done or 0), total), 0)
-        rest = max(total - done, 0)
-
-        progress_node = {
-            "type": "container",
-            "id": "progress_bar",
-            "orientation": "horizontal",
-            "width": {"type": "match_parent"},
-            "height": {"type": "fixed", "value": 8},
-            "weight": 1,  # let header allocate the remaining space
-            "clip_to_bounds": True,
-            "border": {"corner_radius": 4},
-            "background": [{"type": "solid", "color": "#E5E7EB"}],
-            "items": [
-                {
-                    "type": "container",
-                    "id": "progress_done",
-                    "height": {"type": "match_parent"},
-                    "weight": done,
-                    "background": [{"type": "solid", "color": "#46B100"}],
-                },
-                {
-                    "type": "container",
-                    "id": "progress_rest",
-                    "height": {"type": "match_parent"},
-                    "weight": rest
-                }
-            ]
-        }
+        progress_node = _progress_bar_node(done, total)
 
         # fully replace the node to avoid mixing with any previous structure
         if not _replace_node_by_id(card_root, "progress_bar", progress_node):
             patch_by_id(card_root, "progress_bar", progress_node)
     except Exception as e:
-        print("hard progress build failed:", e)
+        log.warning("hard progress build failed: %s", e)
 
 bp = Blueprint("lessons", __name__)
 
+# параллельные одинаковые запросы шага/бандла собирают тело один раз
+_render_flight = SingleFlight("lesson-render")
+
+def _shared_body(key: tuple, build, share: bool = True):
+    """(kind, body) из общего кэша воркеров (core/shared_cache.py) или build().
+    Публикуется только удачная сборка ("step"): фолбэки при ошибке Strapi не
+    разносим по воркерам. Живёт столько же, сколько данные Strapi (STRAPI_CACHE_TTL).
+    share=False — собрать сразу: тела под сид сессии (?s=) нужны одному пользователю,
+    в общем кэше они были бы строкой на сессию.
+    """
+    ttl = cache_ttl()
+    if not ttl or not share:
+        return build()
+    built = []
+
+    def _build():
+        kind, body = build()
+        built.append((kind, body))
+        return body if kind == "step" else None
+
+    body = shared_cache.get_or_fill("lesson", repr(key), _build, ttl=ttl)
+    return built[0] if built else ("step", body)
+
 def _make_progress_node(total: int, done: int) -> dict:
     """Build a progress bar node (try to use /ui/components/progress_bar.json if present).
     We patch weights for "progress_done" and "progress_rest" and wrap with paddings.
@@ -228,94 +265,314 @@ def view_lesson(lesson_id: int):  # noqa: ARG001
 def view_lesson_slug(slug: str):  # noqa: ARG001
     return send_from_directory(WEB_DIR, "index.html")
 
-# lesson by id
-@bp.get("/lesson/<int:lesson_id>")
-def get_lesson(lesson_id: int):
-    step = request.args.get("i", default=0, type=int)
+LESSON_TEMPLATE = UI_DIR / "pages" / "lesson.json"
+MAX_WORDS = LESSON_MAX_WORDS  # cap to 10 words per lesson
+PLACEHOLDER_IMAGE = "/img/placeholder.svg"
 
-    template = UI_DIR / "pages" / "lesson.json"
-    try:
-        with open(template, "r", encoding="utf-8") as f:
-            card = json.load(f)
-        card = resolve_includes(card)
-        card = apply_design_tokens(card, load_tokens("light"))
-    except Exception as e:
-        print("Template load error:", e)
-        with open(UI_DIR / "pages" / "home.json", "r", encoding="utf-8") as f:
-            home = json.load(f)
-        return jsonify(resolve_includes(home))
+def _home_fallback():
+    return jsonify(template(UI_DIR / "pages" / "home.json"))
 
+def _fetch_words(fetch, label: str, lesson_key: str, remember: bool = True) -> tuple:
+    """(слова урока, устаревшие ли). При сбое Strapi или исчерпанном бюджете запроса —
+    последние удачные слова этого урока из last-known-good (core/lkg.py), иначе [].
+    remember=False — не класть в last-known-good (сессии /review: ключ на каждый сид)."""
     try:
-        raw = fetch_lesson(lesson_id)
+        raw = fetch()
         simplified = to_divkit_lesson(raw)
-        words = (simplified.get("words", []) or [])[:10]  # cap to 10 words per lesson
+        words = (simplified.get("words", []) or [])[:MAX_WORDS]
+    except LessonNotFound as e:
+        # урока нет — это не сбой upstream, старую копию не отдаём
+        log.warning("strapi fetch failed: %s", e, extra={"via": label.strip(" ()") or "id"})
+        return [], False
     except Exception as e:
-        print("Strapi fetch failed:", e)
-        words = []
-
-    if not words:
-        return jsonify(card)
-
-    if step < 0: step = 0
-    if step >= len(words):
-        with open(UI_DIR / "pages" / "home.json", "r", encoding="utf-8") as f:
-            home = json.load(f)
-        return jsonify(resolve_includes(home))
-
+        found = lkg.recall("lesson", lesson_key)
+        log.warning("strapi fetch failed: %s", e, extra={"via": label.strip(" ()") or "id", "stale": found is not None})
+        return (found[0], True) if found is not None else ([], False)
+    if words and remember:
+        lkg.remember("lesson", lesson_key, words)
+    return words, False
+
+def _mark_stale(resp, lesson_key: str):
+    found = lkg.recall("lesson", lesson_key)
+    return lkg.mark_stale(resp, found[1] if found is not None else 0.0)
+
+def _session_seed() -> str:
+    """Необязательный сид сессии из ?s= (буквы/цифры/-/_ , до 32 символов)."""
+    raw = (request.args.get("s") or "").strip()[:32]
+    return raw if re.fullmatch(r"[A-Za-z0-9_-]*", raw) else ""
+
+def _with_seed(url: str, seed: str) -> str:
+    return f"{url}&s={seed}" if seed else url
+
+def _correct_on_left(lesson_key: str, step: int, seed: str = "") -> bool:
+    """Детерминированная «монетка»: одна и та же для одного URL, разная между
+    уроками, шагами и сидами сессий. Так ответы шагов кэшируются (ETag, префетч)."""
+    digest = hashlib.blake2b(f"{lesson_key}|{step}|{seed}".encode("utf-8"), digest_size=1).digest()
+    return not (digest[0] & 1)
+
+def _step_data(words: list, step: int, next_url: str, correct_left: bool) -> dict:
+    """Всё, что зависит от шага: тексты, картинка, действия и прогресс."""
     w = words[step] or {}
-    term      = (w.get("term") or "").strip()
     image_url = (w.get("image_url") or "").strip()
     if image_url.startswith("/"):
         base = os.getenv("STRAPI_URL", "http://localhost:1337").rstrip("/")
         image_url = f"{base}{image_url}"
+    # картинки идут через локальный прокси (/img/<key>): ресайз + долгий кэш, Strapi не в hot path
+    image_url = proxy_url(image_url)
     correct = (w.get("translation") or "").strip()
     wrong   = (w.get("distractor1") or "").strip()
 
-    is_last  = (step + 1 >= len(words))
-    next_url = "/view/home" if is_last else f"/view/lesson/{lesson_id}?i={step + 1}"
-
-    if random.random() < 0.5:
+    if correct_left:
         left_text, right_text = correct, wrong
         left_url,  right_url  = next_url, None
     else:
         left_text, right_text = wrong, correct
         left_url,  right_url  = None, next_url
 
-    patch_by_id(card, "word_term",  {"text": term})
-    patch_by_id(card, "word_image", {
-        "image_url": image_url or "https://dummyimage.com/600x600/eeeeee/aaaaaa.png?text=img",
-        # тянем картинку на всю доступную ширину/высоту секции со словами
-        "width":  {"type": "match_parent"},
-        "height": {"type": "match_parent"},
-        # вписываем изображение целиком без обрезания
-        "content_mode": "scale_to_fit",
-    })
-    patch_by_id(card, "choice_left_text",  {"text": left_text})
-    patch_by_id(card, "choice_right_text", {"text": right_text})
+    total = min(len(words), MAX_WORDS) or 1
+    done = min(step + 1, total)
+    return {
+        "term": (w.get("term") or "").strip(),
+        "image_url": image_url,
+        "left_text": left_text, "left_url": left_url,
+        "right_text": right_text, "right_url": right_url,
+        "total": total, "done": done,
+    }
 
-    patch_by_id(card, "choice_left",  {"action": {"log_id": "next_word", "url": left_url} if left_url else None})
-    patch_by_id(card, "choice_right", {"action": {"log_id": "next_word", "url": right_url} if right_url else None})
+def _step_variables(data: dict) -> dict:
+    return {
+        "total": data["total"],
+        "correct": data["done"],
+        "done": data["done"],
+        "rest": max(data["total"] - data["done"], 0),
+    }
 
-    # --- progress bar (deterministic) ---
+# Якоря, которые меняются от шага к шагу (PRD §17). Всё остальное в карточке
+# урока одинаково для всех шагов, поэтому дельта между шагами — это только
+# патчи этих узлов по id (те же, что применяются к полной карточке).
+def _step_patches(data: dict) -> list:
+    """[(anchor_id, updates)] для шага; None в updates означает «удалить ключ»."""
+    left_url, right_url = data["left_url"], data["right_url"]
+    return [
+        ("word_term", {"text": data["term"]}),
+        ("word_image", {
+            "image_url": data["image_url"] or PLACEHOLDER_IMAGE,
+            # тянем картинку на всю доступную ширину/высоту секции со словами
+            "width":  {"type": "match_parent"},
+            "height": {"type": "match_parent"},
+            # вписываем изображение целиком без обрезания
+            "content_mode": "scale_to_fit",
+        }),
+        ("choice_left_text",  {"text": data["left_text"]}),
+        ("choice_right_text", {"text": data["right_text"]}),
+        ("choice_left",  {"action": {"log_id": "next_word", "url": left_url} if left_url else None}),
+        ("choice_right", {"action": {"log_id": "next_word", "url": right_url} if right_url else None}),
+    ]
+
+def _step_delta(data: dict) -> dict:
+    """Патчи шага поверх уже отрисованной карточки урока (прогресс-бар там уже «жёсткий»)."""
+    ops = dict(_step_patches(data))
+    ops["progress_done"] = {"weight": data["done"]}
+    ops["progress_rest"] = {"weight": max(data["total"] - data["done"], 0)}
+    return ops
+
+def _apply_step(card: dict, data: dict) -> None:
+    """Патчи шага обходом на каждый якорь — прежний путь; эталон для tools/bench_render.py."""
+    for anchor_id, updates in _step_patches(data):
+        patch_by_id(card, anchor_id, updates)
+    # Always build a concrete weighted bar to avoid component/ids mismatches
+    _hard_set_progress_bar(card, data["done"], data["total"])
+
+def _step_anchors(data: dict) -> dict:
+    """Те же правки, что _apply_step, спекой якорей для render-движка (один обход вместо семи)."""
+    anchors = {anchor_id: {"set": updates} for anchor_id, updates in _step_patches(data)}
+    anchors["progress_bar"] = {"replace": _progress_bar_node(data["done"], data["total"])}
+    return anchors
+
+def _step_card(data: dict) -> dict:
+    """Полная карточка урока для шага: общий шаблон + якоря шага (копируются только пути к ним)."""
+    return render_template(LESSON_TEMPLATE, theme="light", anchors=_step_anchors(data))
+
+def _cacheable(resp):
+    """Ответ шага стабилен для URL: отдаём ETag и 304 на If-None-Match.
+    LESSON_CACHE_MAX_AGE > 0 разрешает кэшировать без ревалидации."""
     try:
-        total = min(len(words), 10) or 1
-        done = min(step + 1, total)
-        rest = max(total - done, 0)
+        max_age = int(os.getenv("LESSON_CACHE_MAX_AGE", "0") or 0)
+    except ValueError:
+        max_age = 0
+    resp.headers["Cache-Control"] = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+def _json_bytes(obj) -> bytes:
+    return current_app.json.response(obj).get_data()
+
+def _build_step(fetch, step: int, next_url_for, *, lesson_key: str, seed: str, version: str,
+                as_delta: bool, label: str, log_key: str, remember: bool = True):
+    """Тело ответа шага: ("step" | "stale" | "template" | "home", bytes | None).
+    "stale" — собрано из last-known-good: в общий кэш не публикуется."""
+    words, stale = _fetch_words(fetch, label, lesson_key, remember)
+    if not words:
+        return "template", _json_bytes(template(LESSON_TEMPLATE, theme="light"))
+
+    if step < 0: step = 0
+    if step >= len(words):
+        return "home", None
+
+    is_last  = (step + 1 >= len(words))
+    next_url = "/view/home" if is_last else _with_seed(next_url_for(step + 1), seed)
+    data = _step_data(words, step, next_url, _correct_on_left(lesson_key, step, seed))
+
+    if as_delta:
+        body = _json_bytes({"delta": {
+            "version": version,
+            "set": _step_delta(data),
+            "variables": _step_variables(data),
+        }})
+    else:
+        card = _step_card(data)
+        # --- progress bar (deterministic) ---
+        try:
+            card = _merge_card_variables(card, _step_variables(data))
+        except Exception as e:
+            log.warning("progress patch failed: %s", e, extra={"via": label.strip(" ()") or "id"})
+        body = _json_bytes(card)
+
+    log.debug("step built", extra={"lesson": log_key, "step": step, "done": data["done"], "total": data["total"]})
+    return ("stale" if stale else "step"), body
+
+def _lesson_step_response(fetch, step: int, next_url_for, *, lesson_key: str, label: str = "", log_key: str = "",
+                          seed: Optional[str] = None, remember: bool = True, share: Optional[bool] = None):
+    """Общий обработчик шага урока (по id и по slug).
+
+    Клиент может прислать заголовок `X-Card-Base: <версия шаблона>` — версию
+    карточки урока, которая у него уже отрисована. Если она совпадает с текущей,
+    отвечаем дельтой {"delta": {"version", "set": {anchor_id: {key: value|null}}, "variables"}}
+    вместо целой карточки; клиент патчит узлы по id и вызывает setData.
+
+    Одинаковые параллельные запросы собирают тело один раз (single-flight).
+    seed — сид сессии, если его выбрал вызывающий (иначе из ?s=); share — класть ли тело
+    в общий кэш воркеров (по умолчанию — только без сида).
+    """
+    try:
+        version = template_version(LESSON_TEMPLATE, theme="light")
+    except Exception as e:
+        log.error("template load failed: %s", e, extra={"via": label.strip(" ()") or "id"})
+        return _home_fallback()
+
+    seed = _session_seed() if seed is None else seed
+    as_delta = request.headers.get("X-Card-Base") == version
+    key = ("step", lesson_key, step, seed, version, as_delta)
+    kind, body = _render_flight.do(key, lambda: _shared_body(
+        key,
+        lambda: _build_step(fetch, step, next_url_for, lesson_key=lesson_key, seed=seed,
+                            version=version, as_delta=as_delta, label=label, log_key=log_key,
+                            remember=remember),
+        share=(not seed) if share is None else share,
+    ))
+    if kind == "home":
+        return _home_fallback()
+
+    resp = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    if kind not in ("step", "stale"):
+        return resp
+    resp.headers["X-Card-Version"] = version
+    resp.headers["Vary"] = "X-Card-Base"
+    return _mark_stale(resp, lesson_key) if kind == "stale" else _cacheable(resp)
+
+def _compact_step(data: dict) -> dict:
+    """Шаг урока для бандла: только данные, из которых клиент сам соберёт патчи."""
+    return {
+        "term": data["term"],
+        "image": data["image_url"] or PLACEHOLDER_IMAGE,
+        "choices": [[data["left_text"], data["left_url"]], [data["right_text"], data["right_url"]]],
+        "progress": [data["done"], data["total"]],
+    }
+
+def _build_bundle(fetch, next_url_for, *, lesson_key: str, seed: str, version: str, label: str):
+    """Тело бандла: ("step" | "stale", bytes) или ("empty", bytes), если слов нет (Strapi недоступен)."""
+    words, stale = _fetch_words(fetch, label, lesson_key)
+    steps = []
+    for i in range(len(words)):
+        next_url = "/view/home" if i + 1 >= len(words) else _with_seed(next_url_for(i + 1), seed)
+        steps.append(_step_data(words, i, next_url, _correct_on_left(lesson_key, i, seed)))
 
-        _merge_card_variables(card, {
-            "total": total,
-            "correct": done,
-            "done": done,
-            "rest": rest,
-        })
+    if steps:
+        card = _merge_card_variables(_step_card(steps[0]), _step_variables(steps[0]))
+    else:
+        card = template(LESSON_TEMPLATE, theme="light")
 
-        # Always build a concrete weighted bar to avoid component/ids mismatches
-        _hard_set_progress_bar(card, done, total)
-        print(f"[progress] lesson_id={lesson_id} step={step} done={done}/{total}")
+    return ("empty" if not steps else "stale" if stale else "step"), _json_bytes({
+        "version": version,
+        "card": card,
+        "steps": [_compact_step(d) for d in steps],
+    })
+
+def _lesson_bundle_response(fetch, next_url_for, *, lesson_key: str, label: str = ""):
+    """Весь урок одним ответом: {"version", "card": карточка шага 0, "steps": [...]}.
+
+    Один запрос в Strapi и одна сборка карточки; шаги 1..N-1 клиент собирает
+    локально, применяя данные шага к `card` по тем же якорям, что и дельта.
+    """
+    try:
+        version = template_version(LESSON_TEMPLATE, theme="light")
     except Exception as e:
-        print("Progress patch failed:", e)
+        log.error("template load failed: %s", e, extra={"via": label.strip(" ()") or "id"})
+        return jsonify({"version": None, "card": None, "steps": []})
+
+    seed = _session_seed()
+    key = ("bundle", lesson_key, seed, version)
+    kind, body = _render_flight.do(key, lambda: _shared_body(
+        key,
+        lambda: _build_bundle(fetch, next_url_for, lesson_key=lesson_key, seed=seed,
+                              version=version, label=label),
+        share=not seed,
+    ))
+    resp = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    resp.headers["X-Card-Version"] = version
+    return _mark_stale(resp, lesson_key) if kind == "stale" else _cacheable(resp)
+
+def lesson_step_by_id(lesson_id: int, fetch=None):
+    """Шаг урока по id в контексте текущего запроса; fetch — готовые данные (async-режим)."""
+    step = request.args.get("i", default=0, type=int)
+    return _lesson_step_response(
+        fetch or (lambda: catalog_index.lesson_by_id(lesson_id)),
+        step,
+        lambda i: f"/view/lesson/{lesson_id}?i={i}",
+        lesson_key=f"id:{lesson_id}",
+        log_key=f"lesson_id={lesson_id}",
+    )
+
+def lesson_step_by_slug(slug: str, fetch=None):
+    step = request.args.get("i", default=0, type=int)
+    return _lesson_step_response(
+        fetch or (lambda: catalog_index.lesson_by_slug(slug)),
+        step,
+        lambda i: f"/view/lesson/slug/{slug}?i={i}",
+        lesson_key=f"slug:{slug}",
+        label=" (slug)",
+        log_key=f"slug={slug}",
+    )
+
+def lesson_bundle_by_id(lesson_id: int, fetch=None):
+    return _lesson_bundle_response(
+        fetch or (lambda: catalog_index.lesson_by_id(lesson_id)),
+        lambda i: f"/view/lesson/{lesson_id}?i={i}",
+        lesson_key=f"id:{lesson_id}",
+    )
+
+def lesson_bundle_by_slug(slug: str, fetch=None):
+    return _lesson_bundle_response(
+        fetch or (lambda: catalog_index.lesson_by_slug(slug)),
+        lambda i: f"/view/lesson/slug/{slug}?i={i}",
+        lesson_key=f"slug:{slug}",
+        label=" (slug)",
+    )
 
-    return jsonify(card)
+# lesson by id
+@bp.get("/lesson/<int:lesson_id>")
+def get_lesson(lesson_id: int):
+    return lesson_step_by_id(lesson_id)
 
 # compatibility JSON endpoint to support /lesson/slug/<slug>
 @bp.get("/lesson/slug/<string:slug>")
@@ -326,84 +583,53 @@ def get_lesson_by_slug_compat(slug: str):
 # lesson by slug
 @bp.get("/lesson/by/<string:slug>")
 def get_lesson_by_slug_route(slug: str):
-    step = request.args.get("i", default=0, type=int)
-
-    template = UI_DIR / "pages" / "lesson.json"
-    try:
-        with open(template, "r", encoding="utf-8") as f:
-            card = json.load(f)
-        card = resolve_includes(card)
-        card = apply_design_tokens(card, load_tokens("light"))
-    except Exception as e:
-        print("Template load error (slug):", e)
-        with open(UI_DIR / "pages" / "home.json", "r", encoding="utf-8") as f:
-            home = json.load(f)
-        return jsonify(resolve_includes(home))
-
-    try:
-        raw = get_lesson_by_slug(slug)
-        simplified = to_divkit_lesson(raw)
-        words = (simplified.get("words", []) or [])[:10]  # cap to 10 words per lesson
-    except Exception as e:
-        print("Strapi fetch failed (slug):", e)
-        words = []
-
-    if not words:
-        return jsonify(card)
-
-    if step < 0: step = 0
-    if step >= len(words):
-        with open(UI_DIR / "pages" / "home.json", "r", encoding="utf-8") as f:
-            home = json.load(f)
-        return jsonify(resolve_includes(home))
-
-    w = words[step] or {}
-    term      = (w.get("term") or "").strip()
-    image_url = (w.get("image_url") or "").strip()
-    if image_url.startswith("/"):
-        base = os.getenv("STRAPI_URL", "http://localhost:1337").rstrip("/")
-        image_url = f"{base}{image_url}"
-    correct = (w.get("translation") or "").strip()
-    wrong   = (w.get("distractor1") or "").strip()
-
-    is_last  = (step + 1 >= len(words))
-    next_url = "/view/home" if is_last else f"/view/lesson/slug/{slug}?i={step + 1}"
+    return lesson_step_by_slug(slug)
 
-    if random.random() < 0.5:
-        left_text, right_text = correct, wrong
-        left_url,  right_url  = next_url, None
-    else:
-        left_text, right_text = wrong, correct
-        left_url,  right_url  = None, next_url
+# whole-lesson bundles (offline step navigation in client.js)
+@bp.get("/lesson/<int:lesson_id>/bundle")
+def get_lesson_bundle(lesson_id: int):
+    return lesson_bundle_by_id(lesson_id)
 
-    patch_by_id(card, "word_term",  {"text": term})
-    patch_by_id(card, "word_image", {
-        "image_url": image_url or "https://dummyimage.com/600x600/eeeeee/aaaaaa.png?text=img",
-        "width":  {"type": "match_parent"},
-        "height": {"type": "match_parent"},
-        "content_mode": "scale_to_fit",
-    })
-    patch_by_id(card, "choice_left_text",  {"text": left_text})
-    patch_by_id(card, "choice_right_text", {"text": right_text})
-    patch_by_id(card, "choice_left",  {"action": {"log_id": "next_word", "url": left_url} if left_url else None})
-    patch_by_id(card, "choice_right", {"action": {"log_id": "next_word", "url": right_url} if right_url else None})
+@bp.get("/lesson/by/<string:slug>/bundle")
+@bp.get("/lesson/slug/<string:slug>/bundle")
+def get_lesson_bundle_by_slug(slug: str):
+    return lesson_bundle_by_slug(slug)
 
-    # --- progress bar (deterministic) ---
-    try:
-        total = min(len(words), 10) or 1
-        done = min(step + 1, total)
-        rest = max(total - done, 0)
+# ---- review: слова из разных уроков (core/word_store.py) ----
 
-        _merge_card_variables(card, {
-            "total": total,
-            "correct": done,
-            "done": done,
-            "rest": rest,
-        })
+@bp.get("/view/review")
+def view_review():
+    return send_from_directory(WEB_DIR, "index.html")
 
-        _hard_set_progress_bar(card, done, total)
-        print(f"[progress] slug={slug} step={step} done={done}/{total}")
-    except Exception as e:
-        print("Progress patch failed (slug):", e)
+@bp.get("/review")
+def get_review():
+    """Шаг сессии повторения: ?level=&n=&s=&i= — та же карточка урока (pages/lesson.json).
 
-    return jsonify(card)
\ No newline at end of file
+    Слова берутся из хранилища в памяти (без Strapi), выборка детерминирована
+    сидом `s`: шаги кэшируются (ETag) и работают дельтой, как шаги урока.
+    Без `s` сид выдаётся здесь и дальше идёт в ссылках «дальше»; такой шаг 0 не кэшируется.
+    """
+    level = (request.args.get("level") or "").strip()[:32]
+    n = min(max(request.args.get("n", default=MAX_WORDS, type=int) or MAX_WORDS, 1), MAX_WORDS)
+    step = request.args.get("i", default=0, type=int)
+    seed = _session_seed()
+    fresh = not seed
+    if fresh:
+        seed = secrets.token_urlsafe(6)
+
+    base = urlencode({k: v for k, v in (("level", level), ("n", n)) if v})
+    resp = _lesson_step_response(
+        lambda: word_store.session_lesson(seed, level=level, n=n),
+        step,
+        lambda i: f"/view/review?{base}&i={i}",
+        lesson_key=f"review:{level.casefold()}:{n}:{seed}",
+        label=" (review)",
+        log_key=f"review level={level or '*'}",
+        seed=seed,
+        remember=False,
+        share=False,   # сессия повторения — одного пользователя; свежий сид вообще не повторится
+    )
+    if fresh:
+        resp.headers["Cache-Control"] = "no-store"
+        resp.headers.pop("ETag", None)
+    return resp
@@ -1,10 +1,16 @@
 from __future__ import annotations
 from flask import Blueprint, request
 
+from core import progress, telemetry
+from core.logs import get_logger
+
 bp = Blueprint("log", __name__)
+log = get_logger("divkit")
 
 @bp.post("/log")
 def log_action_post():
     data = request.get_json(silent=True) or {}
-    print(">> DivKit action (POST):", data)
-    return {"ok": True}
\ No newline at end of file
+    log.info("divkit action", extra={"action": data})
+    # счётчики воронки уроков (core/telemetry.py); сырые события дальше лога не хранятся
+    telemetry.ingest(data, progress.request_user_id(request))
+    return {"ok": True}
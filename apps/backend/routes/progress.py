@@ -0,0 +1,63 @@
+# apps/backend/routes/progress.py
+from __future__ import annotations
+from flask import Blueprint, jsonify, request
+
+from core import catalog_index, progress
+from core.catalog import Lesson
+from core.logs import get_logger
+from core.ui import lesson_card_state
+
+bp = Blueprint("progress", __name__)
+log = get_logger("progress")
+
+# год: прогресс живёт дольше сессии вкладки
+_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+
+@bp.post("/progress")
+def post_progress():
+    """Отметить урок пользователя: {"lesson_id" | "slug", "state": "done" | "locked" | "0".."2"}.
+    Без cookie/заголовка пользователя — выдаём новый id в cookie `worb_uid`
+    (и подписанный id в поле "user", если задан PROGRESS_SECRET).
+    """
+    data = request.get_json(silent=True) or {}
+    lesson_id = data.get("lesson_id")
+    if lesson_id is None and data.get("slug"):
+        try:
+            lesson = catalog_index.lesson_by_slug(str(data["slug"]))
+        except Exception as e:   # индекса нет, Strapi недоступен / не успел в бюджет
+            log.warning("slug lookup failed", extra={"slug": data["slug"], "error": str(e)})
+            return jsonify({"ok": False, "error": "lesson lookup failed"}), 502
+        # из индекса — Lesson, без индекса — сырой entry Strapi
+        lesson_id = lesson.id if isinstance(lesson, Lesson) else (lesson or {}).get("id")
+        if lesson_id is None:
+            return jsonify({"ok": False, "error": f"unknown slug {data['slug']!r}"}), 404
+    try:
+        lesson_id = int(lesson_id)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "lesson_id or slug required"}), 400
+
+    state = lesson_card_state(data.get("state", "done"))
+    if state not in ("0", "1", "2"):
+        return jsonify({"ok": False, "error": f"unknown state {data.get('state')!r}"}), 400
+
+    uid = progress.request_user_id(request)
+    is_new = uid is None
+    if is_new:
+        uid = progress.new_user_id()
+    progress.record(uid, lesson_id, state)
+
+    body = {"ok": True, "lesson_id": lesson_id, "state": state}
+    token = progress.sign_user_id(uid) if is_new else None
+    if token:
+        body["user"] = token   # для не-браузерных клиентов: значение заголовка X-User-Id
+    resp = jsonify(body)
+    if is_new:
+        resp.set_cookie(progress.USER_COOKIE, uid, max_age=_COOKIE_MAX_AGE, httponly=True, samesite="Lax")
+    return resp
+
+@bp.get("/progress")
+def get_progress():
+    uid = progress.request_user_id(request)
+    states = progress.states(uid) if uid else {}
+    return jsonify({"user": uid, "lessons": {str(k): v for k, v in sorted(states.items())}})
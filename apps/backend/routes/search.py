@@ -0,0 +1,142 @@
+# apps/backend/routes/search.py
+"""Поиск слова по всем урокам (индекс в памяти, core/search_index.py).
+
+  GET /search?q=&level=&limit=       — DivKit-страница (pages/search.json) с результатами;
+  GET /search/hits?q=&level=&limit=  — те же результаты JSON-ом (для подсказок при вводе).
+Клик по результату открывает урок сразу на шаге с этим словом.
+"""
+from __future__ import annotations
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import Blueprint, jsonify, request
+
+from core import search_index
+from core.logs import get_logger
+from core.paths import UI_DIR
+from core.ui import known_theme, lesson_deeplink, patch_path, render_template
+
+bp = Blueprint("search", __name__)
+log = get_logger("search")
+
+SEARCH_TEMPLATE = UI_DIR / "pages" / "search.json"
+MAX_LIMIT = 50
+
+
+def _params():
+    q = (request.args.get("q") or "").strip()[:100]
+    level = (request.args.get("level") or "").strip() or None
+    limit = min(max(request.args.get("limit", default=20, type=int) or 20, 1), MAX_LIMIT)
+    return q, level, limit
+
+def _run(q: str, level: Optional[str], limit: int):
+    """(hits | None, мс на поиск). None — индекса нет (каталог не загружен или выключен)."""
+    t0 = time.perf_counter()
+    hits = search_index.search(q, limit=limit, level=level) if q else []
+    return hits, round((time.perf_counter() - t0) * 1000, 3)
+
+def _hit_url(hit: search_index.Hit) -> str:
+    return lesson_deeplink(hit.doc.index, slug=hit.slug or None, lesson_id=hit.doc.lesson_id)
+
+
+@bp.get("/search/hits")
+def search_hits():
+    q, level, limit = _params()
+    hits, took = _run(q, level, limit)
+    if hits is None:
+        return jsonify({"q": q, "error": "search index unavailable", "hits": []}), 503
+    return jsonify({
+        "q": q,
+        "took_ms": took,
+        "hits": [{
+            "lesson_id": h.doc.lesson_id,
+            "lesson_title": h.title,
+            "lesson_slug": h.slug,
+            "step": h.doc.index,
+            "term": h.doc.term,
+            "translation": h.doc.translation,
+            "level": h.doc.level,
+            "score": h.score,
+            "url": _hit_url(h),
+        } for h in hits],
+    })
+
+
+# ---- DivKit ---------------------------------------------------------------------------
+
+def _message(text: str) -> Dict[str, Any]:
+    return {
+        "type": "text",
+        "text": text,
+        "text_color": "#9e9e9e",
+        "text_alignment_horizontal": "center",
+        "paddings": {"top": 16, "bottom": 16},
+    }
+
+def _hit_row(hit: search_index.Hit) -> Dict[str, Any]:
+    url = _hit_url(hit)
+    lines: List[Dict[str, Any]] = [
+        {"type": "text", "text": hit.doc.term, "font_size": 18, "font_weight": "medium"},
+        {"type": "text", "text": hit.doc.translation, "font_size": 15, "text_color": "#616161"},
+        {"type": "text", "text": f"{hit.title} · шаг {hit.doc.index + 1}", "font_size": 13, "text_color": "#9e9e9e"},
+    ]
+    items: List[Dict[str, Any]] = [{
+        "type": "container",
+        "orientation": "vertical",
+        "width": {"type": "match_parent"},
+        "items": lines,
+    }]
+    if hit.doc.level:
+        items.append({
+            "type": "text",
+            "text": hit.doc.level,
+            "font_size": 13,
+            "width": {"type": "wrap_content"},
+            "alignment_vertical": "center",
+            "paddings": {"top": 4, "right": 8, "bottom": 4, "left": 8},
+            "background": [{"type": "solid", "color": "#e0e0e0"}],
+            "border": {"corner_radius": 8},
+        })
+    return {
+        "type": "container",
+        "orientation": "horizontal",
+        "width": {"type": "match_parent"},
+        "paddings": {"top": 12, "right": 12, "bottom": 12, "left": 12},
+        "margins": {"top": 4, "bottom": 4},
+        "background": [{"type": "solid", "color": "#f5f5f5"}],
+        "border": {"corner_radius": 12},
+        # без id/slug в payload client.js не переписывает url на шаг 0 — урок откроется на этом слове
+        "action": {"log_id": "open_lesson", "url": url, "payload": {"path": url, "source": "search"}},
+        "items": items,
+    }
+
+def _results_node(q: str, hits) -> Dict[str, Any]:
+    if not q:
+        items = [_message("Введите слово или перевод")]
+    elif hits is None:
+        items = [_message("Поиск временно недоступен")]
+    elif not hits:
+        items = [_message(f"Ничего не найдено по запросу «{q}»")]
+    else:
+        items = [_hit_row(h) for h in hits]
+    return {
+        "type": "container",
+        "id": "search_results",
+        "orientation": "vertical",
+        "width": {"type": "match_parent"},
+        "margins": {"top": 12},
+        "items": items,
+    }
+
+
+@bp.get("/search")
+def search_page():
+    q, level, limit = _params()
+    hits, took = _run(q, level, limit)
+    theme = known_theme(request.args.get("theme"))
+    card = render_template(SEARCH_TEMPLATE, theme=theme,
+                           anchors={"search_results": {"replace": _results_node(q, hits)}})
+    # введённый запрос остаётся в поле ввода
+    card = patch_path(card, ("card",), {"variables": [{"name": "search_query", "type": "string", "value": q}]})
+    log.debug("search", extra={"q": q, "hits": len(hits or ()), "took_ms": took})
+    return jsonify(card)
@@ -1,14 +1,22 @@
 from __future__ import annotations
-from flask import Blueprint, send_from_directory, jsonify
+from flask import Blueprint, send_from_directory, jsonify, current_app
 from core.paths import WEB_DIR, UI_DIR
 from pathlib import Path
-import json
 
-from core.ui import resolve_includes, apply_design_tokens, load_tokens
+from core.ui import cached_render, template
 
 
 bp = Blueprint("spa", __name__)
 
+
+def _page_response(path: Path):
+    """Статическая страница: тело ответа кэшируется до правки любого её include."""
+    body = cached_render(
+        ("page", str(path)),
+        lambda: current_app.json.response(template(path, theme="light")).get_data(),
+    )
+    return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
 # Serve SPA index.html at root
 @bp.get("/")
 def root_index():
@@ -63,11 +71,7 @@ def get_ui_page(page_name: str):
             }
         })
 
-    with open(raw_path, "r", encoding="utf-8") as f:
-        card = json.load(f)
-    card = resolve_includes(card)
-    card = apply_design_tokens(card, load_tokens("light"))
-    return jsonify(card)
+    return _page_response(raw_path)
 
 # SPA deep links
 @bp.get("/view")
@@ -86,11 +90,7 @@ def ui_pages_compat(page_name: str):
 def test_page():
     raw = (UI_DIR / "pages" / "test.json")
     try:
-        with open(raw, "r", encoding="utf-8") as f:
-            card = json.load(f)
-        card = resolve_includes(card)
-        card = apply_design_tokens(card, load_tokens("light"))
-        return jsonify(card)
+        return _page_response(raw)
     except Exception:
         return jsonify({
             "card": {
@@ -0,0 +1,120 @@
+# apps/backend/strapi_async.py
+"""Asyncio-клиент Strapi для ASGI-режима (см. asgi.py).
+
+Зеркалит get_lesson / get_lesson_by_slug / get_categories из strapi_client:
+те же query-параметры, та же форма ответа, тот же single-flight (одинаковые
+параллельные запросы ждут один общий Task). Нормализация (to_divkit_lesson и
+сборка табов) остаётся синхронной и общей.
+
+Зависимость `httpx` опциональна: pip install -r requirements-async.txt
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from core import deadline, shared_cache
+from core.catalog import LessonNotFound
+from strapi_client import (
+    CATEGORIES_PARAMS,
+    STRAPI_TOKEN,
+    STRAPI_URL,
+    cache_key,
+    cache_ttl,
+    lesson_params,
+)
+
+_client = None  # httpx.AsyncClient, создаётся лениво внутри event loop
+_inflight: Dict[Tuple[Any, ...], "asyncio.Task"] = {}
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        try:
+            import httpx  # type: ignore
+        except ImportError as e:  # pragma: no cover - зависит от окружения
+            raise RuntimeError("async mode needs httpx: pip install -r requirements-async.txt") from e
+        headers = {"Accept": "application/json"}
+        if STRAPI_TOKEN:
+            headers.update({
+                "Authorization": f"Bearer {STRAPI_TOKEN}",
+                "Content-Type": "application/json",
+            })
+        _client = httpx.AsyncClient(
+            base_url=STRAPI_URL,
+            headers=headers,
+            timeout=15,
+            # держим много одновременных ожиданий upstream на одном процессе
+            limits=httpx.Limits(max_connections=512, max_keepalive_connections=64),
+        )
+    return _client
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# ---- helpers -----------------------------------------------------------------
+async def _fetch(path: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    r = await _get_client().get(path if path.startswith("/") else "/" + path, params=params,
+                                timeout=deadline.timeout())
+    r.raise_for_status()
+    return r.json()
+
+async def _shared_fetch(path: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Ответ из общего кэша воркеров (его же пишет sync-клиент), иначе — из Strapi.
+    Без аренды: ждать чужого воркера в event loop нельзя, максимум сходим сами.
+    SQLite синхронный (и может ждать блокировку) — чтение и запись в потоке.
+    """
+    ttl = cache_ttl()
+    if not ttl:
+        return await _fetch(path, params)
+    key = cache_key(path, params)
+    raw = await asyncio.to_thread(shared_cache.get, "strapi", key)
+    if raw is not None:
+        return json.loads(raw)
+    data = await _fetch(path, params)
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await asyncio.to_thread(shared_cache.put, "strapi", key, body, ttl=ttl)
+    return data
+
+async def _get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Async GET в Strapi; параллельные одинаковые вызовы ждут один запрос."""
+    key = (path, tuple(sorted((params or {}).items())))
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_shared_fetch(path, params))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t, k=key: _inflight.pop(k, None))
+    # shield: отмена одного ожидающего не отменяет общий запрос; ждём не дольше бюджета запроса
+    left = deadline.remaining()
+    if left is None:
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), max(left, 0.0))
+    except asyncio.TimeoutError:
+        raise deadline.DeadlineExceeded("request budget exhausted") from None
+
+
+# ---- lessons / categories ----------------------------------------------------
+async def get_lesson(lesson_id: int) -> Dict[str, Any]:
+    data = await _get("/api/lessons", params=lesson_params("id", lesson_id))
+    items = data.get("data") or []
+    if not items:
+        raise LessonNotFound(f"Lesson id={lesson_id} not found")
+    return items[0]
+
+async def get_lesson_by_slug(slug: str) -> Optional[Dict[str, Any]]:
+    data = await _get("/api/lessons", params=lesson_params("slug", slug))
+    items = data.get("data") or []
+    return items[0] if items else None
+
+async def get_categories() -> Dict[str, Any]:
+    return await _get("/api/categories", params=dict(CATEGORIES_PARAMS))
+
+
+__all__ = ["get_lesson", "get_lesson_by_slug", "get_categories", "aclose"]
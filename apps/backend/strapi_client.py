@@ -1,12 +1,19 @@
 # apps/backend/strapi_client.py
 from __future__ import annotations
 
+import json
 import os
-from typing import Any, Dict, List, Optional
+import sys
+from urllib.parse import urlencode
+from typing import Any, Callable, Dict, List, Optional
 
 import requests
 from dotenv import load_dotenv
 
+from core import deadline, shared_cache
+from core.catalog import Category, CategoryRef, Lesson, LessonNotFound, WordColumns, categories_to_dicts, istr
+from core.singleflight import SingleFlight
+
 # ---- env / base config -------------------------------------------------------
 load_dotenv()
 
@@ -14,23 +21,83 @@ STRAPI_URL: str = os.getenv("STRAPI_URL", "http://localhost:1337").rstrip("/")
 # Поддержим и STRAPI_TOKEN, и STRAPI_API_TOKEN
 STRAPI_TOKEN: Optional[str] = os.getenv("STRAPI_TOKEN") or os.getenv("STRAPI_API_TOKEN")
 
-_session = requests.Session()
-_session.headers.setdefault("Accept", "application/json")
-if STRAPI_TOKEN:
-    _session.headers.update({
-        "Authorization": f"Bearer {STRAPI_TOKEN}",
-        "Content-Type": "application/json",
-    })
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.setdefault("Accept", "application/json")
+    if STRAPI_TOKEN:
+        session.headers.update({
+            "Authorization": f"Bearer {STRAPI_TOKEN}",
+            "Content-Type": "application/json",
+        })
+    return session
+
+_session = _new_session()
+
+def reset_session() -> None:
+    """Новая Session (пул соединений) — после fork: сокеты родителя воркерам делить нельзя."""
+    global _session
+    old, _session = _session, _new_session()
+    try:
+        old.close()
+    except Exception:
+        pass
+
+
+# одинаковые параллельные запросы в Strapi схлопываются в один (см. core/singleflight.py)
+_flight = SingleFlight("strapi")
+
+
+def cache_ttl() -> float:
+    """STRAPI_CACHE_TTL — сколько секунд ответ Strapi живёт в общем кэше воркеров (0 — не кэшировать)."""
+    try:
+        return max(float(os.getenv("STRAPI_CACHE_TTL", "30")), 0.0)
+    except ValueError:
+        return 30.0
+
+def cache_key(path: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Ключ ответа в общем кэше; общий для sync и async клиентов."""
+    return f"{path}?{urlencode(sorted((params or {}).items()))}"
 
 
 # ---- helpers -----------------------------------------------------------------
-def _get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    """GET в Strapi + .json() (бросает HTTPError на 4xx/5xx)."""
+def _fetch(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     url = f"{STRAPI_URL}{path if path.startswith('/') else '/' + path}"
-    r = _session.get(url, params=params, timeout=15)
+    r = _session.get(url, params=params, timeout=deadline.timeout())
     r.raise_for_status()
     return r.json()
 
+# перехват ответов для записи/воспроизведения трафика (core/cassette.py):
+# transport(path, params, fetch) -> ответ; fetch() — обычный путь (single-flight + общий кэш + сеть)
+Transport = Callable[[str, Optional[Dict[str, Any]], Callable[[], Dict[str, Any]]], Dict[str, Any]]
+_transport: Optional[Transport] = None
+
+def set_transport(transport: Optional[Transport]) -> None:
+    global _transport
+    _transport = transport
+
+def _get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """GET в Strapi + .json() (бросает HTTPError на 4xx/5xx).
+    Конкурентные вызовы с теми же (path, params) ждут один запрос и получают
+    общий распарсенный ответ — не мутируйте его.
+    """
+    key = (path, tuple(sorted((params or {}).items())))
+    transport = _transport
+    if transport is not None:
+        return transport(path, params, lambda: _flight.do(key, lambda: _shared_fetch(path, params)))
+    return _flight.do(key, lambda: _shared_fetch(path, params))
+
+def _shared_fetch(path: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """_fetch через общий кэш: один воркер ходит в Strapi, остальные читают его ответ."""
+    ttl = cache_ttl()
+    if not ttl:
+        return _fetch(path, params)
+    raw = shared_cache.get_or_fill(
+        "strapi", cache_key(path, params),
+        lambda: json.dumps(_fetch(path, params), ensure_ascii=False).encode("utf-8"),
+        ttl=ttl,
+    )
+    return json.loads(raw)
+
 def _abs_url(url: Optional[str]) -> str:
     """Сделать url абсолютным, если начинается с '/'."""
     if not url:
@@ -47,8 +114,8 @@ def _attrs(node: Any) -> Dict[str, Any]:
     # v5
     return node.get("attributes") or node
 
-def _media_url(node: Any) -> str:
-    """Достать url из media (v4/v5) и вернуть абсолютный."""
+def _media_path(node: Any) -> str:
+    """url из media (v4/v5) как он есть в Strapi (обычно относительный), интернированный."""
     if not node or not isinstance(node, dict):
         return ""
     url = node.get("url") or (node.get("attributes") or {}).get("url")
@@ -56,187 +123,191 @@ def _media_url(node: Any) -> str:
         inner = node.get("data") or {}
         if isinstance(inner, dict):
             url = (inner.get("attributes") or {}).get("url")
-    return _abs_url(url)
+    return sys.intern(url) if isinstance(url, str) else ""
+
+def _media_url(node: Any) -> str:
+    """Достать url из media (v4/v5) и вернуть абсолютный."""
+    return _abs_url(_media_path(node))
+
+def _rel_nodes(rel: Any) -> List[Any]:
+    """Узлы relation: список (v5) или {data: [...]} / {data: {...}} (v4)."""
+    if isinstance(rel, list):
+        return rel
+    if isinstance(rel, dict):
+        data = rel.get("data")
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            return [data]
+    return []
 
 
 # ---- lessons -----------------------------------------------------------------
-def get_lesson(lesson_id: int) -> Dict[str, Any]:
-    """Урок по id (title, slug, cover, category, words с image+level)."""
-    params = {
-        "filters[id][$eq]": lesson_id,
-        "pagination[pageSize]": 1,
+_LESSON_FIELDS: Dict[str, Any] = {
+    "fields[0]": "title",
+    "fields[1]": "slug",
+
+    "populate[cover]": "true",
+    "populate[categories]": "true",
 
-        "fields[0]": "title",
-        "fields[1]": "slug",
+    "populate[words][fields][0]": "term",
+    "populate[words][fields][1]": "translation",
+    "populate[words][fields][2]": "distractor1",
+    "populate[words][fields][3]": "level",
+    "populate[words][populate]": "image",
+}
 
-        "populate[cover]": "true",
-        "populate[categories]": "true",
+LESSONS_PAGE_SIZE = 100
 
-        "populate[words][fields][0]": "term",
-        "populate[words][fields][1]": "translation",
-        "populate[words][fields][2]": "distractor1",
-        "populate[words][fields][3]": "level",
-        "populate[words][populate]": "image",
+def lesson_params(field: str, value: Any) -> Dict[str, Any]:
+    """Query для одного урока по полю (id/slug). Общая для sync и async клиентов."""
+    return {
+        f"filters[{field}][$eq]": value,
+        "pagination[pageSize]": 1,
+        **_LESSON_FIELDS,
+    }
+
+def lessons_page_params(page: int) -> Dict[str, Any]:
+    """Query для страницы всех уроков (те же populate, что у одного урока)."""
+    return {
+        "pagination[page]": page,
+        "pagination[pageSize]": LESSONS_PAGE_SIZE,
+        "sort[0]": "id:asc",
+        **_LESSON_FIELDS,
     }
-    data = _get("/api/lessons", params=params)
+
+def get_lesson(lesson_id: int) -> Dict[str, Any]:
+    """Урок по id (title, slug, cover, category, words с image+level); LessonNotFound, если нет."""
+    data = _get("/api/lessons", params=lesson_params("id", lesson_id))
     items = data.get("data") or []
     if not items:
-        raise LookupError(f"Lesson id={lesson_id} not found")
+        raise LessonNotFound(f"Lesson id={lesson_id} not found")
     return items[0]
 
 def get_lesson_by_slug(slug: str) -> Optional[Dict[str, Any]]:
     """Урок по slug (те же populate)."""
-    params = {
-        "filters[slug][$eq]": slug,
-        "pagination[pageSize]": 1,
-
-        "fields[0]": "title",
-        "fields[1]": "slug",
-
-        "populate[cover]": "true",
-        "populate[categories]": "true",
-
-        "populate[words][fields][0]": "term",
-        "populate[words][fields][1]": "translation",
-        "populate[words][fields][2]": "distractor1",
-        "populate[words][fields][3]": "level",
-        "populate[words][populate]": "image",
-    }
-    data = _get("/api/lessons", params=params)
+    data = _get("/api/lessons", params=lesson_params("slug", slug))
     items = data.get("data") or []
     return items[0] if items else None
 
-def to_divkit_lesson(lesson_entry: Dict[str, Any]) -> Dict[str, Any]:
-    """Превратить entry из Strapi в компактный словарь для DivKit."""
+def parse_lesson(lesson_entry: Dict[str, Any]) -> Optional[Lesson]:
+    """Entry урока из Strapi -> компактная модель (core/catalog.py); None, если пусто."""
     entry = lesson_entry.get("data") if isinstance(lesson_entry, dict) and "data" in lesson_entry else lesson_entry
     if not entry:
-        return {"words": []}
+        return None
 
     attrs = entry.get("attributes") or entry  # v4 vs v5
 
-    cover_url = _media_url(attrs.get("cover"))
-
     # categories: support both new many-to-many ("categories") and old single ("category")
-    cat_rel = attrs.get("categories") or attrs.get("category")
-    cat_nodes = []
-    if isinstance(cat_rel, list):
-        cat_nodes = cat_rel
-    elif isinstance(cat_rel, dict):
-        data = cat_rel.get("data")
-        if isinstance(data, list):
-            cat_nodes = data
-        elif isinstance(data, dict):
-            cat_nodes = [data]
-
-    categories: List[Dict[str, Any]] = []
-    for cn in cat_nodes:
+    categories = []
+    for cn in _rel_nodes(attrs.get("categories") or attrs.get("category")):
         ca = _attrs(cn)
-        categories.append({
-            "title": (ca.get("title") or "").strip(),
-            "slug": (ca.get("slug") or "").strip(),
-            "order": ca.get("order") or 0,
-            "icon_url": _media_url(ca.get("icon")),
-        })
-
-    # words
-    words_rel = attrs.get("words") or {}
-    if isinstance(words_rel, list):
-        rel_items = words_rel
-    elif isinstance(words_rel, dict):
-        rel_items = words_rel.get("data") or []
-    else:
-        rel_items = []
-
-    words: List[Dict[str, Any]] = []
-    for w in rel_items:
+        categories.append(CategoryRef(
+            cn.get("id") if isinstance(cn, dict) else None,
+            istr(ca.get("title")),
+            istr(ca.get("slug")),
+            ca.get("order") or 0,
+            _media_path(ca.get("icon")),
+        ))
+
+    words = []
+    for w in _rel_nodes(attrs.get("words")):
         wa = _attrs(w)
-        words.append({
-            "term": (wa.get("term") or "").strip(),
-            "translation": (wa.get("translation") or "").strip(),
-            "distractor1": (wa.get("distractor1") or "").strip(),
-            "level": (wa.get("level") or "").strip(),
-            "image_url": _media_url(wa.get("image")),
-        })
-
-    return {
-        "id": entry.get("id"),
-        "title": (attrs.get("title") or "").strip(),
-        "slug": (attrs.get("slug") or "").strip(),
-        "cover_url": cover_url,
-        "category": categories[0] if categories else {},  # backward compatibility
-        "categories": categories,
-        "words": words,
-    }
+        words.append((
+            (wa.get("term") or "").strip(),
+            (wa.get("translation") or "").strip(),
+            (wa.get("distractor1") or "").strip(),
+            (wa.get("level") or "").strip(),
+            _media_path(wa.get("image")),
+        ))
+
+    return Lesson(
+        entry.get("id"),
+        istr(attrs.get("title")),
+        istr(attrs.get("slug")),
+        _media_path(attrs.get("cover")),
+        tuple(categories),
+        WordColumns(words),
+    )
+
+def get_all_lessons() -> List[Lesson]:
+    """Все уроки со словами — постранично, одной пачкой (для индекса каталога)."""
+    lessons: List[Lesson] = []
+    page = 1
+    while True:
+        data = _get("/api/lessons", params=lessons_page_params(page))
+        for item in data.get("data") or []:
+            lesson = parse_lesson(item)
+            if lesson is not None:
+                lessons.append(lesson)
+        pagination = (data.get("meta") or {}).get("pagination") or {}
+        if page >= int(pagination.get("pageCount") or 1):
+            return lessons
+        page += 1
+
+def to_divkit_lesson(lesson_entry: Any) -> Dict[str, Any]:
+    """Превратить entry из Strapi (или уже разобранный Lesson) в компактный словарь для DivKit."""
+    lesson = lesson_entry if isinstance(lesson_entry, Lesson) else parse_lesson(lesson_entry)
+    return lesson.to_dict(STRAPI_URL) if lesson is not None else {"words": []}
 
 
 # ---- categories (для Home) ---------------------------------------------------
+CATEGORIES_PARAMS: Dict[str, Any] = {
+    "fields[0]": "title",
+    "fields[1]": "slug",
+    "fields[2]": "order",
+    "populate[icon]": "true",
+
+    "populate[lessons][fields][0]": "title",
+    "populate[lessons][fields][1]": "slug",
+    "populate[lessons][populate]": "cover",
+
+    "sort[0]": "order:asc",
+    "pagination[pageSize]": 100,
+}
+
 def get_categories() -> Dict[str, Any]:
     """Сырые категории из Strapi с нужными полями (для внутреннего использования)."""
-    params = {
-        "fields[0]": "title",
-        "fields[1]": "slug",
-        "fields[2]": "order",
-        "populate[icon]": "true",
-
-        "populate[lessons][fields][0]": "title",
-        "populate[lessons][fields][1]": "slug",
-        "populate[lessons][populate]": "cover",
-
-        "sort[0]": "order:asc",
-        "pagination[pageSize]": 100,
-    }
-    return _get("/api/categories", params=params)
-
-def list_categories_with_lessons() -> List[Dict[str, Any]]:
-    """Готовые категории для Home (устойчивая форма, абсолютные URL)."""
-    raw = get_categories()
-    data = raw.get("data") or []
+    return _get("/api/categories", params=dict(CATEGORIES_PARAMS))
 
-    categories: List[Dict[str, Any]] = []
+def parse_categories(raw: Dict[str, Any]) -> List[Category]:
+    """Ответ /api/categories -> категории компактной модели (с лёгкими уроками, без слов)."""
+    categories: List[Category] = []
 
-    for item in data:
+    for item in raw.get("data") or []:
         # v4: {id, attributes:{...}}, v5: плоская
         if not isinstance(item, dict):
             continue
         attrs = item.get("attributes") or item
 
-        icon_url = _media_url(attrs.get("icon"))
-        title = (attrs.get("title") or "").strip()
-        slug = (attrs.get("slug") or "").strip()
-        order = attrs.get("order") or 0
-
-        # lessons relation
-        lessons_rel = attrs.get("lessons") or {}
-        if isinstance(lessons_rel, list):
-            lesson_nodes = lessons_rel
-        elif isinstance(lessons_rel, dict):
-            lesson_nodes = lessons_rel.get("data") or []
-        else:
-            lesson_nodes = []
-
-        lessons: List[Dict[str, Any]] = []
-        for ln in lesson_nodes:
+        lessons = []
+        for ln in _rel_nodes(attrs.get("lessons")):
             la = _attrs(ln)
-            lessons.append({
-                "id": ln.get("id") if isinstance(ln, dict) else None,
-                "title": (la.get("title") or "").strip(),
-                "slug": (la.get("slug") or "").strip(),
-                "cover_url": _media_url(la.get("cover")),
-            })
-
-        categories.append({
-            "id": item.get("id") if isinstance(item, dict) else None,
-            "title": title,
-            "slug": slug,
-            "order": order,
-            "icon_url": icon_url,
-            "lessons": lessons,
-        })
+            lessons.append(Lesson(
+                ln.get("id") if isinstance(ln, dict) else None,
+                istr(la.get("title")),
+                istr(la.get("slug")),
+                _media_path(la.get("cover")),
+                state=la.get("state") or la.get("ui_state") or la.get("status") or la.get("uiState"),
+            ))
+
+        categories.append(Category(
+            item.get("id"),
+            istr(attrs.get("title") or attrs.get("name")),  # как в core.ui.home_rows: у части категорий только name
+            istr(attrs.get("slug")),
+            attrs.get("order") or 0,
+            _media_path(attrs.get("icon")),
+            tuple(lessons),
+        ))
 
     # финальная сортировка на всякий пожарный
-    categories.sort(key=lambda c: (c.get("order") or 0, c.get("title") or ""))
+    categories.sort(key=lambda c: (c.order or 0, c.title or ""))
     return categories
 
+def list_categories_with_lessons() -> List[Dict[str, Any]]:
+    """Готовые категории для Home (устойчивая форма, абсолютные URL)."""
+    return categories_to_dicts(parse_categories(get_categories()), STRAPI_URL)
+
 
 # ---- tiny manual test --------------------------------------------------------
 if __name__ == "__main__":
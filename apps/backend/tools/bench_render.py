@@ -0,0 +1,112 @@
+# apps/backend/tools/bench_render.py
+"""Сверка и замер render-движка (core.ui.render_tree) против прежнего конвейера.
+
+Прежний конвейер (эталон) — tools/render_ref.py. Скрипт собирает одни и те же
+карточки обоими путями, проверяет, что JSON совпадает байт в байт, и печатает
+время на сборку.
+
+Фикстуры синтетические (Strapi не нужен): каталог из --lessons уроков по
+--categories категориям со смешанными состояниями карточек.
+
+Запуск (из apps/backend):
+    python tools/bench_render.py [--lessons 400] [--categories 8] [--repeat 20]
+Код выхода 1 — выходы разошлись. Полная сверка с путём до расхождения — tools/diff_render.py.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("UI_WATCH", "0")
+os.environ.setdefault("CATALOG_INDEX", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app import create_app                      # noqa: E402
+from core import ui                             # noqa: E402
+from core.paths import UI_DIR                   # noqa: E402
+from routes import home, lessons                # noqa: E402
+from render_ref import (                        # noqa: E402
+    fixture_rows, fixture_steps, ref_compile, ref_home, ref_home_card, ref_step,
+)
+
+
+# ---- новый путь ------------------------------------------------------------------
+
+def new_home(template, theme, rows) -> bytes:
+    return b"".join(home._build_base(template, theme, rows).parts)
+
+def new_step(data) -> bytes:
+    card = lessons._merge_card_variables(lessons._step_card(data), lessons._step_variables(data))
+    return home._dumps(card)
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lessons", type=int, default=400)
+    ap.add_argument("--categories", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    app = create_app()
+    rows = fixture_rows(args.lessons, args.categories)
+    steps = fixture_steps()
+    ok = True
+
+    with app.test_request_context("/"):
+        # 1) скомпилированные шаблоны: все страницы и компоненты, без темы и со светлой
+        files = sorted(p for p in UI_DIR.rglob("*.json") if p.stat().st_size and "tokens" not in p.parts)
+        for path in files:
+            for theme in (None, "light"):
+                try:
+                    want = ref_compile(path, theme)
+                except Exception as e:
+                    print(f"skip {path.relative_to(UI_DIR)}: {e}")
+                    break
+                got = ui.compile_template(path, theme=theme)
+                if json.dumps(want, ensure_ascii=False) != json.dumps(got, ensure_ascii=False):
+                    ok = False
+                    print("DIFF compile", path.relative_to(UI_DIR), theme)
+
+        # 2) шаги урока и /home (обе темы), карточки уроков во всех состояниях
+        for data in steps:
+            if ref_step(data) != new_step(data):
+                ok = False
+                print("DIFF step", data["done"])
+        for theme in ("light", "dark"):
+            if ref_home(None, theme, rows) != new_home(None, theme, rows):
+                ok = False
+                print("DIFF home", theme)
+            for state in ("0", "1", "2"):
+                if home._dumps(ref_home_card("T", 1, "t", state, theme)) != home._dumps(ui.home_lesson_card("T", 1, "t", state, theme)):
+                    ok = False
+                    print("DIFF card", theme, state)
+        print("outputs:", "identical" if ok else "DIFFERENT")
+
+        # 3) время (лучшее из --repeat), кэш шаблонов прогрет
+        cases = [
+            ("lesson step (full card)", lambda: [ref_step(d) for d in steps], lambda: [new_step(d) for d in steps]),
+            (f"/home base, {args.lessons} lessons", lambda: ref_home(None, "light", rows), lambda: new_home(None, "light", rows)),
+            ("lesson card", lambda: ref_home_card("T", 1, "t", "1", "dark"), lambda: ui.home_lesson_card("T", 1, "t", "1", "dark")),
+        ]
+        print(f"{'case':34} {'before, ms':>11} {'after, ms':>10} {'speedup':>8}")
+        for name, before, after in cases:
+            t_before, t_after = _time(before, args.repeat), _time(after, args.repeat)
+            print(f"{name:34} {t_before:11.2f} {t_after:10.2f} {t_before / t_after:7.2f}x")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
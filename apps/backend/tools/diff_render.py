@@ -0,0 +1,233 @@
+# apps/backend/tools/diff_render.py
+"""Дифференциальная сверка: быстрые пути сборки против эталонного конвейера.
+
+Каждая пара собирает одно и то же двумя движками — эталоном (tools/render_ref.py:
+resolve_includes -> apply_design_tokens -> patch_by_id) и кандидатом (то, что
+реально отдают маршруты) — и сравнивает JSON структурно. На расхождении печатается
+первый отличающийся путь ($.card.states[0].div.items[2].text) и оба значения.
+
+Пары:
+  pages    — каждая страница apps/web/ui/pages: без темы и в каждой теме;
+  steps    — каждый шаг каждого урока фикстурного каталога (полная карточка);
+  delta    — карточка первого шага + дельта шага k (как клиент её применяет) == карточка шага k;
+  bundle   — карточка бандла урока == карточка его первого шага;
+  home     — база /home в каждой теме, раскрытый JSON и с DivKit-шаблонами
+             (экземпляры раскрываются и сравниваются с эталоном), плюс подмена карточек по состояниям;
+  cards    — карточка урока во всех состояниях и темах;
+  resolvers — core.json_utils._resolve_includes против core.ui.resolve_includes
+             (по каждой странице и компоненту; только с --resolvers: второй резолвер
+             знает меньше форм include и на части файлов расходится ожидаемо).
+
+Запуск (из apps/backend):
+    python tools/diff_render.py [--only steps,home] [--lessons 120] [--resolvers]
+Код выхода 1 — есть расхождения.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("UI_WATCH", "0")
+os.environ.setdefault("CATALOG_INDEX", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app import create_app                      # noqa: E402
+from core import json_utils, ui                 # noqa: E402
+from core.boot import themes                    # noqa: E402
+from core.paths import UI_DIR                   # noqa: E402
+from routes import home, lessons                # noqa: E402
+from render_ref import (                        # noqa: E402
+    expand_templates, fixture_catalog, fixture_rows, lesson_steps, ref_compile, ref_home_card,
+    ref_home_tree, ref_step_tree,
+)
+
+Case = Tuple[str, Callable[[], Any], Callable[[], Any]]   # (имя, эталон, кандидат)
+
+
+# ---- структурный diff ----------------------------------------------------------------
+
+def _show(v: Any, limit: int = 120) -> str:
+    s = json.dumps(v, ensure_ascii=False, sort_keys=True, default=str)
+    return s if len(s) <= limit else s[:limit] + "…"
+
+def _kind(v: Any) -> str:
+    # tuple/FrozenDict — те же JSON-массив/объект; bool и int в JSON различаются
+    if isinstance(v, dict):
+        return "object"
+    if isinstance(v, (list, tuple)):
+        return "array"
+    if isinstance(v, bool):
+        return "bool"
+    if isinstance(v, (int, float)):
+        return "number"
+    return type(v).__name__
+
+def first_diff(want: Any, got: Any, path: str = "$") -> Optional[str]:
+    """Путь и суть первого расхождения (обход в порядке ключей эталона) или None."""
+    kw, kg = _kind(want), _kind(got)
+    if kw != kg:
+        return f"{path}: type {kw} != {kg}: {_show(want)} vs {_show(got)}"
+    if kw == "object":
+        for k in want:
+            if k not in got:
+                return f"{path}.{k}: missing in candidate (reference: {_show(want[k])})"
+            d = first_diff(want[k], got[k], f"{path}.{k}")
+            if d:
+                return d
+        for k in got:
+            if k not in want:
+                return f"{path}.{k}: extra in candidate: {_show(got[k])}"
+        return None
+    if kw == "array":
+        for i, (a, b) in enumerate(zip(want, got)):
+            d = first_diff(a, b, f"{path}[{i}]")
+            if d:
+                return d
+        if len(want) != len(got):
+            return f"{path}: length {len(want)} != {len(got)}"
+        return None
+    if want != got:
+        return f"{path}: {_show(want)} != {_show(got)}"
+    return None
+
+
+# ---- пары ------------------------------------------------------------------------------
+
+def _pages() -> List[Path]:
+    return sorted(p for p in (UI_DIR / "pages").glob("*.json") if p.stat().st_size)
+
+def case_pages() -> Iterator[Case]:
+    for path in _pages():
+        for theme in (None, *themes()):
+            yield (f"{path.name} theme={theme}",
+                   lambda p=path, t=theme: ref_compile(p, t),
+                   lambda p=path, t=theme: ui.template(p, theme=t))
+
+def _full_step(data):
+    return lessons._merge_card_variables(lessons._step_card(data), lessons._step_variables(data))
+
+def _delta_step(first, data):
+    """Клиентский путь: отрисованная карточка первого шага + патчи дельты + переменные."""
+    card = ui.thaw(_full_step(first))
+    for anchor_id, updates in lessons._step_delta(data).items():
+        ui.patch_by_id(card, anchor_id, updates)
+    return lessons._merge_card_variables(card, lessons._step_variables(data))
+
+def _catalog_steps():
+    for raw in fixture_catalog():
+        for seed in ("", "s1"):
+            yield raw, seed, lesson_steps(raw, seed)
+
+def case_steps() -> Iterator[Case]:
+    for raw, seed, steps in _catalog_steps():
+        for i, data in enumerate(steps):
+            yield (f"lesson {raw['slug']} s={seed!r} step {i}",
+                   lambda d=data: ref_step_tree(d), lambda d=data: _full_step(d))
+
+def case_delta() -> Iterator[Case]:
+    for raw, seed, steps in _catalog_steps():
+        for i, data in enumerate(steps[1:], 1):
+            yield (f"lesson {raw['slug']} s={seed!r} step 0 + delta {i}",
+                   lambda d=data: ref_step_tree(d), lambda f=steps[0], d=data: _delta_step(f, d))
+
+def case_bundle() -> Iterator[Case]:
+    for raw in fixture_catalog():
+        key = f"id:{raw['id']}"
+
+        def candidate(r=raw, k=key):
+            kind, body = lessons._build_bundle(lambda: r, lambda i: f"/view/lesson/{r['id']}?i={i}",
+                                               lesson_key=k, seed="", version="v", label="")
+            return json.loads(body)["card"]
+
+        yield (f"bundle {raw['slug']}", lambda r=raw: ref_step_tree(lesson_steps(r)[0]), candidate)
+
+def _home_tree(theme, rows, templates: bool, states=None):
+    doc = json.loads(home._build_base(None, theme, rows, templates).render(states or {}))
+    if templates:
+        doc = expand_templates({k: v for k, v in doc.items() if k != "templates"}, doc.get("templates") or {})
+    return doc
+
+def _ref_home_states(theme, rows, states):
+    rows = [(title, [(t, lid, slug, states.get(lid, st)) for t, lid, slug, st in items]) for title, items in rows]
+    return ref_home_tree(None, theme, rows)
+
+def case_home(n_lessons: int) -> Iterator[Case]:
+    rows = fixture_rows(n_lessons, 6)
+    rows[0][1].append(("Без id", None, "no-id", "1"))
+    states = {1: "2", 2: "0", 3: "1", 5: "2"}
+    for theme in themes():
+        for templates in (False, True):
+            label = f"theme={theme} templates={int(templates)}"
+            yield (f"/home {label}", lambda t=theme: ref_home_tree(None, t, rows),
+                   lambda t=theme, tm=templates: _home_tree(t, rows, tm))
+            yield (f"/home {label} user states", lambda t=theme: _ref_home_states(t, rows, states),
+                   lambda t=theme, tm=templates: _home_tree(t, rows, tm, states))
+
+def case_cards() -> Iterator[Case]:
+    for theme in themes():
+        for state in ("0", "1", "2"):
+            for lid, slug in ((7, "seven"), (None, "slug-only")):
+                yield (f"card lid={lid} state={state} theme={theme}",
+                       lambda a=(lid, slug, state, theme): ref_home_card("Т «1»", *a),
+                       lambda a=(lid, slug, state, theme): ui.home_lesson_card("Т «1»", *a))
+
+def case_resolvers() -> Iterator[Case]:
+    files = [p for p in sorted(UI_DIR.rglob("*.json")) if p.stat().st_size and "tokens" not in p.parts]
+    for path in files:
+        yield (f"resolve {path.relative_to(UI_DIR)}",
+               lambda p=path: json_utils._resolve_includes(json_utils._load_json(p), base_dir=p.parent),
+               lambda p=path: ui.resolve_includes(ui._load_json(p), base_dir=p.parent))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--only", default="", help="пары через запятую (pages,steps,delta,bundle,home,cards,resolvers)")
+    ap.add_argument("--lessons", type=int, default=120, help="уроков в фикстуре /home")
+    ap.add_argument("--resolvers", action="store_true", help="сверить и два резолвера include")
+    ap.add_argument("-v", "--verbose", action="store_true", help="печатать и совпавшие случаи")
+    args = ap.parse_args()
+
+    suites = {
+        "pages": case_pages, "steps": case_steps, "delta": case_delta, "bundle": case_bundle,
+        "home": lambda: case_home(args.lessons), "cards": case_cards, "resolvers": case_resolvers,
+    }
+    only = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = [s for s in only if s not in suites]
+    if unknown:
+        ap.error(f"unknown suites: {', '.join(unknown)}")
+    names = only or [s for s in suites if s != "resolvers" or args.resolvers]
+
+    app = create_app()
+    failed = total = 0
+    with app.test_request_context("/"):
+        for suite in names:
+            n_bad = n = 0
+            for name, reference, candidate in suites[suite]():
+                n += 1
+                try:
+                    want = reference()
+                except Exception as e:
+                    print(f"SKIP {suite}: {name}: reference failed: {e}")
+                    continue
+                try:
+                    diff = first_diff(want, candidate())
+                except Exception as e:
+                    diff = f"candidate raised {type(e).__name__}: {e}"
+                if diff:
+                    n_bad += 1
+                    print(f"DIFF {suite}: {name}\n     {diff}")
+                elif args.verbose:
+                    print(f"ok   {suite}: {name}")
+            print(f"{suite:10} {n - n_bad}/{n} identical")
+            failed += n_bad
+            total += n
+    print(f"{total - failed}/{total} identical" + ("" if not failed else f", {failed} DIFFERENT"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
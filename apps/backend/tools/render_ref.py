@@ -0,0 +1,151 @@
+# apps/backend/tools/render_ref.py
+"""Эталонный (прежний) конвейер сборки и фикстуры — общие для tools/bench_render.py и tools/diff_render.py.
+
+Прежний конвейер: resolve_includes -> apply_design_tokens -> patch_by_id на
+каждый якорь (и для /home: табы отдельно, вставка, ещё раз resolve_includes и
+токены темы). Медленный, но простой: с ним сверяются быстрые пути.
+"""
+from __future__ import annotations
+import copy
+from pathlib import Path
+
+from core import ui
+from core.paths import UI_DIR
+from routes import home, lessons
+from strapi_client import to_divkit_lesson
+
+
+# ---- прежний конвейер (эталон) ---------------------------------------------------
+
+def ref_compile(path: Path, theme=None):
+    tree = ui.resolve_includes(ui._load_json(path))
+    return ui.apply_design_tokens(tree, ui.load_tokens(theme)) if theme is not None else tree
+
+def ref_lesson_item(title, lid, slug, state):
+    return ui.resolve_includes(ui._lesson_item_spec(title, lid, slug, state=state), base_dir=UI_DIR / "components")
+
+def ref_home_tabs(rows):
+    tabs = ui.home_tabs_spec(rows, card=lambda t, i, s, st: ref_lesson_item(t, i, s, st))
+    return ui.apply_design_tokens(ui.resolve_includes(tabs), ui.load_tokens("light"))
+
+def ref_home_tree(template, theme, rows):
+    card = ref_compile(home._page_path(template))
+    tabs = ref_home_tabs(rows)
+    for node_id in home.TABS_CONTAINER_IDS:
+        if ui.replace_node_by_id(card, node_id, tabs):
+            break
+    return ui.apply_design_tokens(ui.resolve_includes(card), ui.load_tokens(theme))
+
+def ref_home(template, theme, rows) -> bytes:
+    return home._dumps(ref_home_tree(template, theme, rows))
+
+def ref_home_card(title, lid, slug, state, theme):
+    node = ui.apply_design_tokens(ui.resolve_includes(ref_lesson_item(title, lid, slug, state)), ui.load_tokens("light"))
+    return ui.apply_design_tokens(ui.resolve_includes(node), ui.load_tokens(theme))
+
+def ref_step_tree(data):
+    card = ref_compile(lessons.LESSON_TEMPLATE, "light")
+    lessons._apply_step(card, data)
+    return lessons._merge_card_variables(card, lessons._step_variables(data))
+
+def ref_step(data) -> bytes:
+    return home._dumps(ref_step_tree(data))
+
+
+# ---- DivKit-шаблоны /home -----------------------------------------------------------
+
+def expand_templates(node, templates):
+    """Раскрыть экземпляры DivKit-шаблонов (type = имя шаблона, $ключ — привязка к полю экземпляра)."""
+    if isinstance(node, (list, tuple)):
+        return [expand_templates(x, templates) for x in node]
+    if not isinstance(node, dict):
+        return node
+    tpl = templates.get(node.get("type"))
+    if tpl is None:
+        return {k: expand_templates(v, templates) for k, v in node.items()}
+    used = set()
+
+    def bind(n):
+        if isinstance(n, (list, tuple)):
+            return [bind(x) for x in n]
+        if not isinstance(n, dict):
+            return n
+        out = {}
+        for k, v in n.items():
+            if k.startswith("$"):
+                used.add(v)
+                if v in node:
+                    out[k[1:]] = node[v]
+            else:
+                out[k] = bind(v)
+        return out
+
+    out = bind(copy.deepcopy(tpl))
+    for k, v in node.items():
+        if k != "type" and k not in used:
+            out[k] = v
+    return expand_templates(out, templates)
+
+
+# ---- фикстуры ----------------------------------------------------------------------
+
+def fixture_rows(n_lessons: int, n_categories: int):
+    rows = []
+    per = max(n_lessons // max(n_categories, 1), 1)
+    lid = 1
+    for c in range(n_categories):
+        items = []
+        for _ in range(per):
+            items.append((f"Урок {lid} «{c}»", lid, f"lesson-{lid}", ("0", "1", "2")[lid % 3]))
+            lid += 1
+        rows.append((f"Категория {c}", items))
+    rows.append(("Пустая", []))
+    return rows
+
+def fixture_steps(n: int = 10):
+    words = [{
+        "term": f"слово {i}", "translation": f"word {i}", "distractor1": f"wrong {i}",
+        "image_url": f"/uploads/w{i}.png" if i % 2 else "",
+    } for i in range(n)]
+    return [lessons._step_data(words, i, "/view/home" if i + 1 == n else f"/view/lesson/1?i={i + 1}", bool(i % 2))
+            for i in range(n)]
+
+
+def _word(i: int, **over):
+    w = {"id": 1000 + i, "term": f"слово {i}", "translation": f"word {i}", "distractor1": f"wrong {i}",
+         "image": {"url": f"/uploads/w{i}.png"}}
+    w.update(over)
+    return w
+
+def fixture_catalog():
+    """Уроки в форме ответа Strapi: разное число слов (в т.ч. больше MAX_WORDS), без картинок,
+    с абсолютными URL картинок, пустыми и длинными текстами."""
+    return [
+        {"id": 1, "title": "Один шаг", "slug": "one", "words": [_word(0)]},
+        {"id": 2, "title": "Три шага", "slug": "three", "words": [_word(i, image=None) for i in range(1, 4)]},
+        {"id": 3, "title": "Полный урок", "slug": "full", "words": [_word(i) for i in range(10, 20)]},
+        {"id": 4, "title": "Больше лимита", "slug": "over", "words": [_word(i) for i in range(20, 35)]},
+        {"id": 5, "title": "Краевые случаи", "slug": "edge", "words": [
+            _word(40, image={"url": "https://cdn.example.org/a b.png"}),
+            _word(41, translation="", distractor1=""),
+            _word(42, term="  пробелы  ", translation=" «кавычки» \"и\" \\ ", distractor1=" "),
+            _word(43, term="очень " * 40, image={"url": ""}),
+        ]},
+    ]
+
+def lesson_steps(raw, seed: str = ""):
+    """Данные всех шагов урока — тем же путём, что _build_step (слова, next_url, «монетка»)."""
+    words = (to_divkit_lesson(raw).get("words") or [])[:lessons.MAX_WORDS]
+    key = f"id:{raw['id']}"
+    out = []
+    for i in range(len(words)):
+        next_url = "/view/home" if i + 1 >= len(words) else lessons._with_seed(f"/view/lesson/{raw['id']}?i={i + 1}", seed)
+        out.append(lessons._step_data(words, i, next_url, lessons._correct_on_left(key, i, seed)))
+    return out
+
+
+__all__ = [
+    "ref_compile", "ref_lesson_item", "ref_home_tabs", "ref_home_tree", "ref_home", "ref_home_card",
+    "ref_step_tree", "ref_step", "expand_templates",
+    "fixture_rows", "fixture_steps", "fixture_catalog", "lesson_steps",
+]
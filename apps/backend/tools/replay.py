@@ -0,0 +1,138 @@
+# apps/backend/tools/replay.py
+"""Воспроизведение кассеты (core/cassette.py): записанный трафик против приложения без сети.
+
+strapi_client._get отвечает из кассеты (версия ответа — действовавшая на момент
+записи запроса), поход в сеть (_fetch) запрещён. Запросы идут через
+app.test_client() в записанном порядке, в --threads потоков. В конце — таблица
+по маршрутам: число запросов, p50/p90/p99/max воспроизведения и p50 из прода,
+несовпадения статусов и промахи кассеты (ответов Strapi, которых в ней нет).
+
+Состояние процесса изолировано: прогресс, общий кэш и last-known-good — во
+временном каталоге (LKG выключен, чтобы промахи не прятались за устаревшими
+ответами), бюджет запроса выключен. Индекс каталога — как в окружении.
+
+Запуск (из apps/backend):
+    python tools/replay.py cassette.jsonl [more.jsonl ...] [--repeat 3] [--threads 4] [--path /lesson]
+Код выхода 1 — были промахи кассеты или статусы разошлись с записью.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+_tmp = tempfile.mkdtemp(prefix="worb-replay-")
+os.environ.pop("CASSETTE_RECORD", None)
+os.environ.setdefault("UI_WATCH", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("REQUEST_BUDGET", "0")
+os.environ.setdefault("LKG", "0")
+os.environ.setdefault("PROGRESS_DB_PATH", os.path.join(_tmp, "progress.sqlite3"))
+os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(_tmp, "shared.sqlite3"))
+
+import strapi_client                            # noqa: E402
+from app import create_app                      # noqa: E402
+from core.cassette import Cassette              # noqa: E402
+
+
+def _no_network(path, params=None):
+    raise RuntimeError(f"network disabled during replay: {path}")
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+
+def _route(adapter, method: str, path: str) -> str:
+    """Шаблон маршрута Flask (/lesson/<int:lesson_id>) — чтобы группировать по эндпоинту, а не по URL."""
+    try:
+        rule, _args = adapter.match(path, method=method, return_rule=True)
+        return rule.rule
+    except Exception:
+        return path
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("cassettes", nargs="+")
+    ap.add_argument("--repeat", type=int, default=1, help="сколько раз прогнать запись")
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--path", default="", help="только запросы с таким префиксом пути")
+    args = ap.parse_args()
+
+    tape = Cassette(args.cassettes)
+    reqs = [r for r in tape.requests if r["path"].startswith(args.path)]
+    if not reqs:
+        print("no requests in cassette")
+        return 1
+
+    strapi_client._fetch = _no_network
+    strapi_client.set_transport(tape.transport)
+    app = create_app()
+    adapter = app.url_map.bind("localhost")
+    local = threading.local()
+
+    def client():
+        c = getattr(local, "client", None)
+        if c is None:
+            # cookie — только из записи (заголовок Cookie), без общей банки между запросами
+            c = local.client = app.test_client(use_cookies=False)
+        return c
+
+    def run(entry):
+        # версия ответов Strapi — на момент записи запроса; при --threads > 1 — приблизительно
+        tape.clock = entry.get("ts")
+        t0 = time.perf_counter()
+        resp = client().open(entry["path"], method=entry["method"], query_string=entry.get("query") or None,
+                             headers=entry.get("headers") or {}, data=entry.get("body"))
+        resp.close()
+        return entry, resp.status_code, (time.perf_counter() - t0) * 1000
+
+    results = []
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(args.threads, 1)) as pool:
+        for _ in range(max(args.repeat, 1)):
+            results.extend(pool.map(run, reqs))
+    wall = time.perf_counter() - t_start
+
+    stats: Dict[str, Dict[str, list]] = {}
+    mismatched = 0
+    for entry, status, ms in results:
+        row = stats.setdefault(f"{entry['method']} {_route(adapter, entry['method'], entry['path'])}",
+                               {"ms": [], "rec": [], "bad": []})
+        row["ms"].append(ms)
+        if entry.get("ms") is not None:
+            row["rec"].append(float(entry["ms"]))
+        if status != entry.get("status"):
+            row["bad"].append((entry["path"], entry.get("status"), status))
+            mismatched += 1
+
+    print(f"{len(results)} requests, {len(tape.requests)} recorded, {tape.responses} strapi responses, "
+          f"{wall:.2f}s wall, {len(results) / wall:.1f} req/s")
+    print(f"{'endpoint':40} {'n':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'prod p50':>9} {'status!=':>9}")
+    for name, row in sorted(stats.items(), key=lambda kv: -sum(kv[1]["ms"])):
+        ms = row["ms"]
+        rec = f"{_pct(row['rec'], 0.5):9.2f}" if row["rec"] else f"{'-':>9}"
+        print(f"{name[:40]:40} {len(ms):6d} {_pct(ms, 0.5):8.2f} {_pct(ms, 0.9):8.2f} {_pct(ms, 0.99):8.2f} "
+              f"{max(ms):8.2f} {rec} {len(row['bad']):9d}")
+    for name, row in stats.items():
+        for path, want, got in row["bad"][:3]:
+            print(f"status {path}: recorded {want}, replayed {got}")
+    if tape.misses:
+        print(f"cassette misses ({sum(tape.misses.values())}):")
+        for key, n in sorted(tape.misses.items(), key=lambda kv: -kv[1])[:20]:
+            print(f"  {n:5d}  {key}")
+    return 1 if tape.misses or mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 // apps/web/client.js
 // SPA client for DivKit: routes /view/* to backend JSON, renders via DivKit,
-// supports state switching (SDK and JSON fallback), simple prefetch cache.
+// supports state switching (SDK and JSON fallback), simple prefetch cache,
+// per-step deltas and whole-lesson bundles for lesson cards.
 
 (function () {
   'use strict';
@@ -18,6 +19,21 @@
     }
   }
 
+  // per-tab seed for answer placement: stable within a session (cacheable URLs),
+  // different between users
+  const sessionSeed = (function () {
+    try {
+      let v = sessionStorage.getItem('worb_seed');
+      if (!v) {
+        v = Math.random().toString(36).slice(2, 10);
+        sessionStorage.setItem('worb_seed', v);
+      }
+      return v;
+    } catch (_) {
+      return '';
+    }
+  })();
+
   const root = document.getElementById('root');
   let div = null;           // DivKit instance
   let currentJson = null;   // last rendered JSON (for fallback state change)
@@ -41,43 +57,171 @@
     } catch (_) {}
   }
 
-  function fetchCardWithCache(apiPath) {
-    if (cardCache.has(apiPath)) {
-      return Promise.resolve(deepClone(cardCache.get(apiPath)));
+  // --------------------------- lesson step deltas ---------------------------
+  // All lesson steps share one template. Once a lesson card is on screen we send
+  // its template version in X-Card-Base and the backend may answer with just the
+  // per-anchor patches: { delta: { version, set: { <id>: {key: value|null} }, variables } }.
+  let currentVersion = null;      // X-Card-Version of currentJson (lesson cards only)
+  const cardVersions = new Map(); // API URL -> X-Card-Version of the cached JSON
+
+  function applyCardDelta(baseJson, delta) {
+    const out = deepClone(baseJson);
+    const sets = (delta && delta.set) || {};
+    (function walk(n) {
+      if (!n || typeof n !== 'object') return;
+      if (Array.isArray(n)) { n.forEach(walk); return; }
+      const upd = typeof n.id === 'string' ? sets[n.id] : null;
+      if (upd) {
+        Object.keys(upd).forEach((k) => {
+          if (upd[k] === null) delete n[k];
+          else n[k] = deepClone(upd[k]);
+        });
+      }
+      Object.values(n).forEach(walk);
+    })(out);
+
+    const card = out && out.card ? out.card : out;
+    const vars = delta && delta.variables;
+    if (card && vars && typeof vars === 'object') {
+      if (!Array.isArray(card.variables)) card.variables = [];
+      Object.keys(vars).forEach((name) => {
+        const value = vars[name];
+        const type = typeof value === 'number' ? 'number' : 'string';
+        const entry = card.variables.find((v) => v && v.name === name);
+        if (entry) { entry.type = type; entry.value = value; }
+        else card.variables.push({ name, type, value });
+      });
     }
-    return fetch(apiPath, { headers: { Accept: 'application/json' } })
-      .then((res) => {
-        if (!res.ok) throw new Error(`${apiPath} -> ${res.status}`);
-        return res.json();
-      })
-      .then((json) => {
-        if (cardCache.size >= CARD_CACHE_MAX) {
-          const firstKey = cardCache.keys().next().value;
-          cardCache.delete(firstKey);
+    return out;
+  }
+
+  function requestCard(apiPath, allowDelta = true) {
+    const headers = { Accept: 'application/json' };
+    const baseJson = currentJson;
+    const baseVersion = currentVersion;
+    if (allowDelta && baseJson && baseVersion && (apiPath.startsWith('/lesson/') || apiPath.startsWith('/review'))) {
+      headers['X-Card-Base'] = baseVersion;
+    }
+    return fetch(apiPath, { headers }).then((res) => {
+      if (!res.ok) throw new Error(`${apiPath} -> ${res.status}`);
+      const version = res.headers.get('X-Card-Version');
+      return res.json().then((json) => {
+        if (json && json.delta) {
+          // base changed under us (template edit) -> ask for the full card
+          if (!baseJson || json.delta.version !== baseVersion) return requestCard(apiPath, false);
+          json = applyCardDelta(baseJson, json.delta);
         }
-        cardCache.set(apiPath, json);
-        prewarmImagesFromCard(json);
-        return deepClone(json);
+        return { json, version };
+      });
+    });
+  }
+
+  function cachePut(apiPath, entry) {
+    if (cardCache.size >= CARD_CACHE_MAX) {
+      const firstKey = cardCache.keys().next().value;
+      cardCache.delete(firstKey);
+      cardVersions.delete(firstKey);
+    }
+    cardCache.set(apiPath, entry.json);
+    cardVersions.set(apiPath, entry.version);
+  }
+
+  function fetchCardWithCache(apiPath) {
+    if (cardCache.has(apiPath)) {
+      return Promise.resolve({
+        json: deepClone(cardCache.get(apiPath)),
+        version: cardVersions.get(apiPath) || null,
       });
+    }
+    return requestCard(apiPath).then((entry) => {
+      cachePut(apiPath, entry);
+      prewarmImagesFromCard(entry.json);
+      return { json: deepClone(entry.json), version: entry.version };
+    });
   }
 
   function preloadViewUrl(viewPath) {
     const api = routeToApi(viewPath);
     if (cardCache.has(api)) return;
-    fetch(api, { headers: { Accept: 'application/json' } })
-      .then((res) => (res.ok ? res.json() : null))
-      .then((json) => {
-        if (!json) return;
-        if (cardCache.size >= CARD_CACHE_MAX) {
-          const firstKey = cardCache.keys().next().value;
-          cardCache.delete(firstKey);
-        }
-        prewarmImagesFromCard(json);
-        cardCache.set(api, deepClone(json));
+    requestCard(api)
+      .then((entry) => {
+        prewarmImagesFromCard(entry.json);
+        cachePut(api, { json: deepClone(entry.json), version: entry.version });
       })
       .catch(() => {});
   }
 
+  // ---------------------------- lesson bundles -----------------------------
+  // /lesson/<id>/bundle returns the step-0 card once plus compact per-step data
+  // ({term, image, choices: [[text, url|null] x2], progress: [done, total]}), so
+  // every step is assembled locally with the same patches a delta would carry.
+  const BUNDLE_MAX = 2;
+  const bundles = new Map(); // lesson key -> Promise<bundle|null>
+
+  function lessonRef(viewPath) {
+    const pId = parseViewLesson(viewPath);
+    if (pId) {
+      return {
+        key: `id:${pId.id}|${pId.s}`,
+        i: pId.i,
+        api: `/lesson/${pId.id}/bundle${pId.s ? `?s=${encodeURIComponent(pId.s)}` : ''}`,
+      };
+    }
+    const pSlug = parseViewLessonSlug(viewPath);
+    if (pSlug) {
+      return {
+        key: `slug:${pSlug.slug}|${pSlug.s}`,
+        i: pSlug.i,
+        api: `/lesson/by/${encodeURIComponent(pSlug.slug)}/bundle${pSlug.s ? `?s=${encodeURIComponent(pSlug.s)}` : ''}`,
+      };
+    }
+    return null;
+  }
+
+  function loadBundle(ref) {
+    if (!bundles.has(ref.key)) {
+      if (bundles.size >= BUNDLE_MAX) bundles.delete(bundles.keys().next().value);
+      const p = fetch(ref.api, { headers: { Accept: 'application/json' } })
+        .then((res) => (res.ok ? res.json() : null))
+        .then((b) => {
+          if (!b || !b.card || !Array.isArray(b.steps) || !b.steps.length) return null;
+          b.steps.forEach((st) => { try { const i = new Image(); i.src = st.image; } catch (_) {} });
+          return b;
+        })
+        .catch(() => null);
+      bundles.set(ref.key, p);
+    }
+    return bundles.get(ref.key);
+  }
+
+  function stepDelta(step) {
+    const [done, total] = step.progress;
+    const [[leftText, leftUrl], [rightText, rightUrl]] = step.choices;
+    const act = (url) => (url ? { log_id: 'next_word', url } : null);
+    return {
+      set: {
+        word_term: { text: step.term },
+        word_image: { image_url: step.image },
+        choice_left_text: { text: leftText },
+        choice_right_text: { text: rightText },
+        choice_left: { action: act(leftUrl) },
+        choice_right: { action: act(rightUrl) },
+        progress_done: { weight: done },
+        progress_rest: { weight: Math.max(total - done, 0) },
+      },
+      variables: { total, correct: done, done, rest: Math.max(total - done, 0) },
+    };
+  }
+
+  async function bundleCard(viewPath) {
+    const ref = lessonRef(viewPath);
+    if (!ref) return null;
+    const b = await loadBundle(ref);
+    const i = Number.isFinite(ref.i) && ref.i > 0 ? ref.i : 0;
+    if (!b || i >= b.steps.length) return null; // past the end: let the backend decide
+    return { json: applyCardDelta(b.card, stepDelta(b.steps[i])), version: b.version };
+  }
+
   // ------------------------------- utils ----------------------------------
   function postLog(action) {
     try {
@@ -87,12 +231,34 @@
         body: JSON.stringify({
           event: action?.log_id || 'click',
           payload: action?.payload || {},
+          url: action?.url || undefined,
+          // where the click happened and the tab session: the backend aggregates the lesson funnel from these
+          view: location.pathname + (location.search || ''),
+          sid: sessionSeed || undefined,
           ts: Date.now(),
         }),
       }).catch(() => {});
     } catch (_) {}
   }
 
+  // lesson finished (the correct answer on the last step leads home): the backend
+  // keeps per-user progress and overlays it onto the shared /home payload
+  function postProgress(viewPath, state) {
+    const pId = parseViewLesson(viewPath);
+    const pSlug = pId ? null : parseViewLessonSlug(viewPath);
+    if (!pId && !pSlug) return Promise.resolve();
+    const body = pId ? { lesson_id: pId.id, state } : { slug: pSlug.slug, state };
+    try {
+      return fetch('/progress', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body),
+      }).catch(() => {});
+    } catch (_) {
+      return Promise.resolve();
+    }
+  }
+
   function extractAction(obj) {
     if (!obj || typeof obj !== 'object') return null;
     if (obj.url || obj.href || obj.log_id || obj.payload || obj.set_state) return obj;
@@ -166,6 +332,16 @@
       return `/lesson/by/${encodeURIComponent(mBy[1])}${search}`;
     }
 
+    // Word search: /view/search?q=... -> /search?q=...
+    if (pathname === '/view/search' || pathname === '/view/search/') {
+      return `/search${search}`;
+    }
+
+    // Review session across lessons: /view/review?level=B1&s=... -> /review?level=B1&s=...
+    if (pathname === '/view/review' || pathname === '/view/review/') {
+      return `/review${search}`;
+    }
+
     // Explicit page alias: /view/page/<name> -> /page/<name>
     const mPage = pathname.match(/^\/view\/page\/([^\/]+)\/?$/);
     if (mPage) {
@@ -191,13 +367,14 @@
   }
 
   function parseViewLesson(viewPath) {
-    // /view/lesson/2?i=1 -> { id:2, i:1 }
+    // /view/lesson/2?i=1&s=abc -> { id:2, i:1, s:'abc' }
     const url = new URL(viewPath, location.origin);
     const m = url.pathname.match(/^\/view\/lesson\/(\d+)\/?$/);
     if (!m) return null;
     const id = Number(m[1]);
     const i = url.searchParams.has('i') ? Number(url.searchParams.get('i')) : 0;
-    return { id, i };
+    const s = url.searchParams.get('s') || '';
+    return { id, i, s };
   }
 
   function parseViewLessonSlug(viewPath) {
@@ -206,19 +383,25 @@
     if (!m) return null;
     const slug = decodeURIComponent(m[1]);
     const i = url.searchParams.has('i') ? Number(url.searchParams.get('i')) : 0;
-    return { slug, i };
+    const s = url.searchParams.get('s') || '';
+    return { slug, i, s };
+  }
+
+  // shuffle seed: the backend places answers deterministically per (lesson, step, s)
+  function seedQuery(s) {
+    return s ? `&s=${encodeURIComponent(s)}` : '';
   }
 
   function nextViewUrl(viewPath) {
     const pId = parseViewLesson(viewPath);
     if (pId) {
       const nextI = (pId.i ?? 0) + 1;
-      return `/view/lesson/${pId.id}?i=${nextI}`;
+      return `/view/lesson/${pId.id}?i=${nextI}${seedQuery(pId.s)}`;
     }
     const pSlug = parseViewLessonSlug(viewPath);
     if (pSlug) {
       const nextI = (pSlug.i ?? 0) + 1;
-      return `/view/lesson/slug/${encodeURIComponent(pSlug.slug)}?i=${nextI}`;
+      return `/view/lesson/slug/${encodeURIComponent(pSlug.slug)}?i=${nextI}${seedQuery(pSlug.s)}`;
     }
     return null;
   }
@@ -237,15 +420,27 @@
 
   async function fetchCard(viewPath) {
     const api = routeToApi(viewPath);
+
+    // lesson steps: assemble locally from the whole-lesson bundle when possible
     try {
-      const json = await fetchCardWithCache(api);
-      render(json);
+      const local = await bundleCard(viewPath);
+      if (local) {
+        render(local.json, local.version);
+        return;
+      }
+    } catch (e) {
+      console.error('bundle render failed for', viewPath, e);
+    }
+
+    try {
+      const { json, version } = await fetchCardWithCache(api);
+      render(json, version);
     } catch (e) {
       console.error('fetchCard failed for', api, e);
       // If API /home not available, try static UI page as a graceful fallback
       if (isHomeView(viewPath)) {
         try {
-          const json = await fetchCardWithCache('/ui/pages/home.json');
+          const { json } = await fetchCardWithCache('/ui/pages/home.json');
           render(json);
           return;
         } catch (e2) {
@@ -275,8 +470,9 @@
     if (nextView) preloadViewUrl(nextView);
   }
 
-  function render(json) {
+  function render(json, version) {
     currentJson = json;
+    currentVersion = version || null;
     const DivKit = window.Ya && window.Ya.DivKit;
     const mount = root || document.getElementById('root');
     if (!DivKit || !mount) {
@@ -376,17 +572,20 @@
         const id = a?.payload?.lesson_id || a?.payload?.id;
         const slug = a?.payload?.lesson_slug || a?.payload?.slug;
         if (id != null) {
-          await go(`/view/lesson/${id}?i=0`);
+          await go(`/view/lesson/${id}?i=0${seedQuery(sessionSeed)}`);
           return true;
         }
         if (slug) {
-          await go(`/view/lesson/slug/${encodeURIComponent(slug)}?i=0`);
+          await go(`/view/lesson/slug/${encodeURIComponent(slug)}?i=0${seedQuery(sessionSeed)}`);
           return true;
         }
       }
 
       // 4) url-based navigation
       const url = resolveUrlLike(a) || resolveUrlLike(a?.payload);
+      if (url && a.log_id === 'next_word' && url === '/view/home') {
+        await postProgress(location.pathname + (location.search || ''), 'done');
+      }
       if (url) {
         let viewUrl = url;
         // fallback: treat a bare "/<slug>" as a lesson slug
@@ -428,7 +627,7 @@
 
     // optional: clear cache if navigating away from lessons to keep memory small
     const isLesson = /^\/view\/lesson\/(\d+|slug\/.+)/.test(viewUrl);
-    if (!isLesson) cardCache.clear();
+    if (!isLesson) { cardCache.clear(); cardVersions.clear(); bundles.clear(); }
 
     await fetchCard(viewUrl);
 